@@ -0,0 +1,168 @@
+"""
+Benchmarks of the model, storage and serialization hot paths, run headless on Qt's offscreen platform.
+
+    PYTHONPATH=src python benchmarks/bench.py --sizes 1000 100000 --output bench.json
+    PYTHONPATH=src python benchmarks/bench.py --compare bench.json
+
+The report is JSON, so that runs from different commits can be compared with --compare.
+"""
+import os
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from argparse import ArgumentParser
+from datetime import date, time, timedelta
+from pathlib import Path
+from random import Random
+from statistics import median
+from tempfile import TemporaryDirectory
+from typing import Callable
+import json
+import platform
+import subprocess
+import sys
+import time as time_module
+
+from PySide6 import __version__ as pyside_version
+from PySide6.QtCore import Qt
+from PySide6.QtWidgets import QApplication
+
+from timereport.aggregate import Period, totals
+from timereport.model import TableModel
+from timereport.session import SessionSettings, TimeViewType
+from timereport.store import TimeStore, Row
+from timereport.testdata import load_from_json, save_as_json
+
+ROLES = {
+    "display": Qt.DisplayRole,
+    "edit": Qt.EditRole,
+    "background": Qt.BackgroundRole,
+    "decoration": Qt.DecorationRole,
+    "font": Qt.FontRole,
+}
+
+
+def generate_store(days: int, seed: int = 0) -> TimeStore:
+    """ A store with the given number of consecutive days, ending today, with random came and went times """
+    rng = Random(seed)
+    first = date.today() - timedelta(days=days - 1)
+    store = TimeStore()
+    store.insert_rows(
+        Row(first + timedelta(days=i),
+            8 * 3600 + rng.randint(-3600, 3600),
+            17 * 3600 + rng.randint(-3600, 3600),
+            "note" if rng.random() < 0.1 else "")
+        for i in range(days)
+    )
+    return store
+
+
+def measure(fn: Callable[[], object], repeat: int) -> list[float]:
+    timings = []
+    for _ in range(repeat):
+        start = time_module.perf_counter()
+        fn()
+        timings.append(time_module.perf_counter() - start)
+    return timings
+
+
+def data_sweep(model: TableModel, role: Qt.ItemDataRole):
+    for row in range(model.rowCount(None)):
+        model.headerData(row, Qt.Vertical, role)
+        for column in range(model.columnCount(None)):
+            model.data(model.index(row, column), role)
+
+
+def set_data_burst(model: TableModel, edits: int = 100):
+    rows = model.rowCount(None)
+    came, note = TableModel.HEADERS.index("came"), TableModel.HEADERS.index("note")
+    for i in range(edits):
+        model.setData(model.index(i % rows, came), time(7, i % 60))
+        model.setData(model.index(i % rows, note), f"edit {i}")
+
+
+def scroll_sequence(model: TableModel, steps: int = 50):
+    for _ in range(steps):
+        model.scroll(forward=False)
+    for _ in range(steps):
+        model.scroll(forward=True)
+
+
+def run_size(size: int, repeat: int, workdir: Path) -> list[dict]:
+    results = []
+
+    def record(name: str, fn: Callable[[], object], times: int = repeat):
+        timings = measure(fn, times)
+        results.append(dict(name=name, size=size, repeat=times, min_s=min(timings), median_s=median(timings)))
+        print(f"{size:>9} {name:<32} min {min(timings) * 1000:10.2f} ms   median {median(timings) * 1000:10.2f} ms")
+
+    store = generate_store(size)
+    db_path = workdir.joinpath(f"bench-{size}.db.json")
+    record("save_as_json", lambda: save_as_json(store, db_path))
+    record("load_from_json", lambda: load_from_json(db_path))
+    record("aggregate_totals_week", lambda: totals(store, Period.WEEK, (time(11, 30), time(12)), timedelta(hours=8)))
+
+    session_settings = SessionSettings()
+    session_settings.view_date = date.today() - timedelta(days=min(size, 365) // 2)
+    model = TableModel(session_settings, store)
+    for view_type in TimeViewType:
+        session_settings.time_view_type = view_type
+        record(f"fetch_data[{view_type.name.lower()}]", model.fetch_data)
+
+    session_settings.time_view_type = TimeViewType.MONTH
+    model.fetch_data()
+    for name, role in ROLES.items():
+        record(f"data_sweep[{name}]", lambda: data_sweep(model, role))
+    record("setData_burst[100]", lambda: set_data_burst(model))
+    record("scroll_sequence[month]", lambda: scroll_sequence(model))
+    session_settings.time_view_type = TimeViewType.WEEK
+    record("scroll_sequence[week]", lambda: scroll_sequence(model))
+    return results
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def compare(old_report: dict, new_report: dict):
+    old = {(r["name"], r["size"]): r["min_s"] for r in old_report["results"]}
+    print(f"\nCompared to {old_report['meta']['commit'] or 'unknown commit'} (min times, new / old)")
+    for r in new_report["results"]:
+        key = (r["name"], r["size"])
+        if key in old and old[key] > 0:
+            ratio = r["min_s"] / old[key]
+            flag = "  <-- slower" if ratio > 1.2 else ""
+            print(f"{r['size']:>9} {r['name']:<32} {ratio:6.2f}x{flag}")
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000],
+                        help="Number of days in the synthetic databases, e.g. 1000 1000000")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", type=Path, help="Where to write the JSON report")
+    parser.add_argument("--compare", type=Path, help="An earlier report to compare against")
+    args = parser.parse_args()
+
+    app = QApplication(sys.argv[:1])
+    report = dict(
+        meta=dict(commit=git_commit(), python=platform.python_version(), pyside=pyside_version,
+                  platform=platform.platform(), timestamp=time_module.strftime("%Y-%m-%dT%H:%M:%S")),
+        results=[],
+    )
+    with TemporaryDirectory() as workdir:
+        for size in args.sizes:
+            report["results"].extend(run_size(size, args.repeat, Path(workdir)))
+
+    if args.output is not None:
+        args.output.write_text(json.dumps(report, indent=2))
+        print(f"Wrote {args.output}")
+    if args.compare is not None:
+        compare(json.loads(args.compare.read_text()), report)
+    del app
+
+
+if __name__ == "__main__":
+    main()
@@ -1,148 +1,253 @@
-from PySide6.QtWidgets import QApplication, QMainWindow, QMessageBox, QFileDialog
-from PySide6.QtCore import Signal, QItemSelection
-from PySide6.QtGui import QCloseEvent, QResizeEvent
-from datetime import datetime, date
+import time
+# Start of the startup time measurement, before anything else is imported
+_started = time.perf_counter()
+
+from argparse import ArgumentParser, Namespace
+from datetime import date, datetime, timedelta
 from pathlib import Path
-import sys
-from logging import getLogger
 from typing import Union
-from .gui_settings import SettingsDialog
-from .model import TableModel, TimeDelegate
-from .session import TimeViewType, SessionSettings
-from . import testdata
-from .testdata import load_from_json, save_as_json
-from .ui.task_view import Ui_MainWindow
-
-logger = getLogger(__name__)
-
-
-class TimeReportOverview(QMainWindow):
-    # Emit a bool to indicate whether a row is selected or not
-    row_selected = Signal(bool)
-
-    def __init__(self):
-        super().__init__()
-        self.ui = Ui_MainWindow()
-        self.ui.setupUi(self)
-        self.session_settings = SessionSettings()
-        self.model = TableModel(self.session_settings)
-        self.delegate = TimeDelegate()
-        self.dirty: bool = False
-        self.filepath: Path = None
-        self.ui.tableview_days.setModel(self.model)
-        self.model.setup_column_width(self.ui.tableview_days)
-        self.ui.tableview_days.setItemDelegateForColumn(self.model.HEADERS.index("came"), self.delegate)
-        self.ui.tableview_days.setItemDelegateForColumn(self.model.HEADERS.index("went"), self.delegate)
-
-        self.ui.tableview_days.selectionModel().selectionChanged.connect(self.selection_changed)
-        self.ui.actionMonth_view.triggered.connect(lambda: self.model.set_view_type(TimeViewType.MONTH))
-        self.ui.actionWeek_view.triggered.connect(lambda: self.model.set_view_type(TimeViewType.WEEK))
-        self.ui.actionAround_view.triggered.connect(lambda: self.model.set_view_type(TimeViewType.AROUND_DAY))
-        self.ui.actionDay_view.triggered.connect(lambda: self.model.set_view_type(TimeViewType.DAY))
-        self.ui.actionGotoToday.triggered.connect(self.model.scroll_to_today)
-        self.ui.actionGotoPrevious.triggered.connect(lambda: self.model.scroll(forward=False))
-        self.ui.actionGotoNext.triggered.connect(lambda: self.model.scroll(forward=True))
-        self.ui.actionUpdate_came_went_time.triggered.connect(self.update_came_went)
-        self.ui.actionSave.triggered.connect(lambda: self.save_db_to_file(self.filepath))
-        self.ui.actionSave_As.triggered.connect(lambda: self.save_db_to_file(None))
-        self.ui.actionOpen.triggered.connect(lambda: self.open_db_from_file())
-        self.ui.actionSettings.triggered.connect(lambda: self.open_settings())
-        self.model.data_updated.connect(self.update_current_period)
-
-        self.session_settings.load(Path(".timereport-session.json"))
-        self.resize(self.session_settings.window_size)
-        self.model.fetch_data()
-
-    def closeEvent(self, event: QCloseEvent) -> None:
-        if self.dirty:
-            resp = QMessageBox.warning(
-                self,
-                "You have unsaved changes",
-                "You have unsaved changes. Do you want to save them before closing?",
-                QMessageBox.Yes | QMessageBox.No | QMessageBox.Cancel,
-
-            )
-            if resp == QMessageBox.Yes:
-                self.save_db_to_file(self.filepath)
-            elif resp == QMessageBox.Cancel:
-                self.ui.statusbar.showMessage("Canceled. Database still has unsaved changes.")
-                event.ignore()
-        logger.debug("Saving session settings")
-        self.session_settings.save(Path(".timereport-session.json"))
-
-    def resizeEvent(self, event: QResizeEvent) -> None:
-        self.session_settings.window_size = event.size()
-
-    def get_save_location(self) -> Union[Path, None]:
-        # Cannot use QFileDialog.saveFileDialog with a default saving suffix, so using this way
-        dialog = QFileDialog(self, "Select where to save the trep database", "trep.db.json", "trep DB (*.json)")
-        dialog.setModal(True)
-        dialog.setDefaultSuffix("json")
-        dialog.setFileMode(QFileDialog.AnyFile)
-        dialog.setAcceptMode(QFileDialog.AcceptSave)
-        # Preselecting file does not seem to work when running from Pycharm. Not using native dialogs fixes it,
-        # but looks worse, i.e.:
-        # dialog.setOption(QFileDialog.DontUseNativeDialog)
-        dialog.selectFile("trep.db.json")
-        if dialog.exec():
-            return Path(dialog.selectedFiles()[0])
-
-    def save_db_to_file(self, filepath: Path = None):
-        if filepath is None:
-            filepath = self.get_save_location()
-
-            if filepath is None:
-                # User canceled "save as dialog" before
-                self.ui.statusbar.showMessage("Canceled", 1000)
-                return
-            self.filepath = filepath
-
-        logger.info(f"Saving as {self.filepath}")
-        save_as_json(testdata.test_table_days, filepath)
-        self.ui.statusbar.showMessage("Saved database", 2000)
-
-    def open_db_from_file(self):
-        filepath, ending = QFileDialog.getOpenFileName(self, "Select trep db", filter="trep DB (*.json)")
-        if filepath == "":
-            self.ui.statusbar.showMessage("Canceled", 2000)
-            return
-
-        testdata.test_table_days = load_from_json(Path(filepath))
-        self.model.fetch_data()
-        self.ui.statusbar.showMessage(f"Opened database {filepath}", 4000)
-
-    def open_settings(self):
-        dialog = SettingsDialog(self.session_settings, parent=self)
-        dialog.exec()
-
-    def update_current_period(self, view_date: date, start_date: date, end_date: date):
-        if self.session_settings.time_view_type == TimeViewType.MONTH:
-            period = view_date.strftime("%B, %Y")
-        elif self.session_settings.time_view_type == TimeViewType.WEEK:
-            period = f"Week {view_date.strftime('%V, %Y')}"
-        elif self.session_settings.time_view_type == TimeViewType.DAY:
-            period = str(view_date)
-        else:
-            period = f"{start_date} - {end_date}"
-        self.ui.lbl_current_period.setText(period)
-
-    def update_came_went(self):
-        dt = datetime.now()
-        row = self.model._data[dt.date()]
-        row.came = min(dt.time(), row.came)
-        row.went = max(dt.time(), row.went)
-        testdata.test_table_days[dt.date()] = {k: getattr(row, k) for k in row.__dataclass_fields__.keys()}
-        self.model.fetch_data()
-
-    def selection_changed(self, sel: QItemSelection, dsel: QItemSelection):
-        self.row_selected.emit(len(sel.indexes()) != 0)
+import os
+import sys
+from . import instance
+
+
+def run_command(args: Namespace) -> int:
+    """ Forward a command to the running instance, or run it on the most recent database if there is none """
+    command_args = [args.duration, args.project] if args.command == "add" else []
+    reply = instance.send(args.command, command_args)
+    if reply is None:
+        if args.command == "add":
+            return add_offline(args.duration, args.project)
+        return came_went_offline()
+    print(reply["message"], file=sys.stdout if reply["ok"] else sys.stderr)
+    return 0 if reply["ok"] else 1
+
+
+def load_session():
+    from .session import SessionSettings, SESSION_FILE
+
+    session_settings = SessionSettings()
+    session_settings.apply(SessionSettings.read(SESSION_FILE))
+    return session_settings
+
+
+def recent_db() -> Union[Path, None]:
+    filepath = next((f for f in load_session().recent_files if f.exists()), None)
+    if filepath is None:
+        print("trep is not running and there is no recent database", file=sys.stderr)
+    return filepath
+
+
+def add_offline(duration_text: str, project_id: str) -> int:
+    """ Add the delta to the allocations file, without loading the database """
+    from .allocation import add_to_file, allocations_path
+    from .projects import Project, ProjectRegistry, projects_path
+    from .util import format_duration, parse_duration
+
+    try:
+        duration = parse_duration(duration_text)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+    filepath = recent_db()
+    if filepath is None:
+        return 1
+    seconds = add_to_file(allocations_path(filepath), date.today(), project_id, duration)
+    registry = ProjectRegistry()
+    registry.load(projects_path(filepath))
+    if project_id not in registry:
+        registry.add(Project(project_id))
+    registry.record_use(project_id)
+    registry.save(projects_path(filepath))
+    print(f"Added {format_duration(duration)} h to {project_id} today, "
+          f"{format_duration(timedelta(seconds=seconds))} h in total ({filepath})")
+    return 0
+
+
+def came_went_offline() -> int:
+    from .database import open_db, update_came_went
+    from .journal import Journal
+    from .sqlite_store import SqliteStore
+
+    filepath = recent_db()
+    if filepath is None:
+        return 1
+    store = open_db(filepath)
+    if isinstance(store, SqliteStore):
+        row = update_came_went(store, datetime.now())
+        store.close()
+    else:
+        journal = Journal(filepath)
+        journal.attach(store)
+        row = update_came_went(store, datetime.now())
+        journal.detach()
+    print(f"{row.date}: came {row.came:%H:%M}, went {row.went:%H:%M} ({filepath})")
+    return 0
+
+
+def run_import(args: Namespace) -> int:
+    """ Convert a JSON database into an SQLite database, which the GUI then opens like any other """
+    from .database import import_json
+    from .sqlite_store import SUFFIX
+
+    output = args.output or args.json_db.with_suffix(SUFFIX)
+    if output.suffix != SUFFIX:
+        print(f"The SQLite database has to end with {SUFFIX}: {output}", file=sys.stderr)
+        return 1
+    if output.exists() and not args.force:
+        print(f"{output} already exists, use --force to replace it", file=sys.stderr)
+        return 1
+    store = import_json(args.json_db, output)
+    print(f"Imported {len(store)} days into {output}")
+    store.close()
+    return 0
+
+
+def run_export(args: Namespace) -> int:
+    """
+    Export from the database file, without a QApplication. A running instance keeps its changes in the journal or
+    the SQLite database, so they are included
+    """
+    from .aggregate import Period
+    from .allocation import Allocations, allocations_path
+    from .database import open_db
+    from .export import export, sinks
+    from .sqlite_store import SqliteStore
+
+    formats = sinks()
+    if args.format not in formats:
+        print(f"Unknown format {args.format!r}, expected one of {', '.join(sorted(formats))}", file=sys.stderr)
+        return 1
+    session_settings = load_session()
+    filepath = args.db or recent_db()
+    if filepath is None:
+        return 1
+    store = open_db(filepath)
+    span = store.span() or (date.today(), date.today())
+    start = args.start or span[0]
+    end = args.end or span[1]
+    allocations = Allocations.read(allocations_path(filepath)) if args.projects else None
+    out = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8", newline="")
+    try:
+        export(store, formats[args.format](out), start, end, session_settings.lunch_interval,
+               Period[args.period.upper()] if args.period else None, session_settings.daily_norm,
+               allocations, session_settings.main_project)
+        out.flush()
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+    except BrokenPipeError:
+        # The reader, e.g. head, has stopped reading. Python would complain again when flushing stdout at exit
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 1
+    finally:
+        if out is not sys.stdout:
+            out.close()
+        if isinstance(store, SqliteStore):
+            store.close()
+    return 0
+
+
+def run_gui(args: Namespace) -> int:
+    # Only one instance keeps the database, later ones show it instead
+    if instance.send("show") is not None:
+        return 0
+
+    from PySide6.QtCore import QTimer
+    from PySide6.QtWidgets import QApplication
+    import cProfile
+    from . import profiling
+    from .instance_server import InstanceServer
+    from .overview import TimeReportOverview
+
+    if args.profile is None:
+        args.profile = profiling.output_from_env()
+    app = QApplication(sys.argv[:1])
+    profiler = None
+    if args.profile is not None:
+        profiler = profiling.Profiler(trace=args.profile.endswith(".json"))
+        profiling.instrument_hot_paths(profiler)
+    c_profile = cProfile.Profile() if args.profile and args.profile.endswith(".prof") else None
+    startup_timer = profiling.StartupTimer(_started) if args.startup_time else None
+    if startup_timer is not None:
+        startup_timer.mark("imported")
+    w = TimeReportOverview()
+    if profiler is not None:
+        w.show_profiler(profiler)
+    if startup_timer is not None:
+        startup_timer.mark("window constructed")
+        startup_timer.watch_first_paint(w.ui.tableview_days.viewport())
+        w.store_ready.connect(lambda: startup_timer.mark("database loaded"))
+        w.store_ready.connect(app.quit)
+    server = InstanceServer(w.handle_command, w)
+    if not server.listen():
+        if instance.send("show") is not None:
+            # Another instance started at the same time, and got the socket first
+            return 0
+        print(f"Could not listen on {instance.server_name()}, later trep commands will start another instance",
+              file=sys.stderr)
+    if not (args.tray and w.show_in_tray()):
+        w.show()
+    # Queued after the events of showing the window, so that it is painted before the session and database load
+    QTimer.singleShot(0, w.restore_session)
+    if c_profile is not None:
+        c_profile.enable()
+    exit_code = app.exec()
+    server.close()
+    if c_profile is not None:
+        c_profile.disable()
+        c_profile.dump_stats(args.profile)
+    if startup_timer is not None:
+        print(startup_timer.report(), file=sys.stderr)
+    if profiler is not None:
+        print(profiler.report(), file=sys.stderr)
+        if profiler.trace_events is not None:
+            profiler.dump_trace(Path(args.profile))
+    return exit_code
 
 
 def main():
-    app = QApplication([])
-    w = TimeReportOverview()
-    w.show()
-    sys.exit(app.exec())
+    parser = ArgumentParser(prog="trep")
+    parser.add_argument("--tray", action="store_true",
+                        help="Keep running in the system tray, with the database in memory for later commands")
+    parser.add_argument("--startup-time", action="store_true",
+                        help="Print the time until the window is painted and the database is loaded, then exit")
+    parser.add_argument("--profile", nargs="?", const="", metavar="OUTPUT",
+                        help="Time the model, serialization and session calls and print a summary on exit. "
+                             "Also writes cProfile stats to OUTPUT if it ends with .prof, or trace events if it "
+                             "ends with .json. Can also be enabled with TREP_PROFILE=1 or =OUTPUT")
+    subparsers = parser.add_subparsers(dest="command", metavar="COMMAND")
+    subparsers.add_parser("came-went", help="Stretch the came and went times of today to include now")
+    add_parser = subparsers.add_parser("add", help="Add time to a project today")
+    add_parser.add_argument("duration", help="E.g. 1h or 30m")
+    add_parser.add_argument("project")
+    export_parser = subparsers.add_parser(
+        "export", help="Write the days, or the totals per period, as CSV, iCalendar or a format added by a plugin")
+    export_parser.add_argument("-f", "--format", default="csv", help="Output format, e.g. csv or ical")
+    export_parser.add_argument("-o", "--output", default="-", help="Output file, defaults to stdout")
+    export_parser.add_argument("--from", dest="start", type=date.fromisoformat, metavar="YYYY-MM-DD",
+                               help="First day, defaults to the first day of the database")
+    export_parser.add_argument("--to", dest="end", type=date.fromisoformat, metavar="YYYY-MM-DD",
+                               help="Last day, defaults to the last day of the database")
+    export_parser.add_argument("--period", choices=["week", "month", "year"],
+                               help="Export the totals per period instead of the days")
+    export_parser.add_argument("--projects", action="store_true", help="Include the time per project")
+    export_parser.add_argument("--db", type=Path, help="Database to export, defaults to the most recent one")
+    import_parser = subparsers.add_parser(
+        "import", help="Convert a JSON database, including the changes in its journal, into an SQLite database")
+    import_parser.add_argument("json_db", type=Path, metavar="JSON_DB")
+    import_parser.add_argument("output", type=Path, nargs="?", metavar="SQLITE_DB",
+                               help="Defaults to the JSON database with the .sqlite suffix")
+    import_parser.add_argument("--force", action="store_true", help="Replace an existing SQLite database")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        sys.exit(run_export(args))
+    if args.command == "import":
+        sys.exit(run_import(args))
+    if args.command is not None:
+        sys.exit(run_command(args))
+    sys.exit(run_gui(args))
 
 
 if __name__ == '__main__':
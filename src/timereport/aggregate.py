@@ -0,0 +1,125 @@
+from array import array
+from dataclasses import dataclass
+from datetime import date, time, timedelta
+from enum import auto, Enum, unique
+from itertools import repeat
+from operator import add, mul, sub
+from typing import Iterator
+from .store import TimeStore, MISSING, time_to_seconds
+
+
+@unique
+class Period(Enum):
+    WEEK = auto()
+    MONTH = auto()
+    YEAR = auto()
+
+
+@dataclass
+class PeriodTotal:
+    start: date
+    end: date
+    worked: timedelta
+    lunch: timedelta
+    norm: timedelta
+    days_worked: int
+
+    @property
+    def net(self) -> timedelta:
+        """ Worked time with lunch deducted """
+        return self.worked - self.lunch
+
+    @property
+    def overtime(self) -> timedelta:
+        return self.net - self.norm
+
+
+def period_start(day: date, period: Period) -> date:
+    if period == Period.WEEK:
+        return day - timedelta(days=day.weekday())
+    elif period == Period.MONTH:
+        return day.replace(day=1)
+    return day.replace(month=1, day=1)
+
+
+def next_period_start(day: date, period: Period) -> date:
+    start = period_start(day, period)
+    if period == Period.WEEK:
+        return start + timedelta(days=7)
+    elif period == Period.MONTH:
+        return (start + timedelta(days=32)).replace(day=1)
+    return start.replace(year=start.year + 1)
+
+
+def period_bounds(start: date, end: date, period: Period) -> Iterator[tuple[date, date]]:
+    """ Split start to end, both inclusive, into the periods they overlap, clipped to start and end """
+    while start <= end:
+        next_start = next_period_start(start, period)
+        yield start, min(end, next_start - timedelta(days=1))
+        start = next_start
+
+
+def workdays(start: date, end: date) -> int:
+    """ Number of Monday-Fridays between start and end, both inclusive """
+    days = (end - start).days + 1
+    full_weeks, rest = divmod(days, 7)
+    first = start.weekday()
+    return full_weeks * 5 + sum(1 for i in range(rest) if (first + i) % 7 < 5)
+
+
+def net_seconds(came: int, went: int, lunch_from: int, lunch_to: int) -> int:
+    """ Worked seconds of a single day, with the overlap with lunch deducted. Like DayColumns, for one day """
+    if came == MISSING or went == MISSING:
+        return 0
+    return max(went - came, 0) - max(min(went, lunch_to) - max(came, lunch_from), 0)
+
+
+class DayColumns:
+    """ Per-day worked and lunch seconds for a date range, computed over whole columns at once """
+
+    def __init__(self, store: TimeStore, start: date, end: date, lunch_interval: tuple[time, time]):
+        self.start = start
+        came, went = store.columns(start, end)
+        n = len(came)
+        lunch_from, lunch_to = (time_to_seconds(t) for t in lunch_interval)
+
+        # 1 where both came and went are set, otherwise 0. Missing times are negative
+        valid = array('i', map(add, map(min, map(min, came, went), repeat(0, n)), repeat(1, n)))
+        self.valid = valid
+        self.worked = array('i', map(mul, map(max, map(sub, went, came), repeat(0, n)), valid))
+        # Overlap between came-went and the lunch interval
+        overlap = map(sub, map(min, went, repeat(lunch_to, n)), map(max, came, repeat(lunch_from, n)))
+        self.lunch = array('i', map(mul, map(max, overlap, repeat(0, n)), valid))
+
+    def total(self, start: date, end: date, daily_norm: timedelta) -> PeriodTotal:
+        lo = (start - self.start).days
+        hi = (end - self.start).days + 1
+        return PeriodTotal(
+            start, end,
+            worked=timedelta(seconds=sum(self.worked[lo:hi])),
+            lunch=timedelta(seconds=sum(self.lunch[lo:hi])),
+            norm=daily_norm * workdays(start, end),
+            days_worked=sum(self.valid[lo:hi]),
+        )
+
+
+def summarize(store: TimeStore, start: date, end: date, lunch_interval: tuple[time, time],
+              daily_norm: timedelta) -> PeriodTotal:
+    """ Total for a single range, e.g. the range shown in the overview """
+    return DayColumns(store, start, end, lunch_interval).total(start, end, daily_norm)
+
+
+def totals(store: TimeStore, period: Period, lunch_interval: tuple[time, time], daily_norm: timedelta,
+           start: date = None, end: date = None) -> list[PeriodTotal]:
+    """
+    Totals per week, month or year between start and end, both inclusive. The first and last periods are clipped
+    to the range. Defaults to the whole store.
+    """
+    span = store.span()
+    if span is None and (start is None or end is None):
+        return []
+    start = start or span[0]
+    end = end or span[1]
+    columns = DayColumns(store, start, end, lunch_interval)
+    return [columns.total(s, e, daily_norm) for s, e in period_bounds(start, end, period)]
+
@@ -0,0 +1,325 @@
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import date, time, timedelta
+from logging import getLogger
+from pathlib import Path
+from typing import Callable, Union
+import json
+from .aggregate import net_seconds
+from .sqlite_store import SqliteStore
+from .store import ObservableStore, TimeStore, MISSING, time_to_seconds
+from .util import replacing
+
+logger = getLogger(__name__)
+
+SUFFIX = ".allocations.json"
+
+# Year and month of the per-month totals
+Month = tuple[int, int]
+
+
+@dataclass
+class DayAllocation:
+    """ Time reported on projects during a day """
+    # Seconds added to each project, e.g. with `trep add 1h PROJ`
+    deltas: dict[str, int] = field(default_factory=dict)
+    # Percent of the unspecified time per project. Empty to use the default main project
+    main: dict[str, int] = field(default_factory=dict)
+
+    def __bool__(self) -> bool:
+        return bool(self.deltas or self.main)
+
+
+def allocations_path(db_path: Path) -> Path:
+    """
+    The project allocations of a database, e.g. trep.db.json.allocations.json for trep.db.json. The whole file name
+    is kept, so that e.g. trep.db.json and trep.db.sqlite have their own
+    """
+    return db_path.with_name(db_path.name + SUFFIX)
+
+
+def parse_split(s: str) -> dict[str, int]:
+    """ Parse a main project, e.g. PROJ, or a percentage split, e.g. "A 60%, B 40%" """
+    parts = [p.split() for p in s.replace("%", " ").split(",") if p.strip()]
+    if len(parts) == 1 and len(parts[0]) == 1:
+        return {parts[0][0]: 100}
+    try:
+        split = {project: int(percent) for project, percent in parts}
+    except ValueError:
+        raise ValueError(f"Invalid split {s!r}, expected e.g. PROJ or \"A 60%, B 40%\"")
+    if sum(split.values()) != 100 or min(split.values()) < 0:
+        raise ValueError(f"The percentages of {s!r} do not add up to 100")
+    return split
+
+
+def split_seconds(seconds: int, split: dict[str, int]) -> dict[str, int]:
+    """ Distribute whole seconds by percent. What rounding leaves over goes to the largest share """
+    shares = {project: seconds * percent // 100 for project, percent in split.items()}
+    largest = max(split, key=split.get)
+    shares[largest] += seconds - sum(shares.values())
+    return shares
+
+
+def split_day(allocation: DayAllocation, default_main: str, net: Union[int, None]) -> dict[str, int]:
+    """ Seconds per project of a day with net seconds of work, or None for a day without times """
+    split = dict(allocation.deltas)
+    main = allocation.main or ({default_main: 100} if default_main else {})
+    if main and net is not None:
+        remainder = net - sum(split.values())
+        if remainder > 0:
+            for project, seconds in split_seconds(remainder, main).items():
+                split[project] = split.get(project, 0) + seconds
+    return {project: seconds for project, seconds in split.items() if seconds != 0}
+
+
+def serialize_days(days: dict[date, DayAllocation]) -> dict:
+    return dict(days={day.isoformat(): dict(deltas=a.deltas, main=a.main) for day, a in sorted(days.items())})
+
+
+def range_totals(store: ObservableStore, start: date, end: date, days: dict[date, DayAllocation],
+                 default_main: str, lunch: tuple[int, int]) -> dict[str, int]:
+    """ Seconds per project between start and end, both inclusive, from the came and went columns of the range """
+    came, went = store.columns(start, end)
+    totals: Counter[str] = Counter()
+    # Days without an allocation of their own all go to the default main project, so they are only summed
+    main_seconds = 0
+    for i, (c, w) in enumerate(zip(came, went)):
+        net = None if c == MISSING or w == MISSING else net_seconds(c, w, *lunch)
+        allocation = days.get(start + timedelta(days=i))
+        if allocation is not None:
+            totals.update(split_day(allocation, default_main, net))
+        elif net is not None:
+            main_seconds += net
+    if default_main and main_seconds > 0:
+        totals[default_main] += main_seconds
+    return {project: seconds for project, seconds in totals.items() if seconds != 0}
+
+
+def _month_bounds(month: Month) -> tuple[date, date]:
+    first = date(*month, 1)
+    return first, (first + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+
+
+def compute_totals(store: ObservableStore, days: dict[date, DayAllocation], default_main: str,
+                   lunch: tuple[int, int]) -> dict[Month, dict[str, int]]:
+    """
+    Seconds per project of each month, read from the store a month at a time. Without a default main project,
+    only the months with allocations have project time
+    """
+    months = {(day.year, day.month) for day in days}
+    span = store.span() if default_main else None
+    if span is not None:
+        month, last = (span[0].year, span[0].month), (span[1].year, span[1].month)
+        while month <= last:
+            months.add(month)
+            month = (month[0] + month[1] // 12, month[1] % 12 + 1)
+    month_totals = {}
+    for month in sorted(months):
+        totals = range_totals(store, *_month_bounds(month), days, default_main, lunch)
+        if totals:
+            month_totals[month] = totals
+    return month_totals
+
+
+class Allocations(ObservableStore):
+    """
+    Project deltas and main projects per day, and the resulting time per project.
+
+    The time of a day that is not added to a project with a delta goes to the main project of the day, or is split
+    between several by percent. Days without their own main project use the default one. Only the totals per
+    project and month are kept, together with the running totals per project. Changing a delta, or the times of a
+    day in the store, computes the month of the day again from its came and went columns, so totals over any range
+    are read from the month totals plus the days of partial months.
+
+    The totals of a large database can be computed in another thread with totals_job, and then set with
+    set_totals. Listeners are notified with the day and ("projects", ) when the time per project of a day may have
+    changed.
+    """
+
+    def __init__(self, store: TimeStore, lunch_interval: tuple[time, time], default_main: str = "",
+                 days: dict[date, DayAllocation] = None, compute: bool = True):
+        super().__init__()
+        self.store = store
+        self._lunch = tuple(time_to_seconds(t) for t in lunch_interval)
+        self.default_main = default_main
+        self._days: dict[date, DayAllocation] = days or {}
+        self._totals: Counter[str] = Counter()
+        self._month_totals: dict[Month, dict[str, int]] = {}
+        # Months changed while the totals are computed in another thread, None once they are set
+        self._stale_months: Union[set[Month], None] = None
+        if compute:
+            self._rebuild()
+        else:
+            self._stale_months = set()
+        store.add_batch_listener(self._on_store_changed)
+
+    def detach(self):
+        self.store.remove_batch_listener(self._on_store_changed)
+
+    def _rebuild(self):
+        # Up to date, so a totals job that is still running is outdated
+        self._stale_months = None
+        self._set_totals(compute_totals(self.store, self._days, self.default_main, self._lunch))
+
+    def totals_job(self) -> Callable[[], dict[Month, dict[str, int]]]:
+        """ Computes the totals from copies of the store and the allocations, for running in another thread """
+        store, days, default_main, lunch = self.store.copy(), self.copy_days(), self.default_main, self._lunch
+
+        def job() -> dict[Month, dict[str, int]]:
+            try:
+                return compute_totals(store, days, default_main, lunch)
+            finally:
+                if isinstance(store, SqliteStore):
+                    store.close()
+        return job
+
+    def set_totals(self, month_totals: dict[Month, dict[str, int]]):
+        """
+        Use the totals computed by a totals job. Months changed since the job was made are computed again. Ignored
+        if everything has been computed again meanwhile, e.g. after a settings change
+        """
+        if self._stale_months is not None:
+            self._set_totals(month_totals)
+
+    def _set_totals(self, month_totals: dict[Month, dict[str, int]]):
+        stale, self._stale_months = self._stale_months or set(), None
+        self._month_totals = dict(month_totals)
+        self._totals = Counter()
+        for totals in self._month_totals.values():
+            self._totals.update(totals)
+        for month in stale:
+            self._recompute_month(month)
+
+    def _on_store_changed(self, changes: dict[date, tuple[str, ...]]):
+        days = [day for day, fields in changes.items() if "came" in fields or "went" in fields]
+        for month in {(day.year, day.month) for day in days}:
+            self._recompute_month(month)
+        with self.batch():
+            for day in days:
+                if self.default_main or day in self._days:
+                    self._notify(day, ("projects", ))
+
+    def _recompute_month(self, month: Month):
+        if self._stale_months is not None:
+            self._stale_months.add(month)
+        old = self._month_totals.pop(month, {})
+        new = range_totals(self.store, *_month_bounds(month), self._days, self.default_main, self._lunch)
+        if new:
+            self._month_totals[month] = new
+        self._totals.subtract(old)
+        self._totals.update(new)
+        for project in old.keys() - new.keys():
+            if self._totals[project] == 0:
+                del self._totals[project]
+
+    def _changed_day(self, day: date, old_split: dict[str, int]):
+        """ Update the totals after the allocation of a day changed """
+        self._recompute_month((day.year, day.month))
+        if self.day_split(day) != old_split:
+            self._notify(day, ("projects", ))
+
+    def get(self, day: date) -> DayAllocation:
+        return self._days.get(day, DayAllocation())
+
+    def day_split(self, day: date) -> dict[str, int]:
+        """ Seconds per project of a day """
+        row = self.store.get(day)
+        if row is None or row.came_seconds == MISSING or row.went_seconds == MISSING:
+            net = None
+        else:
+            net = net_seconds(row.came_seconds, row.went_seconds, *self._lunch)
+        return split_day(self.get(day), self.default_main, net)
+
+    def unallocated(self, day: date) -> int:
+        """ Net seconds of the day not assigned to any project. Negative if more than the day has been added """
+        row = self.store.get(day)
+        net = 0 if row is None else net_seconds(row.came_seconds, row.went_seconds, *self._lunch)
+        return net - sum(self.day_split(day).values())
+
+    def add(self, day: date, project: str, duration: timedelta):
+        """ Add time to a project, or remove time with a negative duration """
+        old_split = self.day_split(day)
+        allocation = self._days.setdefault(day, DayAllocation())
+        seconds = allocation.deltas.get(project, 0) + int(duration.total_seconds())
+        if seconds == 0:
+            allocation.deltas.pop(project, None)
+        else:
+            allocation.deltas[project] = seconds
+        if not allocation:
+            del self._days[day]
+        self._changed_day(day, old_split)
+
+    def set_main(self, day: date, split: dict[str, int]):
+        """ The main project of a day, or projects with percent, for the time not added to a project """
+        old_split = self.day_split(day)
+        allocation = self._days.setdefault(day, DayAllocation())
+        allocation.main = dict(split)
+        if not allocation:
+            del self._days[day]
+        self._changed_day(day, old_split)
+
+    def set_default_main(self, project: str):
+        """ Changes the result of every day without its own main project, so all days are recomputed """
+        if project != self.default_main:
+            self.default_main = project
+            self._rebuild()
+
+    def set_lunch_interval(self, lunch_interval: tuple[time, time]):
+        lunch = tuple(time_to_seconds(t) for t in lunch_interval)
+        if lunch != self._lunch:
+            self._lunch = lunch
+            self._rebuild()
+
+    def totals(self, start: date = None, end: date = None) -> Counter[str]:
+        """ Seconds per project between start and end, both inclusive. Defaults to all days """
+        if start is None and end is None:
+            return Counter(self._totals)
+        start = start or date.min
+        end = end or date.max
+        result = Counter()
+        # Whole months from the month totals, the days of partial months from the store
+        for month, totals in self._month_totals.items():
+            first, last = _month_bounds(month)
+            if start <= first and last <= end:
+                result.update(totals)
+            elif first <= end and start <= last:
+                result.update(range_totals(self.store, max(first, start), min(last, end), self._days,
+                                           self.default_main, self._lunch))
+        return +result
+
+    def copy_days(self) -> dict[date, DayAllocation]:
+        """ A copy of the allocations of each day, e.g. to read in another thread """
+        return {day: DayAllocation(dict(a.deltas), dict(a.main)) for day, a in self._days.items()}
+
+    def serialize(self) -> dict:
+        return serialize_days(self._days)
+
+    @staticmethod
+    def read(filepath: Path) -> dict[date, DayAllocation]:
+        """ Read an allocations file, without a store. Safe to call from another thread """
+        if not filepath.exists():
+            return {}
+        with open(filepath) as f:
+            file_dict = json.load(f)
+        return {
+            date.fromisoformat(day): DayAllocation(dict(a.get("deltas", {})), dict(a.get("main", {})))
+            for day, a in file_dict.get("days", {}).items()
+        }
+
+    @staticmethod
+    def write(filepath: Path, file_dict: dict):
+        """ Write serialized allocations, replacing the file only once it is completely written """
+        with replacing(filepath) as tmp_path, open(tmp_path, "w") as f:
+            json.dump(file_dict, f, indent=1)
+
+
+def add_to_file(filepath: Path, day: date, project: str, duration: timedelta) -> int:
+    """ Add a delta directly to an allocations file, without loading the database. Returns the new delta """
+    days = Allocations.read(filepath)
+    allocation = days.setdefault(day, DayAllocation())
+    seconds = allocation.deltas.get(project, 0) + int(duration.total_seconds())
+    allocation.deltas[project] = seconds
+    if seconds == 0:
+        del allocation.deltas[project]
+    Allocations.write(filepath, serialize_days(days))
+    return seconds
@@ -0,0 +1,109 @@
+from datetime import date, datetime, time, timedelta
+from typing import Iterable, Union
+from .dates import day_info
+from .store import ObservableStore, Row, MISSING, seconds_to_time
+
+# New field values per day, or None to delete the day
+Changes = dict[date, Union[dict, None]]
+# The rows of the changed days before the changes, None for days that did not exist
+Before = dict[date, Union[Row, None]]
+
+EDITABLE = ("came", "went", "note")
+_EMPTY_TIMES = ("", "---")
+
+
+def apply_changes(store: ObservableStore, changes: Changes) -> Before:
+    """ Apply all changes in one batch, so listeners and views are notified once. Returns the rows from before """
+    before = {day: store.get(day) for day in changes}
+    with store.batch():
+        for day, fields in changes.items():
+            if fields is None:
+                store.delete(day)
+            else:
+                store.upsert(day, **fields)
+    return before
+
+
+def fill_workdays(days: Iterable[date], came: time, went: time) -> Changes:
+    """ Set came and went of the workdays among the days """
+    return {day: dict(came=came, went=went) for day in days if day_info(day).is_workday}
+
+
+def shift_times(store: ObservableStore, days: Iterable[date], offset: timedelta) -> Changes:
+    """ Move the came and went times of the days by an offset. Fails if any time would end up on another day """
+    changes = {}
+    seconds = int(offset.total_seconds())
+    for day in days:
+        row = store.get(day)
+        if row is None:
+            continue
+        fields = {}
+        for name, old in (("came", row.came_seconds), ("went", row.went_seconds)):
+            if old == MISSING:
+                continue
+            new = old + seconds
+            if not 0 <= new < 24 * 3600:
+                raise ValueError(f"Shifting {name} of {day} by {offset} moves it to another day")
+            fields[name] = seconds_to_time(new)
+        if fields:
+            changes[day] = fields
+    return changes
+
+
+def clear_cells(store: ObservableStore, cells: dict[date, set[str]]) -> Changes:
+    """ Clear the given fields of each day. Days left without any times or note are deleted """
+    changes = {}
+    for day, fields in cells.items():
+        fields = set(fields) & set(EDITABLE)
+        row = store.get(day)
+        if row is None or not fields:
+            continue
+        cleared = {name: "" if name == "note" else None for name in fields}
+        remaining = {name: getattr(row, name) for name in EDITABLE if name not in cleared}
+        changes[day] = None if not any(remaining.values()) else cleared
+    return changes
+
+
+def parse_time(text: str) -> Union[time, None]:
+    text = text.strip()
+    if text in _EMPTY_TIMES:
+        return None
+    for fmt in ("%H:%M", "%H:%M:%S"):
+        try:
+            return datetime.strptime(text, fmt).time()
+        except ValueError:
+            pass
+    raise ValueError(f"Invalid time {text!r}, expected e.g. 08:30")
+
+
+def format_table(rows: list[list[str]]) -> str:
+    """ Tab separated lines, like spreadsheets put on the clipboard """
+    return "".join("\t".join(row) + "\n" for row in rows)
+
+
+def paste_table(store: ObservableStore, first_day: date, columns: tuple[str, ...], text: str) -> Changes:
+    """
+    Changes for tab separated text pasted with its top-left cell on first_day, where each line is the next day and
+    each value the next of the columns. Values in columns that cannot be edited, e.g. total, are skipped.
+    """
+    changes = {}
+    lines = text.rstrip("\n").split("\n")
+    for i, line in enumerate(lines):
+        day = first_day + timedelta(days=i)
+        fields = {}
+        for name, value in zip(columns, line.rstrip("\r").split("\t")):
+            if name in ("came", "went"):
+                fields[name] = parse_time(value)
+            elif name == "note":
+                fields[name] = value
+        row = store.get(day)
+        if not fields or (row is None and not any(fields.values())):
+            # Nothing to paste, or an empty day that does not have to be created
+            continue
+        row = row or Row(day)
+        came = fields.get("came", row.came)
+        went = fields.get("went", row.went)
+        if came is not None and went is not None and went < came:
+            raise ValueError(f"Pasted went {went} is before came {came} on {day}")
+        changes[day] = fields
+    return changes
@@ -0,0 +1,99 @@
+from datetime import date, datetime
+from pathlib import Path
+from typing import Union
+from logging import getLogger
+import shutil
+from .allocation import Allocations, DayAllocation, allocations_path
+from .journal import Journal
+from .projects import ProjectRegistry, projects_path
+from .sqlite_store import SqliteStore, SUFFIX as SQLITE_SUFFIX
+from .store import TimeStore, Row
+from .testdata import load_from_json, save_as_json, ProgressCallback
+from .util import replacing
+
+logger = getLogger(__name__)
+
+Store = Union[TimeStore, SqliteStore]
+
+
+def open_db(filepath: Path, progress: ProgressCallback = None) -> Store:
+    """ Open a JSON database, including its journal, or an SQLite database """
+    if filepath.suffix == SQLITE_SUFFIX:
+        return SqliteStore(filepath)
+    store = load_from_json(filepath, progress)
+    replayed = Journal(filepath).replay(store)
+    if replayed:
+        logger.info(f"Replayed {replayed} journal entries for {filepath}")
+    return store
+
+
+def open_with_projects(filepath: Path, progress: ProgressCallback = None) \
+        -> tuple[Store, ProjectRegistry, dict[date, DayAllocation]]:
+    """ Open a database together with its project registry and project allocations """
+    store = open_db(filepath, progress)
+    registry = ProjectRegistry()
+    registry.load(projects_path(filepath))
+    return store, registry, Allocations.read(allocations_path(filepath))
+
+
+def save_projects(filepath: Path, registry_dict: dict, allocations_dict: dict):
+    """ Write the serialized project registry and allocations of a database next to it """
+    ProjectRegistry.write(projects_path(filepath), registry_dict)
+    Allocations.write(allocations_path(filepath), allocations_dict)
+
+
+def save_json(store: Store, filepath: Path, progress: ProgressCallback = None):
+    """
+    Write the store as a JSON database, replacing the file only once it is completely written. An SQLite store is
+    expected to be a copy made for this call, and is closed afterwards.
+    """
+    with replacing(filepath) as tmp_path:
+        save_as_json(store, tmp_path, progress)
+    if isinstance(store, SqliteStore):
+        store.close()
+
+
+def update_came_went(store: Store, now: datetime) -> Row:
+    """ Stretch the came and went times of today to include now """
+    day = now.date()
+    row = store.get(day)
+    if row is None or row.came is None or row.went is None:
+        return store.upsert(day, came=now.time(), went=now.time())
+    return store.upsert(day, came=min(now.time(), row.came), went=max(now.time(), row.went))
+
+
+def save_sqlite(store: Store, filepath: Path, progress: ProgressCallback = None):
+    """
+    Export the store as an SQLite database, replacing the file only once it is completely written, so that days of
+    an existing file are not kept. An SQLite store is closed afterwards, like in save_json
+    """
+    total = max(len(store), 1)
+
+    def rows():
+        for i, row in enumerate(store.items()):
+            if progress is not None and i % 1000 == 0:
+                progress(i * 100 // total)
+            yield row
+
+    with replacing(filepath) as tmp_path:
+        tmp_path.unlink(missing_ok=True)
+        sqlite_store = SqliteStore(tmp_path)
+        try:
+            sqlite_store.insert_rows(rows())
+        finally:
+            sqlite_store.close()
+    if isinstance(store, SqliteStore):
+        store.close()
+
+
+def import_json(json_path: Path, sqlite_path: Path, progress: ProgressCallback = None) -> SqliteStore:
+    """
+    Convert a JSON database, with the entries of its journal, into an SQLite database. An existing SQLite database
+    is replaced rather than merged into. The project registry and allocations are copied along
+    """
+    save_sqlite(open_db(json_path, progress), sqlite_path)
+    for side_path in (projects_path, allocations_path):
+        if side_path(json_path).exists():
+            shutil.copyfile(side_path(json_path), side_path(sqlite_path))
+    logger.info(f"Imported {json_path} into {sqlite_path}")
+    return SqliteStore(sqlite_path)
@@ -0,0 +1,88 @@
+from datetime import date, timedelta
+from functools import lru_cache
+from typing import Iterable, NamedTuple
+from .session import TimeViewType
+
+# Number of days loaded at a time in the timeline view
+TIMELINE_PAGE_SIZE = 31
+
+_holidays: frozenset[date] = frozenset()
+
+
+class DayInfo(NamedTuple):
+    week: int
+    weekday_name: str
+    is_weekend: bool
+    is_holiday: bool
+
+    @property
+    def is_workday(self) -> bool:
+        return not (self.is_weekend or self.is_holiday)
+
+
+def set_holidays(days: Iterable[date]):
+    global _holidays
+    _holidays = frozenset(days)
+    _year_table.cache_clear()
+
+
+@lru_cache(maxsize=8)
+def _year_table(year: int) -> tuple[DayInfo, ...]:
+    first = date(year, 1, 1)
+    days = (first + timedelta(days=i) for i in range((date(year + 1, 1, 1) - first).days))
+    return tuple(
+        DayInfo(day.isocalendar().week, day.strftime("%A"), day.weekday() >= 5, day in _holidays) for day in days)
+
+
+def day_info(day: date) -> DayInfo:
+    """ Calendar metadata of a day, from a table built once per year """
+    return _year_table(day.year)[day.timetuple().tm_yday - 1]
+
+
+def _last_of_month(day: date) -> date:
+    # Get last day of month: https://stackoverflow.com/a/13565185/4713758
+    next_month = date(day.year, day.month, 28) + timedelta(days=4)
+    return next_month - timedelta(days=next_month.day)
+
+
+@lru_cache(maxsize=256)
+def view_range(view_type: TimeViewType, view_date: date) -> tuple[date, date]:
+    """ First and last day, both inclusive, shown by a view """
+    if view_type == TimeViewType.AROUND_DAY:
+        return view_date - timedelta(days=10), view_date + timedelta(days=10)
+    elif view_type == TimeViewType.WEEK:
+        year, week, day = view_date.isocalendar()
+        return date.fromisocalendar(year, week, 1), date.fromisocalendar(year, week, 7)
+    elif view_type == TimeViewType.MONTH:
+        return date(view_date.year, view_date.month, 1), _last_of_month(view_date)
+    elif view_type == TimeViewType.TIMELINE:
+        # A page on each side of the view date, more are loaded on demand when scrolling
+        return view_date - timedelta(days=TIMELINE_PAGE_SIZE), view_date + timedelta(days=TIMELINE_PAGE_SIZE - 1)
+    return view_date, view_date
+
+
+@lru_cache(maxsize=256)
+def step(view_type: TimeViewType, view_date: date, forward: bool) -> date:
+    """ The view date of the next or previous period """
+    if view_type == TimeViewType.MONTH:
+        month_index = view_date.year * 12 + view_date.month - 1 + (1 if forward else -1)
+        first = date(month_index // 12, month_index % 12 + 1, 1)
+        return first.replace(day=min(view_date.day, _last_of_month(first).day))
+    elif view_type == TimeViewType.WEEK:
+        days = 7
+    elif view_type == TimeViewType.TIMELINE:
+        days = TIMELINE_PAGE_SIZE
+    else:
+        days = 1
+    return view_date + timedelta(days=days if forward else -days)
+
+
+@lru_cache(maxsize=256)
+def period_label(view_type: TimeViewType, view_date: date, start_date: date, end_date: date) -> str:
+    if view_type == TimeViewType.MONTH:
+        return view_date.strftime("%B, %Y")
+    elif view_type == TimeViewType.WEEK:
+        return f"Week {view_date.strftime('%V, %Y')}"
+    elif view_type == TimeViewType.DAY:
+        return str(view_date)
+    return f"{start_date} - {end_date}"
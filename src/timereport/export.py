@@ -0,0 +1,310 @@
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from datetime import date, datetime, time, timedelta, timezone
+from importlib.metadata import entry_points
+from logging import getLogger
+from operator import attrgetter
+from pathlib import Path
+from typing import Iterable, Iterator, TextIO, Union
+import csv
+import heapq
+from .aggregate import Period, PeriodTotal, net_seconds, period_bounds, workdays
+from .allocation import DayAllocation, split_day
+from .sqlite_store import SqliteStore
+from .store import ObservableStore, Row, MISSING, time_to_seconds
+from .testdata import ProgressCallback
+from .util import format_duration, replacing
+
+logger = getLogger(__name__)
+
+# Entry point group of the packages adding export formats
+ENTRY_POINT_GROUP = "timereport.export"
+# Number of days read from the store at a time
+CHUNK_DAYS = 366
+
+
+@dataclass
+class DayRecord:
+    date: date
+    came: Union[time, None]
+    went: Union[time, None]
+    worked: timedelta
+    lunch: timedelta
+    note: str
+    # Time per project, when exported together with the project allocations
+    projects: dict[str, timedelta] = field(default_factory=dict)
+
+    @property
+    def net(self) -> timedelta:
+        """ Worked time with lunch deducted """
+        return self.worked - self.lunch
+
+
+@dataclass
+class PeriodRecord:
+    total: PeriodTotal
+    projects: dict[str, timedelta] = field(default_factory=dict)
+
+
+def select(store: ObservableStore, start: date, end: date, extra_days: Iterable[date] = (),
+           progress: ProgressCallback = None) -> Iterator[Row]:
+    """
+    The rows between start and end, both inclusive, in date order. The store is read a chunk of days at a time, so
+    that only one chunk of an SQLite database is in memory. Days of extra_days without a row, e.g. days with only
+    project time, are yielded as empty rows.
+    """
+    total = (end - start).days + 1
+
+    def chunks() -> Iterator[Row]:
+        chunk_start = start
+        while chunk_start <= end:
+            chunk_end = min(chunk_start + timedelta(days=CHUNK_DAYS - 1), end)
+            yield from store.range(chunk_start, chunk_end)
+            if progress is not None:
+                progress(((chunk_end - start).days + 1) * 100 // total)
+            chunk_start = chunk_end + timedelta(days=1)
+
+    extra = (Row(day) for day in sorted(d for d in extra_days if start <= d <= end))
+    previous = None
+    # Rows of the store come before the empty rows of the same day
+    for row in heapq.merge(chunks(), extra, key=attrgetter("date")):
+        if row.date != previous:
+            previous = row.date
+            yield row
+
+
+def join(rows: Iterable[Row], lunch_interval: tuple[time, time], allocations: dict[date, DayAllocation] = None,
+         default_main: str = "") -> Iterator[DayRecord]:
+    """ The record of each row, with the worked time and lunch, and the time per project if given the allocations """
+    lunch_from, lunch_to = (time_to_seconds(t) for t in lunch_interval)
+    for row in rows:
+        came, went = row.came_seconds, row.went_seconds
+        net = net_seconds(came, went, lunch_from, lunch_to)
+        worked = 0 if came == MISSING or went == MISSING else max(went - came, 0)
+        projects = {}
+        if allocations is not None:
+            split = split_day(allocations.get(row.date, DayAllocation()), default_main, net)
+            projects = {project: timedelta(seconds=seconds) for project, seconds in split.items()}
+        yield DayRecord(row.date, row.came, row.went, timedelta(seconds=worked), timedelta(seconds=worked - net),
+                        row.note or "", projects)
+
+
+def aggregate(records: Iterable[DayRecord], period: Period, start: date, end: date,
+              daily_norm: timedelta) -> Iterator[PeriodRecord]:
+    """
+    Totals per period between start and end, both inclusive, with the first and last periods clipped like totals().
+    The records have to be in date order, and only the totals of the current period are kept.
+    """
+    records = iter(records)
+    record = next(records, None)
+    for first, last in period_bounds(start, end, period):
+        worked = lunch = timedelta()
+        days_worked = 0
+        projects: dict[str, timedelta] = {}
+        while record is not None and record.date <= last:
+            if record.date >= first:
+                worked += record.worked
+                lunch += record.lunch
+                days_worked += record.came is not None and record.went is not None
+                for project, duration in record.projects.items():
+                    projects[project] = projects.get(project, timedelta()) + duration
+            record = next(records, None)
+        yield PeriodRecord(PeriodTotal(first, last, worked, lunch, daily_norm * workdays(first, last), days_worked),
+                           projects)
+
+
+def format_projects(projects: dict[str, timedelta]) -> str:
+    """ E.g. ABC=1:30;DEF=6:00 """
+    return ";".join(f"{project}={format_duration(duration)}" for project, duration in sorted(projects.items()))
+
+
+class Sink(ABC):
+    """
+    An output format, written to one record at a time so that exports stream. Company-specific formats subclass it
+    and are added with register_sink, or by another package with an entry point in the timereport.export group.
+    Formats without totals per period implement write_period by raising ValueError.
+    """
+    name = ""
+    description = ""
+    suffix = ""
+    # Whether totals per period can be written, and not only days
+    periods = False
+
+    def __init__(self, out: TextIO):
+        self.out = out
+
+    def begin(self, period: Union[Period, None]):
+        """ Called before the first record, with the period of the totals or None for days """
+
+    @abstractmethod
+    def write_day(self, record: DayRecord):
+        pass
+
+    @abstractmethod
+    def write_period(self, record: PeriodRecord):
+        pass
+
+    def end(self):
+        """ Called after the last record """
+
+
+SINKS: dict[str, type[Sink]] = {}
+_plugins_loaded = False
+
+
+def register_sink(sink: type[Sink]) -> type[Sink]:
+    """ Add an output format under its name. Can be used as a class decorator """
+    SINKS[sink.name] = sink
+    return sink
+
+
+def sinks() -> dict[str, type[Sink]]:
+    """ The built-in output formats and the ones of installed plugins """
+    global _plugins_loaded
+    if not _plugins_loaded:
+        _plugins_loaded = True
+        for entry_point in entry_points(group=ENTRY_POINT_GROUP):
+            try:
+                plugin = entry_point.load()
+            except Exception as e:
+                logger.warning(f"Could not load the export format {entry_point.name}: {e}")
+                continue
+            # Either a Sink, or a module that registers its sinks when imported
+            if isinstance(plugin, type) and issubclass(plugin, Sink):
+                register_sink(plugin)
+    return SINKS
+
+
+@register_sink
+class CsvSink(Sink):
+    name = "csv"
+    description = "Comma separated values"
+    suffix = ".csv"
+    periods = True
+
+    def __init__(self, out: TextIO):
+        super().__init__(out)
+        self._writer = csv.writer(out)
+
+    def begin(self, period: Union[Period, None]):
+        if period is None:
+            self._writer.writerow(["date", "came", "went", "worked", "lunch", "net", "note", "projects"])
+        else:
+            self._writer.writerow(["start", "end", "days_worked", "worked", "lunch", "net", "norm", "overtime",
+                                   "projects"])
+
+    def write_day(self, record: DayRecord):
+        self._writer.writerow([
+            record.date.isoformat(),
+            "" if record.came is None else f"{record.came:%H:%M}",
+            "" if record.went is None else f"{record.went:%H:%M}",
+            format_duration(record.worked), format_duration(record.lunch), format_duration(record.net),
+            record.note, format_projects(record.projects)])
+
+    def write_period(self, record: PeriodRecord):
+        total = record.total
+        self._writer.writerow([
+            total.start.isoformat(), total.end.isoformat(), total.days_worked,
+            format_duration(total.worked), format_duration(total.lunch), format_duration(total.net),
+            format_duration(total.norm), format_duration(total.overtime, sign=True),
+            format_projects(record.projects)])
+
+
+def _escape_text(s: str) -> str:
+    return s.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,").replace("\n", "\\n")
+
+
+def _fold(line: str) -> str:
+    """ Lines longer than 75 octets continue on the next line, which starts with a space (RFC 5545 3.1) """
+    parts = []
+    length = 0
+    start = 0
+    for i, c in enumerate(line):
+        size = len(c.encode())
+        if length + size > 75:
+            parts.append(line[start:i])
+            start = i
+            # The space of the continuation line counts too
+            length = 1
+        length += size
+    parts.append(line[start:])
+    return "\r\n ".join(parts) + "\r\n"
+
+
+@register_sink
+class ICalendarSink(Sink):
+    """ An event for each day with came and went times, in local time """
+    name = "ical"
+    description = "iCalendar"
+    suffix = ".ics"
+
+    def __init__(self, out: TextIO, stamp: datetime = None):
+        super().__init__(out)
+        self.stamp = (stamp or datetime.now(timezone.utc)).strftime("%Y%m%dT%H%M%SZ")
+
+    def _write(self, *lines: str):
+        self.out.write("".join(map(_fold, lines)))
+
+    def begin(self, period: Union[Period, None]):
+        self._write("BEGIN:VCALENDAR", "VERSION:2.0", "PRODID:-//trep//export//EN")
+
+    def write_day(self, record: DayRecord):
+        if record.came is None or record.went is None:
+            return
+        day = f"{record.date:%Y%m%d}"
+        description = "\n".join(filter(None, [record.note, format_projects(record.projects)]))
+        self._write(
+            "BEGIN:VEVENT",
+            f"UID:{record.date.isoformat()}@trep",
+            f"DTSTAMP:{self.stamp}",
+            f"DTSTART:{day}T{record.came:%H%M%S}",
+            f"DTEND:{day}T{record.went:%H%M%S}",
+            f"SUMMARY:Work {format_duration(record.net)} h",
+            *([f"DESCRIPTION:{_escape_text(description)}"] if description else []),
+            "END:VEVENT")
+
+    def write_period(self, record: PeriodRecord):
+        raise ValueError(f"The {self.name} format cannot export totals per period")
+
+    def end(self):
+        self._write("END:VCALENDAR")
+
+
+def export(store: ObservableStore, sink: Sink, start: date, end: date, lunch_interval: tuple[time, time],
+           period: Period = None, daily_norm: timedelta = timedelta(hours=8),
+           allocations: dict[date, DayAllocation] = None, default_main: str = "",
+           progress: ProgressCallback = None) -> int:
+    """
+    Stream the days between start and end, both inclusive, or their totals per period, through the sink. Only a
+    chunk of days is read at a time, so the memory use does not grow with the range. Returns the number of records
+    """
+    if period is not None and not sink.periods:
+        raise ValueError(f"The {sink.name} format cannot export totals per {period.name.lower()}")
+    extra_days = () if allocations is None else (day for day, a in allocations.items() if a.deltas)
+    records = join(select(store, start, end, extra_days, progress), lunch_interval, allocations, default_main)
+    if period is None:
+        write = sink.write_day
+    else:
+        records = aggregate(records, period, start, end, daily_norm)
+        write = sink.write_period
+    count = 0
+    sink.begin(period)
+    for record in records:
+        write(record)
+        count += 1
+    sink.end()
+    return count
+
+
+def export_file(store: ObservableStore, filepath: Path, format_name: str, *args, progress: ProgressCallback = None,
+                **kwargs) -> int:
+    """
+    Export to a file, replacing it only once it is completely written. Like for save_json, an SQLite store is
+    expected to be a copy made for this call, and is closed afterwards
+    """
+    # The sinks decide the line endings, e.g. CRLF for CSV and iCalendar
+    with replacing(filepath) as tmp_path, open(tmp_path, "w", encoding="utf-8", newline="") as f:
+        count = export(store, sinks()[format_name](f), *args, progress=progress, **kwargs)
+    if isinstance(store, SqliteStore):
+        store.close()
+    return count
@@ -23,6 +23,7 @@ class SettingsDialog(QDialog):
         # Default values
         self.ui.time_lunch_from.setTime(self.session_settings.lunch_interval[0])
         self.ui.time_lunch_to.setTime(self.session_settings.lunch_interval[1])
+        self.ui.edit_main_project.setText(self.session_settings.main_project)
 
     def update_lunch_from_time(self, t: QTime):
         if self.ui.time_lunch_to.time() < t:
@@ -47,6 +48,7 @@ class SettingsDialog(QDialog):
             qtime_to_time(self.ui.time_lunch_from.time()),
             qtime_to_time(self.ui.time_lunch_to.time())
         ]
+        self.session_settings.main_project = self.ui.edit_main_project.text().strip()
 
 
 def main():
@@ -0,0 +1,70 @@
+"""
+Client side of the single running instance of trep. The instance listens on a local socket, and later `trep`
+invocations forward their commands to it instead of starting another application.
+
+Requests and replies are single lines of JSON. This module does not import Qt, so forwarding a command is fast.
+"""
+from typing import Union
+import getpass
+import json
+import os
+import socket
+import tempfile
+
+TIMEOUT = 2.0
+
+
+def server_name() -> str:
+    """ The name to listen on with QLocalServer. A socket path on POSIX, where Qt and Python agree on the format """
+    name = f"trep-{getpass.getuser()}"
+    if os.name == "posix":
+        return os.path.join(tempfile.gettempdir(), f"{name}.sock")
+    return name
+
+
+def encode(message: dict) -> bytes:
+    return json.dumps(message).encode() + b"\n"
+
+
+def send(command: str, args: list[str] = (), timeout: float = TIMEOUT) -> Union[dict, None]:
+    """ Send a command to the running instance. The reply has ok and message, or is None if nothing is running """
+    request = encode(dict(command=command, args=list(args)))
+    if os.name == "posix":
+        reply = _send_unix(request, timeout)
+    else:
+        reply = _send_qt(request, timeout)
+    # An instance that closes the connection without replying is treated like no instance
+    return json.loads(reply) if reply else None
+
+
+def _send_unix(request: bytes, timeout: float) -> Union[bytes, None]:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.settimeout(timeout)
+        reply = b""
+        try:
+            s.connect(server_name())
+            s.sendall(request)
+            while not reply.endswith(b"\n"):
+                chunk = s.recv(4096)
+                if not chunk:
+                    break
+                reply += chunk
+        except OSError:
+            # No instance, a stale socket, or a hung instance that timed out
+            return None
+        return reply
+
+
+def _send_qt(request: bytes, timeout: float) -> Union[bytes, None]:
+    from PySide6.QtNetwork import QLocalSocket
+    s = QLocalSocket()
+    s.connectToServer(server_name())
+    if not s.waitForConnected(int(timeout * 1000)):
+        return None
+    s.write(request)
+    s.waitForBytesWritten(int(timeout * 1000))
+    while not s.canReadLine() and s.waitForReadyRead(int(timeout * 1000)):
+        pass
+    reply = bytes(s.readLine())
+    s.disconnectFromServer()
+    return reply
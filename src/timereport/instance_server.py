@@ -0,0 +1,62 @@
+from PySide6.QtCore import QObject
+from PySide6.QtNetwork import QLocalServer, QLocalSocket
+from logging import getLogger
+from functools import partial
+from typing import Callable
+import json
+from . import instance
+
+logger = getLogger(__name__)
+
+# Called with the command and its arguments, returns the message to reply with or raises an exception
+CommandHandler = Callable[[str, list[str]], str]
+
+
+class InstanceServer(QObject):
+    """ Receives the commands of later `trep` invocations, see the instance module """
+
+    def __init__(self, handler: CommandHandler, parent: QObject = None):
+        super().__init__(parent)
+        self.handler = handler
+        self._server = QLocalServer(self)
+        self._server.setSocketOptions(QLocalServer.UserAccessOption)
+        self._server.newConnection.connect(self._accept)
+
+    def listen(self) -> bool:
+        """ Start listening, unless another instance already is """
+        name = instance.server_name()
+        if self._server.listen(name):
+            return True
+        if instance.send("ping") is not None:
+            return False
+        # Left behind by an instance that crashed
+        logger.info(f"Removing stale instance socket {name}")
+        QLocalServer.removeServer(name)
+        return self._server.listen(name)
+
+    def close(self):
+        self._server.close()
+
+    def _accept(self):
+        while self._server.hasPendingConnections():
+            socket = self._server.nextPendingConnection()
+            # Bound now, a lambda would read whichever socket was accepted last
+            socket.readyRead.connect(partial(self._read, socket))
+            socket.disconnected.connect(socket.deleteLater)
+            # The request may have arrived before readyRead was connected
+            self._read(socket)
+
+    def _read(self, socket: QLocalSocket):
+        if not socket.canReadLine():
+            return
+        try:
+            request = json.loads(bytes(socket.readLine()))
+            command, args = request["command"], request.get("args", [])
+            message = "pong" if command == "ping" else self.handler(command, args)
+            reply = dict(ok=True, message=message)
+        except Exception as e:
+            logger.warning(f"Instance command failed: {e}")
+            reply = dict(ok=False, message=str(e))
+        socket.write(instance.encode(reply))
+        socket.flush()
+        socket.disconnectFromServer()
@@ -0,0 +1,180 @@
+from datetime import date
+from pathlib import Path
+from typing import Union
+from logging import getLogger
+import json
+import os
+import queue
+import threading
+from .store import TimeStore, Row
+from .testdata import save_as_json, format_time_json, parse_time_json
+from .util import replacing
+
+logger = getLogger(__name__)
+
+
+def _truncate_broken_entry(path: Path):
+    """
+    Cut off an incomplete last line, left by a crash while writing. Otherwise the next entry would be appended to
+    it, and both would be skipped as broken when replaying
+    """
+    if not path.exists():
+        return
+    with open(path, 'rb+') as f:
+        data = f.read()
+        if data and not data.endswith(b"\n"):
+            end = data.rfind(b"\n") + 1
+            logger.warning(f"Removing broken journal entry from {path}: {data[end:]!r}")
+            f.truncate(end)
+
+
+class Journal:
+    """
+    Append-only log of day changes, kept next to a snapshot file.
+
+    Every change to the attached store is appended as the full new state of that day, so replaying the snapshot
+    and then the journal in order gives back the latest state. The entries are written and synced by a writer
+    thread, in order, so that a slow disk does not hold up edits. Compaction writes a new snapshot in the background
+    and then drops the journal entries it contains.
+    """
+    COMPACT_AFTER = 1000  # Number of journal entries before compacting automatically
+
+    def __init__(self, snapshot: Path):
+        self.snapshot = snapshot
+        self.path = snapshot.with_name(snapshot.name + ".journal")
+        # Journal being folded into the snapshot by an ongoing (or crashed) compaction
+        self.compacting_path = snapshot.with_name(snapshot.name + ".journal.compacting")
+        self._store: Union[TimeStore, None] = None
+        self._file = None
+        self._entries = 0
+        self._lock = threading.Lock()
+        self._compaction: Union[threading.Thread, None] = None
+        # Lines for the writer thread, with None to stop it
+        self._queue: queue.Queue[Union[str, None]] = queue.Queue()
+        self._writer: Union[threading.Thread, None] = None
+
+    def replay(self, store: TimeStore) -> int:
+        """ Apply the journal entries on top of a store loaded from the snapshot. Returns the number of entries """
+        count = 0
+        for path in (self.compacting_path, self.path):
+            if not path.exists():
+                continue
+            with open(path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # An incomplete last line from a crash while writing
+                        logger.warning(f"Skipping broken journal entry in {path}: {line!r}")
+                        continue
+                    day = date.fromisoformat(entry["day"])
+                    if entry.get("deleted"):
+                        store.delete(day)
+                    else:
+                        store.insert_rows([Row(
+                            day, parse_time_json(entry["came"]), parse_time_json(entry["went"]), entry["note"])])
+                    count += 1
+        self._entries = count
+        return count
+
+    def discard(self):
+        """ Remove journal files left over from earlier sessions, e.g. when the snapshot has been overwritten """
+        self.path.unlink(missing_ok=True)
+        self.compacting_path.unlink(missing_ok=True)
+        self._entries = 0
+
+    def attach(self, store: TimeStore):
+        """ Start journaling the changes of the store """
+        for path in (self.compacting_path, self.path):
+            _truncate_broken_entry(path)
+        self._store = store
+        self._file = open(self.path, 'a')
+        self._writer = threading.Thread(target=self._write_entries, name="journal-writer", daemon=True)
+        self._writer.start()
+        store.add_batch_listener(self._on_changes)
+
+    def detach(self):
+        if self._store is not None:
+            self._store.remove_batch_listener(self._on_changes)
+            self._store = None
+        if self._writer is not None:
+            self._queue.put(None)
+            self._writer.join()
+            self._writer = None
+        self.wait()
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def _entry(self, day: date) -> str:
+        row = self._store.get(day)
+        if row is None:
+            return f'{{"day": "{day.isoformat()}", "deleted": true}}\n'
+        return f'{{"day": "{day.isoformat()}", "came": {format_time_json(row.came_seconds)}, ' \
+               f'"went": {format_time_json(row.went_seconds)}, "note": {json.dumps(row.note)}}}\n'
+
+    def _on_changes(self, changes: dict[date, tuple[str, ...]]):
+        """ Queue the changed days for the writer thread. The entries are made here, as the store is not thread-safe """
+        self._queue.put("".join(self._entry(day) for day in changes))
+        self._entries += len(changes)
+        if self._entries >= self.COMPACT_AFTER:
+            self.compact()
+
+    def _write_entries(self):
+        """ Append the queued entries, synced once for all the entries queued meanwhile """
+        stop = False
+        while not stop:
+            lines = [self._queue.get()]
+            while not self._queue.empty():
+                lines.append(self._queue.get_nowait())
+            stop = None in lines
+            try:
+                with self._lock:
+                    self._file.write("".join(line for line in lines if line is not None))
+                    self._file.flush()
+                    os.fsync(self._file.fileno())
+            except Exception:
+                logger.exception(f"Error while writing the journal {self.path}")
+            for _ in lines:
+                self._queue.task_done()
+
+    def sync(self):
+        """ Wait until the changes so far are written to disk """
+        if self._writer is not None:
+            self._queue.join()
+
+    def compact(self):
+        """ Write a new snapshot in a background thread and drop the journal entries it contains """
+        if self._compaction is not None and self._compaction.is_alive():
+            return
+        # The entries queued so far are in the snapshot, so they belong to the journal that it replaces
+        self.sync()
+        with self._lock:
+            self._file.close()
+            if self.compacting_path.exists() and self.path.exists():
+                # A previous compaction did not finish, so its entries are still needed
+                with open(self.compacting_path, 'a') as f, open(self.path) as journal:
+                    f.write(journal.read())
+                self.path.unlink()
+            elif self.path.exists():
+                self.path.rename(self.compacting_path)
+            self._file = open(self.path, 'a')
+            self._entries = 0
+            snapshot = self._store.copy()
+        self._compaction = threading.Thread(target=self._write_snapshot, args=(snapshot, ), name="journal-compaction")
+        self._compaction.start()
+
+    def _write_snapshot(self, snapshot: TimeStore):
+        try:
+            with replacing(self.snapshot) as tmp_path:
+                save_as_json(snapshot, tmp_path)
+            self.compacting_path.unlink(missing_ok=True)
+            logger.info(f"Compacted journal into {self.snapshot}")
+        except BaseException:
+            logger.exception(f"Error while compacting the journal of {self.snapshot}")
+
+    def wait(self):
+        """ Wait for an ongoing compaction to finish """
+        if self._compaction is not None:
+            self._compaction.join()
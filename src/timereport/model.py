@@ -1,4 +1,4 @@
-from PySide6.QtCore import QAbstractTableModel, QModelIndex, Qt, Signal
+from PySide6.QtCore import QAbstractTableModel, QModelIndex, Qt, Signal, QTimer
 from PySide6.QtGui import QIcon, QFont, QColor
 from PySide6 import QtCore, QtWidgets
 from dataclasses import dataclass
@@ -7,9 +7,12 @@ from enum import Enum
 from typing import Union
 import threading
 from logging import getLogger
+from .bulk import Changes, apply_changes
+from .dates import day_info, step, view_range, TIMELINE_PAGE_SIZE
+from .period_cache import PeriodCache
 from .session import SessionSettings, TimeViewType
-from . import testdata
-from .util import time_to_timedelta
+from .store import TimeStore, Row
+from .undo import UndoHistory
 
 logger = getLogger(__name__)
 
@@ -28,13 +31,23 @@ class RowColors(Enum):
 
 
 @dataclass
-class Row:
-    date: date
-    came: time
-    went: time
-    total: timedelta
-    note: str
-    
+class RowRender:
+    """ Preformatted role values for one row, so that painting does not have to format anything """
+    display: list
+    edit: list
+    background: Union[QColor, None]
+    decoration: Union[QIcon, None]
+    header: str
+
+
+@dataclass
+class PeriodRows:
+    """ The rows of a period, as shown by the model, so that switching to a cached period only swaps them in """
+    days: list[date]
+    day_rows: dict[date, int]
+    render_cache: list[RowRender]
+    data: dict[date, Row]
+
 
 class TimeDelegate(QtWidgets.QStyledItemDelegate):
     def createEditor(self, parent: QtWidgets.QWidget, option: QtWidgets.QStyleOptionViewItem, index: QModelIndex):
@@ -57,16 +70,44 @@ class TimeDelegate(QtWidgets.QStyledItemDelegate):
 
 class TableModel(QAbstractTableModel):
     HEADERS = ("week", "weekday", "came", "went", "total", "note")
+    # Number of days loaded at a time in the timeline view, and the number of pages kept in memory
+    PAGE_SIZE = TIMELINE_PAGE_SIZE
+    MAX_PAGES = 6
+    # Rows of the periods kept for navigating back and forth, e.g. a year of months and weeks
+    CACHED_ROWS = 800
+    # Time without navigation before the next and previous periods are built
+    PREFETCH_DELAY_MS = 200
     data_updated = Signal(date, date, date)
 
-    def __init__(self, session_settings: SessionSettings):
+    def __init__(self, session_settings: SessionSettings, store: TimeStore):
         super().__init__()
         self._data_lock = threading.Lock()
         self._data: dict[date, Row] = {}
+        # Ordered row index, rebuilt by fetch_data, for O(1) row <-> date lookups
+        self._days: list[date] = []
+        self._day_rows: dict[date, int] = {}
+        # Render cache, parallel to self._days
+        self._render_cache: list[RowRender] = []
+        # View type and first day of the shown period, None when its rows cannot be cached, e.g. in the timeline
+        self._period_key: Union[tuple[TimeViewType, date], None] = None
+        # Other periods, shown before or prefetched. The shown period is not in it
+        self.period_cache = PeriodCache(self.CACHED_ROWS)
+        self._prefetch_timer = QTimer(self)
+        self._prefetch_timer.setSingleShot(True)
+        self._prefetch_timer.setInterval(self.PREFETCH_DELAY_MS)
+        self._prefetch_timer.timeout.connect(self.prefetch)
+        self._today: date = date.today()
+        self._header_font = QFont()
+        self._header_font.setBold(True)
+        self._icon_done = QIcon.fromTheme("emblem-default")
+        self._icon_missing = QIcon.fromTheme("image-missing")
         self.columns = []
         self.headers = []
         self.session_settings = session_settings
-        self.dataChanged.connect(lambda *args: self.fetch_data())
+        self.store = store
+        # Edits are undoable when set
+        self.history: Union[UndoHistory, None] = None
+        self.store.add_batch_listener(self._on_store_changed)
 
     def setup_column_width(self, view: QtWidgets.QTableView):
         """ Set up the preferred width of each column """
@@ -76,36 +117,180 @@ class TableModel(QAbstractTableModel):
         view.verticalHeader().setSectionResizeMode(QtWidgets.QHeaderView.ResizeToContents)
 
     def fetch_data(self):
-        if self.session_settings.time_view_type == TimeViewType.AROUND_DAY:
-            start_day = self.session_settings.view_date - timedelta(days=10)
-            end_day = self.session_settings.view_date + timedelta(days=10)
-        elif self.session_settings.time_view_type == TimeViewType.WEEK:
-            year, week, day = self.session_settings.view_date.isocalendar()
-            start_day = date.fromisocalendar(year, week, 1)
-            end_day = date.fromisocalendar(year, week, 7)
-        elif self.session_settings.time_view_type == TimeViewType.MONTH:
-            start_day = date(self.session_settings.view_date.year, self.session_settings.view_date.month, 1)
-            # Get last day of month: https://stackoverflow.com/a/13565185/4713758
-            next_month = date(self.session_settings.view_date.year, self.session_settings.view_date.month, 28) + timedelta(days=4)
-            end_day = next_month - timedelta(days=next_month.day)
-        else:
-            start_day = end_day = self.session_settings.view_date
+        view_type = self.session_settings.time_view_type
+        start_day, end_day = view_range(view_type, self.session_settings.view_date)
+        if self._today != date.today():
+            # The shown and cached rows have the wrong day as today
+            self.period_cache.clear()
+            self._period_key = None
+            self._today = date.today()
+        key = None if view_type == TimeViewType.TIMELINE else (view_type, start_day)
+        if key is not None and key != self._period_key:
+            self._switch_period(key, start_day, end_day)
+            return
+        if key is None:
+            self._cache_shown_period()
+        new_data, render_cache = self._load_rows(start_day, end_day)
+        days = list(new_data.keys())
+
+        # Only announce the rows that actually appear or disappear, the rest are updated in place
+        old_count, new_count = len(self._days), len(days)
+        if new_count < old_count:
+            self.beginRemoveRows(QModelIndex(), new_count, old_count - 1)
+            with self._data_lock:
+                self._set_rows(self._days[:new_count], self._render_cache[:new_count], self._data)
+            self.endRemoveRows()
 
-        wanted_days = (start_day + timedelta(days=i) for i in range((end_day - start_day).days + 1))
-        new_data = {}
-        for day in wanted_days:
-            try:
-                data = testdata.test_table_days[day]
-                came = data["came"]
-                went = data["went"]
-                total = time_to_timedelta(went) - time_to_timedelta(came)
-                new_data[day] = Row(day, came, went, total, data["note"])
-            except KeyError:
-                new_data[day] = Row(day, None, None, None, None)
+        kept_count = min(old_count, new_count)
         with self._data_lock:
-            self._data = new_data
+            self._set_rows(days[:kept_count], render_cache[:kept_count], new_data)
+        if kept_count > 0:
+            self.dataChanged.emit(self.index(0, 0), self.index(kept_count - 1, len(self.HEADERS) - 1), [])
+            self.headerDataChanged.emit(Qt.Vertical, 0, kept_count - 1)
+
+        if new_count > old_count:
+            self.beginInsertRows(QModelIndex(), old_count, new_count - 1)
+            with self._data_lock:
+                self._set_rows(days, render_cache, new_data)
+            self.endInsertRows()
+        self._period_key = key
         self.data_updated.emit(self.session_settings.view_date, start_day, end_day)
-        self.layoutChanged.emit()
+        if key is not None:
+            self._prefetch_timer.start()
+
+    def _switch_period(self, key: tuple[TimeViewType, date], start_day: date, end_day: date):
+        """ Show another period, swapping in its rows if they are cached. The rows shown are cached instead """
+        rows = self.period_cache.take(key) or self._build_period(start_day, end_day)
+        self.beginResetModel()
+        with self._data_lock:
+            self._cache_shown_period()
+            self._data = rows.data
+            self._days = rows.days
+            self._day_rows = rows.day_rows
+            self._render_cache = rows.render_cache
+            self._period_key = key
+        self.endResetModel()
+        self.data_updated.emit(self.session_settings.view_date, start_day, end_day)
+        self._prefetch_timer.start()
+
+    def _cache_shown_period(self):
+        """
+        Keep the rows of the shown period when leaving it. They are not copied, since showing another period
+        replaces them rather than changing them
+        """
+        if self._period_key is not None:
+            self.period_cache.put(self._period_key, self._days[0], self._days[-1], PeriodRows(
+                self._days, self._day_rows, self._render_cache, self._data))
+            self._period_key = None
+
+    def _build_period(self, start_day: date, end_day: date) -> PeriodRows:
+        data, render_cache = self._load_rows(start_day, end_day)
+        days = list(data.keys())
+        return PeriodRows(days, {day: i for i, day in enumerate(days)}, render_cache, data)
+
+    def prefetch(self):
+        """ Build the periods before and after the shown one, unless they are cached already """
+        if self._period_key is None:
+            return
+        view_type = self.session_settings.time_view_type
+        for forward in (True, False):
+            start_day, end_day = view_range(view_type, step(view_type, self.session_settings.view_date, forward))
+            key = (view_type, start_day)
+            if key != self._period_key and key not in self.period_cache:
+                self.period_cache.put(key, start_day, end_day, self._build_period(start_day, end_day))
+
+    def _load_rows(self, start_day: date, end_day: date) -> tuple[dict[date, Row], list[RowRender]]:
+        wanted_days = (start_day + timedelta(days=i) for i in range((end_day - start_day).days + 1))
+        stored_rows = {row.date: row for row in self.store.range(start_day, end_day)}
+        new_data = {day: stored_rows.get(day) or Row(day) for day in wanted_days}
+        return new_data, [self._render(row) for row in new_data.values()]
+
+    def canFetchMore(self, parent: QModelIndex) -> bool:
+        return self.session_settings.time_view_type == TimeViewType.TIMELINE and not parent.isValid()
+
+    def fetchMore(self, parent: QModelIndex):
+        """ Load the page after the last row in the timeline view, evicting pages from the top if needed """
+        if not self.canFetchMore(parent) or not self._days:
+            return
+        start_day = self._days[-1] + timedelta(days=1)
+        new_data, render_cache = self._load_rows(start_day, start_day + timedelta(days=self.PAGE_SIZE - 1))
+        count = len(self._days)
+        self.beginInsertRows(QModelIndex(), count, count + len(render_cache) - 1)
+        with self._data_lock:
+            self._set_rows(self._days + list(new_data.keys()), self._render_cache + render_cache,
+                           {**self._data, **new_data})
+        self.endInsertRows()
+
+        evict = len(self._days) - self.MAX_PAGES * self.PAGE_SIZE
+        if evict > 0:
+            self.beginRemoveRows(QModelIndex(), 0, evict - 1)
+            with self._data_lock:
+                self._evict(slice(evict, None))
+            self.endRemoveRows()
+        self.data_updated.emit(self.session_settings.view_date, self._days[0], self._days[-1])
+
+    def fetch_previous(self):
+        """ Load the page before the first row in the timeline view, evicting pages from the bottom if needed """
+        if self.session_settings.time_view_type != TimeViewType.TIMELINE or not self._days:
+            return
+        end_day = self._days[0] - timedelta(days=1)
+        new_data, render_cache = self._load_rows(end_day - timedelta(days=self.PAGE_SIZE - 1), end_day)
+        self.beginInsertRows(QModelIndex(), 0, len(render_cache) - 1)
+        with self._data_lock:
+            self._set_rows(list(new_data.keys()) + self._days, render_cache + self._render_cache,
+                           {**new_data, **self._data})
+        self.endInsertRows()
+
+        keep = self.MAX_PAGES * self.PAGE_SIZE
+        if len(self._days) > keep:
+            self.beginRemoveRows(QModelIndex(), keep, len(self._days) - 1)
+            with self._data_lock:
+                self._evict(slice(None, keep))
+            self.endRemoveRows()
+        self.data_updated.emit(self.session_settings.view_date, self._days[0], self._days[-1])
+
+    def _evict(self, keep: slice):
+        days = self._days[keep]
+        self._set_rows(days, self._render_cache[keep], {day: self._data[day] for day in days})
+
+    def _set_rows(self, days: list[date], render_cache: list[RowRender], data: dict[date, Row]):
+        self._data = data
+        self._days = days
+        self._day_rows = {day: i for i, day in enumerate(days)}
+        self._render_cache = render_cache
+
+    def set_store(self, store: TimeStore):
+        """ Show the data of another store, e.g. after opening a file """
+        self.store.remove_batch_listener(self._on_store_changed)
+        self.store = store
+        self.store.add_batch_listener(self._on_store_changed)
+        self.period_cache.clear()
+        self._period_key = None
+        self.fetch_data()
+
+    def _on_store_changed(self, changes: dict[date, tuple[str, ...]]):
+        # The shown rows are updated in place, the cached periods are built again when shown
+        self.period_cache.invalidate(changes.keys())
+        columns = set().union(*changes.values())
+        if columns & {"came", "went"}:
+            columns |= {"came", "went", "total"}
+        self.update_days(list(changes.keys()), tuple(columns))
+
+    def update_days(self, days: list[date], columns: tuple[str, ...] = HEADERS):
+        """ Reload the shown days among the given ones, with one notification spanning their rows and columns """
+        rows = {row: day for row, day in ((self.row_of(day), day) for day in days) if row is not None}
+        if not rows:
+            return
+        new_rows = {day: self.store.get(day) or Row(day) for day in rows.values()}
+        renders = {row: self._render(new_rows[day]) for row, day in rows.items()}
+        with self._data_lock:
+            self._data.update(new_rows)
+            for row, render in renders.items():
+                self._render_cache[row] = render
+        first, last = min(rows), max(rows)
+        cols = [self.HEADERS.index(c) for c in columns]
+        self.dataChanged.emit(self.index(first, min(cols)), self.index(last, max(cols)), [Qt.DisplayRole, Qt.EditRole])
+        self.headerDataChanged.emit(Qt.Vertical, first, last)
 
     def set_view_type(self, time_view_type: TimeViewType):
         if time_view_type == self.session_settings.time_view_type:
@@ -113,36 +298,50 @@ class TableModel(QAbstractTableModel):
         self.session_settings.time_view_type = time_view_type
         self.fetch_data()
 
-    def data(self, index: QModelIndex, role: Qt.ItemDataRole):
+    def _render(self, row: Row) -> RowRender:
+        day = row.date
+        info = day_info(day)
+        if day == self._today:
+            background = RowColors.Today.value
+        elif info.is_weekend:
+            background = RowColors.Weekend.value
+        else:
+            background = None
+
+        if row.total:
+            decoration = self._icon_done
+        elif info.is_workday and day <= self._today:
+            decoration = self._icon_missing
+        else:
+            decoration = None
+
+        week = str(info.week)
+        weekday = info.weekday_name
+        total = "" if row.total is None else str(row.total)
+        display = [
+            week, weekday,
+            "---" if row.came is None else row.came.strftime("%H:%M:%S"),
+            "---" if row.went is None else row.went.strftime("%H:%M:%S"),
+            total, row.note
+        ]
+        # None for came/went is replaced by the current time when editing
+        edit = [week, weekday, row.came, row.went, total, row.note]
+        return RowRender(display, edit, background, decoration, str(day))
+
+    def _get_render(self, row: int) -> RowRender:
         with self._data_lock:
-            day = sorted(self._data.keys())[index.row()]
-            row = self._data[day]
-        data = [day.isocalendar().week, day.strftime("%A"), row.came, row.went, row.total, row.note]
-
-        if role in (Qt.DisplayRole, Qt.EditRole):
-            d = data[index.column()]
-            col_name = self.HEADERS[index.column()]
-            if col_name in ("came", "went"):
-                if d is None:
-                    return "---" if role == Qt.DisplayRole else datetime.now().time()
-                elif role == Qt.DisplayRole:
-                    return d.strftime("%H:%M:%S")
-                elif role == Qt.EditRole:
-                    return d
-            elif col_name in ("total", ):
-                if d is None:
-                    return ""
-                else:
-                    return str(d)
-            elif col_name in ("note", ):
-                return d
-            return str(d)
+            return self._render_cache[row]
 
+    def data(self, index: QModelIndex, role: Qt.ItemDataRole):
+        if role == Qt.DisplayRole:
+            return self._get_render(index.row()).display[index.column()]
+        elif role == Qt.EditRole:
+            d = self._get_render(index.row()).edit[index.column()]
+            if d is None and self.HEADERS[index.column()] in ("came", "went"):
+                return datetime.now().time()
+            return d
         elif role == Qt.BackgroundRole:
-            if day == datetime.today().date():
-                return RowColors.Today.value
-            elif day.weekday() >= 5:
-                return RowColors.Weekend.value
+            return self._get_render(index.row()).background
 
     def flags(self, index: QModelIndex) -> Qt.ItemFlags:
         def_flags = Qt.ItemIsSelectable
@@ -152,79 +351,81 @@ class TableModel(QAbstractTableModel):
         return def_flags
 
     def setData(self, index: QModelIndex, value: Union[str, time], role: int = Qt.EditRole) -> bool:
-        day = sorted(self._data.keys())[index.row()]
+        with self._data_lock:
+            day = self._days[index.row()]
         col_name = self.HEADERS[index.column()]
-        if day not in testdata.test_table_days:
-            testdata.test_table_days[day] = dict(came=datetime.now().time(), went=datetime.now().time(), note="")
+        row = self.store.get(day)
+        now = datetime.now().time()
         if col_name == "came":
-            testdata.test_table_days[day][col_name] = value
-            testdata.test_table_days[day]["went"] = max(value, testdata.test_table_days[day]["went"])
+            went = now if row is None or row.went is None else row.went
+            fields = dict(came=value, went=max(value, went))
         elif col_name == "went":
-            testdata.test_table_days[day][col_name] = value
-            testdata.test_table_days[day]["came"] = min(value, testdata.test_table_days[day]["came"])
+            came = now if row is None or row.came is None else row.came
+            fields = dict(went=value, came=min(value, came))
         elif col_name in ("note", ):
-            testdata.test_table_days[day][col_name] = value
+            fields = dict(note=value)
         else:
             logger.error(f"Unhandled column {col_name}")
             return False
-        self.dataChanged.emit(index, index, [])
+        self.edit(f"Edit {col_name} of {day}", {day: fields}, cell=(day, col_name))
         return True
 
+    def edit(self, description: str, changes: Changes, cell: tuple[date, str] = None):
+        """ Apply changes to the store, through the undo history if there is one """
+        if self.history is None:
+            apply_changes(self.store, changes)
+        else:
+            self.history.edit(self.store, description, changes, cell)
+
     def headerData(self, section: int, orientation: Qt.Orientation, role: int):
-        if orientation == Qt.Vertical:
-            with self._data_lock:
-                day = sorted(self._data.keys())[section]
-                row = self._data[day]
+        if role == Qt.FontRole:
+            return self._header_font
 
-        if role == Qt.DisplayRole:
-            if orientation == Qt.Horizontal:
+        if orientation == Qt.Horizontal:
+            if role == Qt.DisplayRole:
                 return self.HEADERS[section].capitalize()
-            elif orientation == Qt.Vertical:
-                return str(day)
-
-        elif role == Qt.FontRole:
-            font = QFont()
-            font.setBold(True)
-            return font
+            return None
 
+        if role == Qt.DisplayRole:
+            return self._get_render(section).header
         elif role == Qt.BackgroundRole:
-            if orientation == Qt.Vertical:
-                if day == datetime.today().date():
-                    return RowColors.Today.value
-                elif day.weekday() >= 5:
-                    return RowColors.Weekend.value
-
+            return self._get_render(section).background
         elif role == Qt.DecorationRole:
-            if orientation == Qt.Vertical:
-                return QIcon.fromTheme("emblem-default") if row.total else \
-                    QIcon.fromTheme("image-missing") if day.weekday() < 5 and day <= date.today() else \
-                        None
-
+            return self._get_render(section).decoration
         elif role == Qt.TextAlignmentRole:
-            if orientation == Qt.Vertical:
-                return Qt.AlignRight
+            return Qt.AlignRight
 
     def rowCount(self, index: QModelIndex) -> int:
-        return len(self._data)
+        return len(self._days)
 
     def columnCount(self, index: QModelIndex) -> int:
         return len(self.HEADERS)
 
+    def row_of(self, day: date) -> Union[int, None]:
+        """ Get the row that shows the given day, or None if it is outside of the current view """
+        return self._day_rows.get(day)
+
+    def day_of(self, row: int) -> date:
+        return self._days[row]
+
     def remove_task(self, row: int):
+        if not 0 <= row < len(self._days):
+            return
+        self.beginRemoveRows(QModelIndex(), row, row)
         with self._data_lock:
-            if 0 <= row < len(self._data):
-                del self._data[row]
-                self.layoutChanged.emit()
+            day = self._days.pop(row)
+            del self._data[day]
+            del self._render_cache[row]
+            self._day_rows = {d: i for i, d in enumerate(self._days)}
+            # The rows no longer match the period
+            self._period_key = None
+        self.endRemoveRows()
 
     def scroll_to_today(self):
         self.session_settings.view_date = date.today()
         self.fetch_data()
 
     def scroll(self, forward: bool):
-        if self.session_settings.time_view_type in (TimeViewType.MONTH, TimeViewType.WEEK):
-            days_jump = len(self._data)
-        else:
-            days_jump = 1
-        days_jump = days_jump if forward else -days_jump
-        self.session_settings.view_date += timedelta(days=days_jump)
+        self.session_settings.view_date = step(
+            self.session_settings.time_view_type, self.session_settings.view_date, forward)
         self.fetch_data()
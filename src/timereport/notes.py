@@ -0,0 +1,100 @@
+from bisect import bisect_left, insort
+from datetime import date
+from typing import Iterable, Union
+import heapq
+import re
+from .store import ObservableStore
+
+_TOKEN = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> set[str]:
+    return set(_TOKEN.findall(text.lower()))
+
+
+class NoteIndex:
+    """
+    Inverted index from the words of the notes to the days that have them.
+
+    Every word of a query matches the words starting with it, and a day has to match all words of the query. The
+    words are kept sorted, so the words with a prefix are found with bisect. Once attached to a store, the days
+    whose note changes are reindexed. Days are kept as ordinals, which are faster to hash and sort than dates.
+    """
+
+    def __init__(self, notes: Iterable[tuple[date, str]] = ()):
+        self._postings: dict[str, set[int]] = {}
+        # The words of each day, to find the postings to remove the day from when its note changes
+        self._words: dict[int, set[str]] = {}
+        postings = self._postings
+        for day, note in notes:
+            words = tokenize(note)
+            if words:
+                ordinal = day.toordinal()
+                self._words[ordinal] = words
+                for word in words:
+                    days = postings.get(word)
+                    if days is None:
+                        postings[word] = {ordinal}
+                    else:
+                        days.add(ordinal)
+        self._sorted_words: list[str] = sorted(self._postings.keys())
+        self._store: Union[ObservableStore, None] = None
+        # Changes whenever a note is indexed again, so that earlier search results can tell they are stale
+        self.generation = 0
+
+    def __len__(self) -> int:
+        """ The number of days with an indexed note """
+        return len(self._words)
+
+    def attach(self, store: ObservableStore):
+        self._store = store
+        store.add_batch_listener(self._on_changes)
+
+    def detach(self):
+        if self._store is not None:
+            self._store.remove_batch_listener(self._on_changes)
+            self._store = None
+
+    def _on_changes(self, changes: dict[date, tuple[str, ...]]):
+        for day, fields in changes.items():
+            if "note" in fields:
+                row = self._store.get(day)
+                self.update(day, "" if row is None else row.note)
+
+    def update(self, day: date, note: str):
+        """ Index the new note of a day """
+        day = day.toordinal()
+        old = self._words.pop(day, set())
+        new = tokenize(note or "")
+        if new != old:
+            self.generation += 1
+        for word in old - new:
+            days = self._postings[word]
+            days.discard(day)
+            if not days:
+                del self._postings[word]
+                del self._sorted_words[bisect_left(self._sorted_words, word)]
+        for word in new - old:
+            if word not in self._postings:
+                self._postings[word] = set()
+                insort(self._sorted_words, word)
+            self._postings[word].add(day)
+        if new:
+            self._words[day] = new
+
+    def _prefixed(self, prefix: str) -> set[int]:
+        """ The days with a word starting with the prefix """
+        start = bisect_left(self._sorted_words, prefix)
+        end = bisect_left(self._sorted_words, prefix + "\uffff", start)
+        if end - start == 1:
+            return self._postings[self._sorted_words[start]]
+        return set().union(*(self._postings[w] for w in self._sorted_words[start:end]))
+
+    def search(self, query: str, limit: int = None) -> list[date]:
+        """ The days whose note matches all words of the query, the most recent first """
+        matches = sorted((self._prefixed(word) for word in tokenize(query)), key=len)
+        if not matches:
+            return []
+        days = matches[0].intersection(*matches[1:])
+        ordinals = sorted(days, reverse=True) if limit is None else heapq.nlargest(limit, days)
+        return [date.fromordinal(d) for d in ordinals]
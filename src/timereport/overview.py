@@ -0,0 +1,730 @@
+from PySide6.QtWidgets import QApplication, QMainWindow, QMessageBox, QFileDialog, QProgressBar, \
+    QAbstractItemView, QSystemTrayIcon, QMenu, QStyle, QInputDialog
+from PySide6.QtCore import Qt, Signal, QItemSelection, QThreadPool, QTimer
+from PySide6.QtGui import QCloseEvent, QResizeEvent, QIcon, QKeySequence
+from datetime import datetime, date, time, timedelta
+from pathlib import Path
+from logging import getLogger
+from typing import Callable, Union
+from .aggregate import summarize
+from .allocation import Allocations, DayAllocation
+from . import bulk
+from .database import open_with_projects, save_json, save_projects, save_sqlite, update_came_went, Store
+from .dates import period_label
+from .journal import Journal
+from .model import TableModel, TimeDelegate
+from .notes import NoteIndex
+from . import profiling
+from .projects import Project, ProjectRegistry
+from .session import TimeViewType, SessionSettings, SESSION_FILE
+from . import sqlite_store
+from .sqlite_store import SqliteStore
+from .undo import UndoHistory
+from .store import Row, TimeStore
+from . import testdata
+from .ui.task_view import Ui_MainWindow
+from .util import format_duration, parse_duration, time_to_timedelta, timedelta_to_time
+from .worker import Worker
+
+logger = getLogger(__name__)
+
+DB_FILTER = "trep DB (*.json);;trep SQLite DB (*.sqlite)"
+MAX_RECENT_FILES = 10
+# Time without further changes before the session is saved, so that e.g. resizing saves once
+SESSION_SAVE_DELAY_MS = 500
+# Time without further project changes before the registry and allocations are saved, as they are written whole
+PROJECTS_SAVE_DELAY_MS = 1000
+
+
+class TimeReportOverview(QMainWindow):
+    # Emit a bool to indicate whether a row is selected or not
+    row_selected = Signal(bool)
+    # The database from the session, or the test data, has been loaded
+    store_ready = Signal()
+
+    def __init__(self):
+        super().__init__()
+        self.ui = Ui_MainWindow()
+        self.ui.setupUi(self)
+        self.session_settings = SessionSettings()
+        self.model = TableModel(self.session_settings, TimeStore())
+        self.delegate = TimeDelegate()
+        self.dirty: bool = False
+        # Number of changes to the store, to tell whether it changed during a save
+        self.change_count = 0
+        self.filepath: Path = None
+        # Changes are written to the journal as they happen, once the database has a file
+        self.journal: Journal = None
+        self.model.store.add_listener(self.on_store_changed)
+        self.model.store.add_batch_listener(self.on_store_batch)
+        self.history = UndoHistory(self)
+        # None while the notes of a newly opened database are indexed
+        self.note_index: Union[NoteIndex, None] = NoteIndex()
+        self.note_index.attach(self.model.store)
+        # The last search query, the index generation it was run on, its matching days and the one shown
+        self.search_hits: tuple[str, int, list[date], int] = ("", -1, [], -1)
+        self.model.history = self.history
+        self.registry = ProjectRegistry()
+        self.allocations = Allocations(self.model.store, self.session_settings.lunch_interval)
+        # Created when first opened
+        self.project_window = None
+        # The period shown in the table, for the project window
+        self.period: tuple[str, date, date] = ("", date.today(), date.today())
+        # All file I/O runs here, one job at a time so that e.g. saves are written in order
+        self.io_pool = QThreadPool(self)
+        self.io_pool.setMaxThreadCount(1)
+        self.io_progress = QProgressBar()
+        self.io_progress.setMaximumWidth(150)
+        self.io_progress.hide()
+        # Running workers, kept referenced until their signals have been delivered
+        self.io_jobs: set[Worker] = set()
+        self.ui.statusbar.addPermanentWidget(self.io_progress)
+        self.ui.tableview_days.setModel(self.model)
+        self.model.setup_column_width(self.ui.tableview_days)
+        self.ui.tableview_days.setItemDelegateForColumn(self.model.HEADERS.index("came"), self.delegate)
+        self.ui.tableview_days.setItemDelegateForColumn(self.model.HEADERS.index("went"), self.delegate)
+
+        self.ui.tableview_days.selectionModel().selectionChanged.connect(self.selection_changed)
+        self.ui.actionMonth_view.triggered.connect(lambda: self.model.set_view_type(TimeViewType.MONTH))
+        self.ui.actionWeek_view.triggered.connect(lambda: self.model.set_view_type(TimeViewType.WEEK))
+        self.ui.actionAround_view.triggered.connect(lambda: self.model.set_view_type(TimeViewType.AROUND_DAY))
+        self.ui.actionDay_view.triggered.connect(lambda: self.model.set_view_type(TimeViewType.DAY))
+        self.ui.actionTimeline_view.triggered.connect(lambda: self.model.set_view_type(TimeViewType.TIMELINE))
+        self.ui.tableview_days.verticalScrollBar().valueChanged.connect(self.timeline_scrolled)
+        self.model.rowsAboutToBeInserted.connect(self.remember_top_day)
+        self.model.rowsAboutToBeRemoved.connect(self.remember_top_day)
+        self.model.rowsInserted.connect(self.restore_top_day)
+        self.model.rowsRemoved.connect(self.restore_top_day)
+        self.ui.actionGotoToday.triggered.connect(self.model.scroll_to_today)
+        self.ui.actionGotoPrevious.triggered.connect(lambda: self.model.scroll(forward=False))
+        self.ui.actionGotoNext.triggered.connect(lambda: self.model.scroll(forward=True))
+        self.ui.actionUpdate_came_went_time.triggered.connect(self.update_came_went)
+        self.ui.actionSave.triggered.connect(lambda: self.save_db_to_file(self.filepath))
+        self.ui.actionSave_As.triggered.connect(lambda: self.save_db_to_file(None))
+        self.ui.actionOpen.triggered.connect(lambda: self.open_db_from_file())
+        self.ui.actionSettings.triggered.connect(lambda: self.open_settings())
+        self.ui.actionExport.triggered.connect(self.export_period)
+        self.ui.actionProject_distribution.triggered.connect(self.open_project_window)
+        self.ui.actionAdd_spent_time.triggered.connect(self.open_project_window)
+        undo_action = self.history.createUndoAction(self)
+        undo_action.setShortcut(QKeySequence.Undo)
+        redo_action = self.history.createRedoAction(self)
+        redo_action.setShortcut(QKeySequence.Redo)
+        self.ui.menuEdit.insertActions(self.ui.actionAdd_spent_time, [undo_action, redo_action])
+        self.ui.menuEdit.insertSeparator(self.ui.actionAdd_spent_time)
+        self.ui.actionCopy.triggered.connect(self.copy_selection)
+        self.ui.actionPaste.triggered.connect(self.paste)
+        self.ui.actionClear.triggered.connect(self.clear_selection)
+        self.ui.actionFill_workdays.triggered.connect(self.fill_workdays)
+        self.ui.actionShift_times.triggered.connect(self.shift_times)
+        self.ui.actionFind.triggered.connect(self.focus_search)
+        self.ui.edit_search.textEdited.connect(lambda: self.search_notes(forward=False))
+        self.ui.edit_search.returnPressed.connect(lambda: self.search_notes(forward=True))
+        for action in (self.ui.actionCopy, self.ui.actionClear, self.ui.actionFill_workdays,
+                       self.ui.actionShift_times):
+            action.setEnabled(False)
+            self.row_selected.connect(action.setEnabled)
+        self.model.data_updated.connect(self.update_current_period)
+        # Switching period resets the model, which clears the selection without selectionChanged
+        self.model.modelReset.connect(lambda: self.row_selected.emit(False))
+        self._top_day: Union[date, None] = None
+        # Set in tray mode, where closing the window only hides it
+        self.tray: Union[QSystemTrayIcon, None] = None
+        self.quitting = False
+        self.store_loaded = False
+        self.store_ready.connect(self._set_store_loaded)
+        # Not saved until restored, to not overwrite the session file with the defaults
+        self.session_restored = False
+        self.session_timer = QTimer(self)
+        self.session_timer.setSingleShot(True)
+        self.session_timer.setInterval(SESSION_SAVE_DELAY_MS)
+        self.session_timer.timeout.connect(self.save_session)
+        self.model.data_updated.connect(self.schedule_session_save)
+        self.projects_timer = QTimer(self)
+        self.projects_timer.setSingleShot(True)
+        self.projects_timer.setInterval(PROJECTS_SAVE_DELAY_MS)
+        self.projects_timer.timeout.connect(self.save_project_files)
+
+        self.model.fetch_data()
+
+    def restore_session(self):
+        """ Load the session and then its most recent database. Called once the window has been shown """
+        self.run_io("Loading session", SessionSettings.read, SESSION_FILE, on_result=self.apply_session)
+
+    def run_io(self, description: str, fn: Callable, *args, on_result: Callable = None, on_error: Callable = None,
+               background: bool = False):
+        """
+        Run fn in the I/O thread, showing its progress in the status bar. on_result and on_error run in the GUI
+        thread. Background jobs are not shown unless they fail
+        """
+        worker = Worker(fn, *args)
+        if on_result is not None:
+            worker.signals.result.connect(on_result)
+        worker.signals.error.connect(lambda e: self.io_failed(description, e))
+        if on_error is not None:
+            worker.signals.error.connect(on_error)
+        worker.signals.finished.connect(lambda: self.io_finished(worker))
+        self.io_jobs.add(worker)
+        if not background:
+            worker.signals.progress.connect(self.io_progress.setValue)
+            self.io_progress.setValue(0)
+            self.io_progress.show()
+            self.ui.statusbar.showMessage(f"{description}...")
+        self.io_pool.start(worker)
+
+    def io_finished(self, worker: Worker):
+        self.io_jobs.discard(worker)
+        if not self.io_jobs:
+            self.io_progress.hide()
+
+    def io_failed(self, description: str, error: tuple[BaseException, str]):
+        exception, tb = error
+        self.ui.statusbar.showMessage(f"{description} failed: {exception}", 10000)
+
+    def apply_session(self, file_dict: dict):
+        self.session_settings.apply(file_dict)
+        self.resize(self.session_settings.window_size)
+        self.allocations.set_lunch_interval(self.session_settings.lunch_interval)
+        self.allocations.set_default_main(self.session_settings.main_project)
+        self.session_restored = True
+        self.ui.statusbar.clearMessage()
+        recent = next((f for f in self.session_settings.recent_files if f.exists()), None)
+        if recent is not None:
+            # Show the period of the session while the database loads
+            self.model.fetch_data()
+            self.load_db(recent)
+        else:
+            self.set_store(testdata.generate_test_store())
+            self.store_ready.emit()
+
+    def _set_store_loaded(self):
+        self.store_loaded = True
+
+    def closeEvent(self, event: QCloseEvent) -> None:
+        if self.tray is not None and not self.quitting:
+            # Keep running in the tray, with the database in memory
+            event.ignore()
+            self.hide()
+            return
+        self.flush_project_save()
+        if self.dirty:
+            resp = QMessageBox.warning(
+                self,
+                "You have unsaved changes",
+                "You have unsaved changes. Do you want to save them before closing?",
+                QMessageBox.Yes | QMessageBox.No | QMessageBox.Cancel,
+
+            )
+            if resp == QMessageBox.Yes:
+                self.save_db_to_file(self.filepath)
+            elif resp == QMessageBox.Cancel:
+                self.ui.statusbar.showMessage("Canceled. Database still has unsaved changes.")
+                event.ignore()
+        if event.isAccepted() and self.journal is not None:
+            self.journal.detach()
+        self.session_timer.stop()
+        if self.session_restored:
+            # Otherwise the defaults would overwrite the session file, e.g. its recent files
+            logger.debug("Saving session settings")
+            self.run_io("Saving session", SessionSettings.write, SESSION_FILE, self.session_settings.serialize())
+        self.io_pool.waitForDone()
+
+    def resizeEvent(self, event: QResizeEvent) -> None:
+        self.session_settings.window_size = event.size()
+        self.schedule_session_save()
+
+    def schedule_session_save(self, *args):
+        """ Save the session once it has not changed for a while """
+        if self.session_restored:
+            self.session_timer.start()
+
+    def save_session(self):
+        self.run_io("Saving session", SessionSettings.write, SESSION_FILE, self.session_settings.serialize(),
+                    background=True)
+
+    def get_save_location(self) -> Union[Path, None]:
+        # Cannot use QFileDialog.saveFileDialog with a default saving suffix, so using this way
+        dialog = QFileDialog(self, "Select where to save the trep database", "trep.db.json", DB_FILTER)
+        dialog.setModal(True)
+        dialog.setDefaultSuffix("json")
+        dialog.setFileMode(QFileDialog.AnyFile)
+        dialog.setAcceptMode(QFileDialog.AcceptSave)
+        # Preselecting file does not seem to work when running from Pycharm. Not using native dialogs fixes it,
+        # but looks worse, i.e.:
+        # dialog.setOption(QFileDialog.DontUseNativeDialog)
+        dialog.selectFile("trep.db.json")
+        if dialog.exec():
+            return Path(dialog.selectedFiles()[0])
+
+    def save_db_to_file(self, filepath: Path = None):
+        if filepath is None:
+            filepath = self.get_save_location()
+
+            if filepath is None:
+                # User canceled "save as dialog" before
+                self.ui.statusbar.showMessage("Canceled", 1000)
+                return
+
+        store = self.model.store
+        if isinstance(store, SqliteStore) and store.filepath == filepath:
+            # Every edit is already committed
+            self.save_project_files(filepath)
+            self.ui.statusbar.showMessage("Saved database", 2000)
+        elif self.journal is not None and self.journal.snapshot == filepath:
+            # All changes are already in the journal, so only fold them into the snapshot
+            logger.info(f"Compacting journal of {filepath}")
+            self.journal.compact()
+            self.save_project_files(filepath)
+            self.ui.statusbar.showMessage("Saved database", 2000)
+        elif isinstance(store, SqliteStore) or filepath.suffix == sqlite_store.SUFFIX:
+            logger.info(f"Exporting to database {filepath}")
+            save = save_sqlite if filepath.suffix == sqlite_store.SUFFIX else save_json
+            # Days changed until the exported database is shown, which the export misses
+            changed = set()
+            store.add_batch_listener(changed.update)
+            self.run_io("Exporting database", save, store.copy(), filepath,
+                        on_result=lambda _: self.db_exported(store, filepath, changed),
+                        on_error=lambda _: self.export_failed(store, changed))
+        else:
+            logger.info(f"Saving as {filepath}")
+            # Until the new file is written, changes still go to the journal of the old one, if any
+            change_count = self.change_count
+            self.run_io("Saving database", save_json, store.copy(), filepath,
+                        on_result=lambda _: self.db_saved_as(store, filepath, change_count),
+                        on_error=lambda _: self.save_failed(store))
+
+    def db_exported(self, store: Store, filepath: Path, changed: set[date]):
+        """ Open the database exported to another format, once it has been written """
+        if store is not self.model.store:
+            store.remove_batch_listener(changed.update)
+            return
+        self.save_project_files(filepath)
+        self.run_io(f"Opening {filepath}", open_with_projects, filepath,
+                    on_result=lambda result: self.exported_db_loaded(store, changed, filepath, *result),
+                    on_error=lambda _: store.remove_batch_listener(changed.update))
+
+    def exported_db_loaded(self, old_store: Store, changed: set[date], filepath: Path, store: Store,
+                           registry: ProjectRegistry = None, days: dict[date, DayAllocation] = None):
+        """ Show the exported database, with the days changed in the old one while exporting and opening it """
+        old_store.remove_batch_listener(changed.update)
+        if old_store is not self.model.store:
+            # Another database has been opened meanwhile
+            if isinstance(store, SqliteStore):
+                store.close()
+            return
+        # Read before the old store is closed
+        rows = {day: old_store.get(day) for day in changed}
+        self.db_loaded(filepath, store, registry, days)
+        if rows:
+            logger.info(f"Applying {len(rows)} days changed while exporting to {filepath}")
+            # After attaching the journal, so that they are saved
+            with store.batch():
+                for day, row in rows.items():
+                    if row is None:
+                        store.delete(day)
+                    else:
+                        store.upsert(day, came=row.came, went=row.went, note=row.note)
+
+    def export_failed(self, store: Store, changed: set[date]):
+        store.remove_batch_listener(changed.update)
+        self.save_failed(store)
+
+    def db_saved_as(self, store: Store, filepath: Path, change_count: int):
+        """ Switch to the new file once the snapshot of the store has been written to it """
+        if store is not self.model.store:
+            # Another database has been opened meanwhile
+            return
+        self.filepath = filepath
+        self.remember_file(filepath)
+        self.attach_journal(filepath, discard=True)
+        if self.change_count != change_count:
+            # Changed while the snapshot was written, so that the snapshot misses them
+            self.journal.compact()
+        self.save_project_files(filepath)
+        self.dirty = False
+        self.ui.statusbar.showMessage("Saved database", 2000)
+
+    def save_failed(self, store: Store):
+        """ The database file was not written, so its changes are still unsaved """
+        if store is self.model.store and not isinstance(store, SqliteStore):
+            self.dirty = True
+
+    def open_db_from_file(self):
+        filepath, ending = QFileDialog.getOpenFileName(self, "Select trep db", filter="trep DB (*.json *.sqlite)")
+        if filepath == "":
+            self.ui.statusbar.showMessage("Canceled", 2000)
+            return
+        self.load_db(Path(filepath))
+
+    def load_db(self, filepath: Path):
+        # Written before reading, in case it is the same database
+        self.flush_project_save()
+        self.run_io(f"Opening {filepath}", open_with_projects, filepath,
+                    on_result=lambda result: self.db_loaded(filepath, *result))
+
+    def db_loaded(self, filepath: Path, store: Store, registry: ProjectRegistry = None,
+                  days: dict[date, DayAllocation] = None):
+        self.detach_journal()
+        self.set_store(store, registry, days)
+        self.filepath = filepath
+        if not isinstance(store, SqliteStore):
+            self.attach_journal(filepath)
+        self.remember_file(filepath)
+        self.ui.statusbar.showMessage(f"Opened database {filepath}", 4000)
+        self.store_ready.emit()
+
+    def remember_file(self, filepath: Path):
+        recent_files = [f for f in self.session_settings.recent_files if f.absolute() != filepath.absolute()]
+        self.session_settings.recent_files = [filepath] + recent_files[:MAX_RECENT_FILES - 1]
+        self.schedule_session_save()
+
+    def set_store(self, store: Store, registry: ProjectRegistry = None, days: dict[date, DayAllocation] = None):
+        """ Show another database, with its projects and allocations if it has any """
+        # The pending changes belong to the old database
+        self.flush_project_save()
+        old_store = self.model.store
+        old_store.remove_listener(self.on_store_changed)
+        old_store.remove_batch_listener(self.on_store_batch)
+        self.allocations.detach()
+        self.model.set_store(store)
+        store.add_listener(self.on_store_changed)
+        store.add_batch_listener(self.on_store_batch)
+        # The history refers to the days of the old store
+        self.history.clear()
+        self.index_notes()
+        self.registry = registry or ProjectRegistry()
+        self.allocations = Allocations(store, self.session_settings.lunch_interval,
+                                       self.session_settings.main_project, days, compute=False)
+        self.compute_project_totals()
+        if self.project_window is not None:
+            self.project_window.set_sources(self.allocations, self.registry)
+        if isinstance(old_store, SqliteStore):
+            old_store.close()
+        self.dirty = False
+
+    def compute_project_totals(self):
+        """ Compute the time per project in the I/O thread, which reads the whole store """
+        allocations = self.allocations
+
+        def computed(month_totals: dict):
+            if allocations is not self.allocations:
+                return
+            allocations.set_totals(month_totals)
+            if self.project_window is not None:
+                self.project_window.set_sources(self.allocations, self.registry)
+
+        self.run_io("Computing project time", allocations.totals_job(), on_result=computed, background=True)
+
+    def index_notes(self):
+        """ Build the note index of the store in the I/O thread, from a copy of the notes """
+        if self.note_index is not None:
+            self.note_index.detach()
+        self.note_index = None
+        self.search_hits = ("", -1, [], -1)
+        store = self.model.store
+        # Days changed while indexing, to index again once done
+        changed = set()
+        store.add_batch_listener(changed.update)
+
+        def indexed(note_index: NoteIndex):
+            store.remove_batch_listener(changed.update)
+            if store is not self.model.store:
+                return
+            for day in changed:
+                note_index.update(day, (store.get(day) or Row(day)).note)
+            note_index.attach(store)
+            self.note_index = note_index
+            logger.info(f"Indexed the notes of {len(note_index)} days")
+
+        self.run_io("Indexing notes", NoteIndex, list(store.notes()), on_result=indexed, background=True)
+
+    def focus_search(self):
+        self.ui.edit_search.setFocus()
+        self.ui.edit_search.selectAll()
+
+    def search_notes(self, forward: bool):
+        """ Show the most recent day with a matching note, or with forward the next older one """
+        query = self.ui.edit_search.text().strip()
+        if self.note_index is None:
+            self.ui.statusbar.showMessage("Still indexing the notes, try again", 2000)
+            return
+        last_query, generation, hits, shown = self.search_hits
+        if query != last_query:
+            hits, shown = (self.note_index.search(query) if query else []), -1
+        elif generation != self.note_index.generation:
+            # Notes changed since the search, so search again and continue from the day shown
+            shown_day = hits[shown] if shown >= 0 else None
+            hits = self.note_index.search(query)
+            if shown_day is not None:
+                # The hits are the most recent first, so this is the day shown or the last more recent one
+                shown = sum(day >= shown_day for day in hits) - 1
+        generation = self.note_index.generation
+        if not hits:
+            self.search_hits = (query, generation, hits, -1)
+            if query:
+                self.ui.statusbar.showMessage(f"No notes match {query!r}", 2000)
+            return
+        if forward or shown < 0:
+            shown = (shown + 1) % len(hits)
+        self.search_hits = (query, generation, hits, shown)
+        day = hits[shown]
+        self.show_day(day)
+        row = self.model.store.get(day)
+        self.ui.statusbar.showMessage(f"{shown + 1}/{len(hits)}: {day} {'' if row is None else row.note}", 10000)
+
+    def show_day(self, day: date):
+        """ Move the view to the period of the day and select it """
+        if self.model.row_of(day) is None:
+            self.session_settings.view_date = day
+            self.model.fetch_data()
+        row = self.model.row_of(day)
+        if row is not None:
+            self.ui.tableview_days.selectRow(row)
+            self.ui.tableview_days.scrollTo(self.model.index(row, 0))
+
+    def save_project_files(self, filepath: Path = None):
+        """ Write the project registry and allocations next to the database, if it has a file """
+        self.projects_timer.stop()
+        filepath = filepath or self.filepath
+        if filepath is None:
+            self.dirty = True
+            return
+        self.run_io("Saving projects", save_projects, filepath, self.registry.serialize(),
+                    self.allocations.serialize())
+
+    def schedule_project_save(self, *args):
+        """ Save the projects once they have not changed for a while, e.g. after a series of allocation edits """
+        self.projects_timer.start()
+
+    def flush_project_save(self):
+        """ Save the projects now if a save is pending """
+        if self.projects_timer.isActive():
+            self.save_project_files()
+
+    def export_period(self):
+        """ Export the days of the current period, in a format chosen by the file type """
+        # Imported on first use, to start faster
+        from .export import export_file, sinks
+        formats = {f"{sink.description} (*{sink.suffix})": name for name, sink in sinks().items()}
+        label, start, end = self.period
+        filename, selected = QFileDialog.getSaveFileName(
+            self, f"Export {label}", f"trep-{start.isoformat()}{sinks()['csv'].suffix}", ";;".join(formats))
+        if not filename:
+            self.ui.statusbar.showMessage("Canceled", 1000)
+            return
+        filepath = Path(filename)
+        format_name = formats.get(selected) or \
+            next((name for name, sink in sinks().items() if sink.suffix == filepath.suffix), "csv")
+        self.run_io("Exporting", export_file, self.model.store.copy(), filepath, format_name, start, end,
+                    tuple(self.session_settings.lunch_interval), None, self.session_settings.daily_norm,
+                    self.allocations.copy_days(), self.session_settings.main_project,
+                    on_result=lambda count: self.ui.statusbar.showMessage(f"Exported {count} days", 2000))
+
+    def open_project_window(self):
+        if self.project_window is None:
+            # Imported on first use, to start faster
+            from .project_window import ProjectDistributionWindow
+            self.project_window = ProjectDistributionWindow(self.allocations, self.registry, parent=self)
+            self.project_window.allocations_edited.connect(self.schedule_project_save)
+            self.project_window.set_period(*self.period)
+        self.project_window.show()
+        self.project_window.raise_()
+        self.project_window.activateWindow()
+
+    def detach_journal(self):
+        if self.journal is not None:
+            self.journal.detach()
+            self.journal = None
+
+    def attach_journal(self, filepath: Path, discard: bool = False):
+        self.detach_journal()
+        self.journal = Journal(filepath)
+        if discard:
+            self.journal.discard()
+        self.journal.attach(self.model.store)
+
+    def on_store_changed(self, day: date, fields: tuple[str, ...]):
+        self.change_count += 1
+        if self.journal is None and not isinstance(self.model.store, SqliteStore):
+            self.dirty = True
+
+    def on_store_batch(self, changes: dict[date, tuple[str, ...]]):
+        """ Update the totals of the current period when any of its days changed """
+        _, start_date, end_date = self.period
+        if any(start_date <= day <= end_date for day in changes):
+            self.update_current_period(self.session_settings.view_date, start_date, end_date)
+
+    def open_settings(self):
+        # Imported on first use, to start faster
+        from .gui_settings import SettingsDialog
+        dialog = SettingsDialog(self.session_settings, parent=self)
+        if dialog.exec():
+            self.allocations.set_lunch_interval(self.session_settings.lunch_interval)
+            self.allocations.set_default_main(self.session_settings.main_project)
+            self.schedule_session_save()
+
+    def update_current_period(self, view_date: date, start_date: date, end_date: date):
+        period = period_label(self.session_settings.time_view_type, view_date, start_date, end_date)
+        total = summarize(self.model.store, start_date, end_date, self.session_settings.lunch_interval,
+                          self.session_settings.daily_norm)
+        self.ui.lbl_current_period.setText(
+            f"{period} ({format_duration(total.net)} h, {format_duration(total.overtime, sign=True)} h)")
+        self.period = (period, start_date, end_date)
+        if self.project_window is not None:
+            self.project_window.set_period(*self.period)
+
+    def add_project_time(self, project_id: str, duration: timedelta):
+        if project_id not in self.registry:
+            self.registry.add(Project(project_id))
+        self.registry.record_use(project_id)
+        self.allocations.add(date.today(), project_id, duration)
+        self.schedule_project_save()
+
+    def update_came_went(self):
+        return update_came_went(self.model.store, datetime.now())
+
+    def timeline_scrolled(self, value: int):
+        # Scrolling down is handled by the view through TableModel.fetchMore
+        if value == self.ui.tableview_days.verticalScrollBar().minimum():
+            self.model.fetch_previous()
+
+    def remember_top_day(self, *args):
+        """ Remember the first visible day, to keep it in place when pages are loaded or evicted in the timeline """
+        self._top_day = None
+        if self.session_settings.time_view_type == TimeViewType.TIMELINE:
+            row = self.ui.tableview_days.rowAt(0)
+            if row >= 0:
+                self._top_day = self.model.day_of(row)
+
+    def restore_top_day(self, *args):
+        row = None if self._top_day is None else self.model.row_of(self._top_day)
+        if row is not None:
+            self.ui.tableview_days.scrollTo(self.model.index(row, 0), QAbstractItemView.PositionAtTop)
+
+    def selection_changed(self, sel: QItemSelection, dsel: QItemSelection):
+        self.row_selected.emit(self.ui.tableview_days.selectionModel().hasSelection())
+
+    def selected_cells(self) -> dict[date, set[str]]:
+        """ The names of the selected columns of each selected day """
+        cells = {}
+        for index in self.ui.tableview_days.selectionModel().selectedIndexes():
+            cells.setdefault(self.model.day_of(index.row()), set()).add(self.model.HEADERS[index.column()])
+        return cells
+
+    def apply_bulk(self, description: str, changes: bulk.Changes):
+        """ Apply the changes of a bulk edit as one batch and one undo entry, with one update of the view """
+        if not changes:
+            self.ui.statusbar.showMessage("Nothing to change", 2000)
+            return
+        self.model.edit(f"{description} {len(changes)} days", changes)
+        self.ui.statusbar.showMessage(f"{description} {len(changes)} days", 4000)
+
+    def workday_template(self) -> tuple[time, time]:
+        """ The came and went times of the current day, or of a normal workday if it has none """
+        current = self.ui.tableview_days.currentIndex()
+        row = self.model.store.get(self.model.day_of(current.row())) if current.isValid() else None
+        if row is not None and row.came is not None and row.went is not None:
+            return row.came, row.went
+        lunch_from, lunch_to = self.session_settings.lunch_interval
+        came = time(8)
+        went = time_to_timedelta(came) + self.session_settings.daily_norm + \
+            time_to_timedelta(lunch_to) - time_to_timedelta(lunch_from)
+        return came, timedelta_to_time(went)
+
+    def fill_workdays(self):
+        came, went = self.workday_template()
+        self.apply_bulk("Filled", bulk.fill_workdays(sorted(self.selected_cells()), came, went))
+
+    def shift_times(self):
+        days = sorted(self.selected_cells())
+        text, ok = QInputDialog.getText(self, "Shift times", "Move came and went by, e.g. 15m or -1h:")
+        if not ok:
+            return
+        try:
+            changes = bulk.shift_times(self.model.store, days, parse_duration(text))
+        except ValueError as e:
+            self.ui.statusbar.showMessage(str(e), 10000)
+            return
+        self.apply_bulk("Shifted", changes)
+
+    def clear_selection(self):
+        self.apply_bulk("Cleared", bulk.clear_cells(self.model.store, self.selected_cells()))
+
+    def copy_selection(self):
+        indexes = self.ui.tableview_days.selectionModel().selectedIndexes()
+        if not indexes:
+            return
+        rows = sorted({index.row() for index in indexes})
+        columns = sorted({index.column() for index in indexes})
+        table = [[self.model.data(self.model.index(r, c), Qt.DisplayRole) or "" for c in columns] for r in rows]
+        QApplication.clipboard().setText(bulk.format_table(table))
+
+    def paste(self):
+        """ Paste tab separated rows with the top-left value at the current cell, one row per day """
+        indexes = self.ui.tableview_days.selectionModel().selectedIndexes() or [self.ui.tableview_days.currentIndex()]
+        if not indexes[0].isValid():
+            return
+        row = min(index.row() for index in indexes)
+        column = min(index.column() for index in indexes)
+        try:
+            changes = bulk.paste_table(self.model.store, self.model.day_of(row), self.model.HEADERS[column:],
+                                       QApplication.clipboard().text())
+        except ValueError as e:
+            self.ui.statusbar.showMessage(str(e), 10000)
+            return
+        self.apply_bulk("Pasted", changes)
+
+    def show_profiler(self, profiler: profiling.Profiler):
+        """ Count the model calls per repaint of the table and show their rates in the status bar """
+        self.repaint_counter = profiling.RepaintCounter(profiler, self)
+        self.ui.tableview_days.viewport().installEventFilter(self.repaint_counter)
+        self.ui.statusbar.addPermanentWidget(profiling.ProfilerLabel(profiler))
+
+    def show_in_tray(self) -> bool:
+        """ Keep running in the system tray when the window is closed, until quit from the tray menu """
+        if not QSystemTrayIcon.isSystemTrayAvailable():
+            logger.warning("No system tray available")
+            return False
+        menu = QMenu(self)
+        menu.addAction("Show overview", self.show_overview)
+        menu.addAction(self.ui.actionUpdate_came_went_time)
+        menu.addSeparator()
+        menu.addAction("Quit", self.quit)
+        icon = QIcon.fromTheme("x-office-calendar", self.style().standardIcon(QStyle.SP_FileDialogDetailedView))
+        self.tray = QSystemTrayIcon(icon, self)
+        self.tray.setToolTip("trep")
+        self.tray.setContextMenu(menu)
+        self.tray.activated.connect(
+            lambda reason: self.show_overview() if reason == QSystemTrayIcon.Trigger else None)
+        self.tray.show()
+        QApplication.setQuitOnLastWindowClosed(False)
+        return True
+
+    def show_overview(self):
+        self.showNormal()
+        self.raise_()
+        self.activateWindow()
+
+    def quit(self):
+        self.quitting = True
+        if self.close():
+            QApplication.quit()
+        else:
+            self.quitting = False
+
+    def handle_command(self, command: str, args: list[str]) -> str:
+        """ Run a command forwarded by another trep invocation, see InstanceServer """
+        if command == "show":
+            self.show_overview()
+            return "Showing the overview"
+        if not self.store_loaded:
+            raise RuntimeError("The database is still loading, try again")
+        if command == "came-went":
+            row = self.update_came_went()
+            return f"{row.date}: came {row.came:%H:%M}, went {row.went:%H:%M}"
+        elif command == "add":
+            duration_text, project_id = args
+            duration = parse_duration(duration_text)
+            self.add_project_time(project_id, duration)
+            return f"Added {format_duration(duration)} h to {project_id} today"
+        raise ValueError(f"Unknown command {command}")
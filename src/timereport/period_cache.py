@@ -0,0 +1,62 @@
+from bisect import bisect_left
+from collections import OrderedDict
+from datetime import date
+from typing import Any, Hashable, Iterable, Union
+
+
+class PeriodCache:
+    """
+    Least recently used cache of the rows built for whole periods, e.g. the months before and after the shown one.
+
+    Each period is kept with its first and last day, and counts as one row per day towards max_rows. Periods are
+    evicted, the least recently used first, when there are more rows than that. A period is dropped as soon as one
+    of its days changes, while the other periods are kept.
+    """
+
+    def __init__(self, max_rows: int):
+        self.max_rows = max_rows
+        self._periods: OrderedDict[Hashable, tuple[date, date, Any]] = OrderedDict()
+        self._rows = 0
+
+    def __len__(self) -> int:
+        return len(self._periods)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._periods
+
+    @property
+    def rows(self) -> int:
+        return self._rows
+
+    def put(self, key: Hashable, first: date, last: date, value: Any):
+        """ Add or replace a period, as the most recently used one """
+        self.take(key)
+        self._periods[key] = (first, last, value)
+        self._rows += (last - first).days + 1
+        while self._rows > self.max_rows and len(self._periods) > 1:
+            self._drop(next(iter(self._periods)))
+
+    def take(self, key: Hashable) -> Union[Any, None]:
+        """ Remove a period and return its value, or None if it is not cached """
+        if key not in self._periods:
+            return None
+        return self._drop(key)
+
+    def _drop(self, key: Hashable) -> Any:
+        first, last, value = self._periods.pop(key)
+        self._rows -= (last - first).days + 1
+        return value
+
+    def invalidate(self, days: Iterable[date]):
+        """ Drop the periods that contain any of the days """
+        days = sorted(days)
+        if not days:
+            return
+        for key, (first, last, _) in list(self._periods.items()):
+            i = bisect_left(days, first)
+            if i < len(days) and days[i] <= last:
+                self._drop(key)
+
+    def clear(self):
+        self._periods.clear()
+        self._rows = 0
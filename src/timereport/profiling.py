@@ -0,0 +1,229 @@
+"""
+Opt-in instrumentation of the hot paths, enabled with `trep --profile` or the TREP_PROFILE environment variable.
+
+The methods are wrapped at runtime when profiling is enabled, so nothing is added to them otherwise.
+"""
+from PySide6.QtCore import QEvent, QObject, QTimer, Qt
+from PySide6.QtWidgets import QLabel
+from collections import Counter, deque
+from functools import lru_cache, wraps
+from logging import getLogger
+from pathlib import Path
+from typing import Callable, Union
+import inspect
+import json
+import os
+import sys
+import threading
+import time
+
+logger = getLogger(__name__)
+
+ENV_VAR = "TREP_PROFILE"
+
+
+class RollingHistogram:
+    """ Latencies of the last calls, bucketed by powers of two microseconds """
+
+    def __init__(self, size: int = 4096):
+        self.samples: deque[float] = deque(maxlen=size)
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, seconds: float):
+        self.samples.append(seconds)
+        self.count += 1
+        self.total += seconds
+
+    def percentile(self, p: float) -> float:
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(int(len(ordered) * p / 100), len(ordered) - 1)]
+
+    def buckets(self) -> dict[int, int]:
+        """ Number of the last calls per upper bound in microseconds """
+        counts = Counter(1 << max(int(s * 1e6), 1).bit_length() for s in self.samples)
+        return dict(sorted(counts.items()))
+
+
+class Profiler:
+    """ Call counts, latencies and optionally trace events of the instrumented functions """
+    MAX_TRACE_EVENTS = 200_000
+
+    def __init__(self, trace: bool = False):
+        self.latencies: dict[str, RollingHistogram] = {}
+        # Number of calls of each function between two repaints of the table
+        self.calls_per_repaint: dict[str, RollingHistogram] = {}
+        self.trace_events: Union[deque[dict], None] = deque(maxlen=self.MAX_TRACE_EVENTS) if trace else None
+        self._frame_calls: Counter[str] = Counter()
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+
+    def record(self, name: str, start: float, end: float):
+        with self._lock:
+            histogram = self.latencies.get(name)
+            if histogram is None:
+                histogram = self.latencies[name] = RollingHistogram()
+            histogram.add(end - start)
+            self._frame_calls[name] += 1
+            if self.trace_events is not None:
+                self.trace_events.append(dict(
+                    name=name, ph="X", pid=os.getpid(), tid=threading.get_ident(),
+                    ts=(start - self._start) * 1e6, dur=(end - start) * 1e6))
+
+    def repainted(self):
+        with self._lock:
+            for name, calls in self._frame_calls.items():
+                self.calls_per_repaint.setdefault(name, RollingHistogram(256)).add(calls)
+            self._frame_calls.clear()
+
+    def counts(self) -> dict[str, int]:
+        with self._lock:
+            return {name: histogram.count for name, histogram in self.latencies.items()}
+
+    def wrap(self, fn: Callable, name: str, key: Callable = None) -> Callable:
+        """ Time each call of fn. key gets the arguments of the call and returns a suffix of the name, e.g. a role """
+        record = self.record
+        perf_counter = time.perf_counter
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                record(name if key is None else f"{name}[{key(*args, **kwargs)}]", start, perf_counter())
+        return wrapper
+
+    def instrument(self, owner: object, attribute: str, key: Callable = None):
+        """
+        Replace a method of a class, or a function of a module, with a timed one. Module level functions are also
+        replaced in the modules that have imported them by name.
+        """
+        original = inspect.getattr_static(owner, attribute)
+        name = f"{owner.__name__.rsplit('.', 1)[-1]}.{attribute}"
+        if isinstance(original, staticmethod):
+            setattr(owner, attribute, staticmethod(self.wrap(original.__func__, name, key)))
+            return
+        wrapper = self.wrap(original, name, key)
+        setattr(owner, attribute, wrapper)
+        if inspect.ismodule(owner):
+            for module in list(sys.modules.values()):
+                if getattr(module, attribute, None) is original:
+                    setattr(module, attribute, wrapper)
+
+    def report(self) -> str:
+        lines = [f"{'function':<40} {'calls':>9} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9} "
+                 f"{'/repaint':>9}"]
+        with self._lock:
+            for name, h in sorted(self.latencies.items(), key=lambda item: -item[1].total):
+                per_repaint = self.calls_per_repaint.get(name)
+                lines.append(
+                    f"{name:<40} {h.count:>9} {h.total / h.count * 1e3:>9.3f} {h.percentile(50) * 1e3:>9.3f} "
+                    f"{h.percentile(95) * 1e3:>9.3f} {max(h.samples) * 1e3:>9.3f} "
+                    f"{per_repaint.percentile(50) if per_repaint else 0:>9.0f}")
+        return "\n".join(lines)
+
+    def dump_trace(self, filepath: Path):
+        """ Write the trace events in the Trace Event Format, e.g. for chrome://tracing or Perfetto """
+        with self._lock:
+            events = list(self.trace_events or ())
+        with open(filepath, "w") as f:
+            json.dump(dict(traceEvents=events, displayTimeUnit="ms"), f)
+        logger.info(f"Wrote {len(events)} trace events to {filepath}")
+
+
+@lru_cache(maxsize=None)
+def _role_name(role: int) -> str:
+    try:
+        return Qt.ItemDataRole(role).name
+    except ValueError:
+        return str(int(role))
+
+
+def instrument_hot_paths(profiler: Profiler):
+    """ Time the model, serialization and session functions """
+    from . import database, testdata
+    from .model import TableModel
+    from .session import SessionSettings
+
+    profiler.instrument(TableModel, "fetch_data")
+    profiler.instrument(TableModel, "data", key=lambda self, index, role=Qt.DisplayRole: _role_name(role))
+    profiler.instrument(TableModel, "headerData",
+                        key=lambda self, section, orientation, role=Qt.DisplayRole: _role_name(role))
+    profiler.instrument(TableModel, "setData")
+    profiler.instrument(TableModel, "update_days")
+    for function in ("open_db", "save_json", "save_sqlite"):
+        profiler.instrument(database, function)
+    for function in ("load_from_json", "save_as_json"):
+        profiler.instrument(testdata, function)
+    for method in ("read", "apply", "serialize", "write"):
+        profiler.instrument(SessionSettings, method)
+
+
+class RepaintCounter(QObject):
+    """ Event filter that tells the profiler when a widget is repainted """
+
+    def __init__(self, profiler: Profiler, parent: QObject = None):
+        super().__init__(parent)
+        self.profiler = profiler
+
+    def eventFilter(self, watched: QObject, event: QEvent) -> bool:
+        if event.type() == QEvent.Paint:
+            self.profiler.repainted()
+        return False
+
+
+class ProfilerLabel(QLabel):
+    """ Status bar widget with the rate of the model calls """
+
+    def __init__(self, profiler: Profiler, parent=None):
+        super().__init__(parent)
+        self.profiler = profiler
+        self._counts: dict[str, int] = {}
+        self._timer = QTimer(self)
+        self._timer.timeout.connect(self.refresh)
+        self._timer.start(1000)
+
+    def refresh(self):
+        counts = self.profiler.counts()
+        rates = Counter()
+        for name, count in counts.items():
+            rates[name.split("[")[0]] += count - self._counts.get(name, 0)
+        self._counts = counts
+        fetch = self.profiler.latencies.get("TableModel.fetch_data")
+        self.setText(f"data {rates['TableModel.data']}/s, header {rates['TableModel.headerData']}/s, "
+                     f"fetch p95 {fetch.percentile(95) * 1e3 if fetch else 0:.1f} ms")
+
+
+class StartupTimer(QObject):
+    """ Time from the start of the process until each startup step """
+
+    def __init__(self, started: float, parent: QObject = None):
+        super().__init__(parent)
+        self.started = started
+        self.marks: list[tuple[str, float]] = []
+
+    def mark(self, step: str):
+        self.marks.append((step, time.perf_counter() - self.started))
+
+    def watch_first_paint(self, widget: QObject):
+        widget.installEventFilter(self)
+
+    def eventFilter(self, watched: QObject, event: QEvent) -> bool:
+        if event.type() == QEvent.Paint:
+            watched.removeEventFilter(self)
+            self.mark("first paint")
+        return False
+
+    def report(self) -> str:
+        return "\n".join(f"{step:<20} {seconds * 1e3:8.1f} ms" for step, seconds in self.marks)
+
+
+def output_from_env() -> Union[str, None]:
+    """ None if profiling is not enabled, otherwise the output file, which may be empty """
+    value = os.environ.get(ENV_VAR)
+    if value is None or value.lower() in ("", "0", "false", "no"):
+        return None
+    return "" if value.lower() in ("1", "true", "yes") else value
@@ -0,0 +1,78 @@
+from PySide6.QtCore import QAbstractListModel, QModelIndex, Qt
+from PySide6.QtWidgets import QCompleter, QLineEdit
+from itertools import islice
+from typing import Iterator
+from .projects import Project, ProjectRegistry
+
+
+class ProjectCompletionModel(QAbstractListModel):
+    """
+    Search results of a ProjectRegistry, a batch at a time. More are fetched with fetch_more, since QCompleter would
+    fetch everything through canFetchMore/fetchMore.
+    """
+    BATCH_SIZE = 50
+
+    def __init__(self, registry: ProjectRegistry, parent=None):
+        super().__init__(parent)
+        self.registry = registry
+        self._results: Iterator[Project] = iter(())
+        self._rows: list[Project] = []
+        self.exhausted = True
+
+    def set_query(self, query: str):
+        self.beginResetModel()
+        self._results = self.registry.search(query)
+        self._rows = list(islice(self._results, self.BATCH_SIZE))
+        self.exhausted = len(self._rows) < self.BATCH_SIZE
+        self.endResetModel()
+
+    def fetch_more(self):
+        if self.exhausted:
+            return
+        batch = list(islice(self._results, self.BATCH_SIZE))
+        self.exhausted = len(batch) < self.BATCH_SIZE
+        if batch:
+            self.beginInsertRows(QModelIndex(), len(self._rows), len(self._rows) + len(batch) - 1)
+            self._rows.extend(batch)
+            self.endInsertRows()
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._rows)
+
+    def data(self, index: QModelIndex, role: int = Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        project = self._rows[index.row()]
+        if role == Qt.DisplayRole:
+            return f"{project.id}  {project.name}" if project.name else project.id
+        elif role == Qt.EditRole:
+            return project.id
+        elif role == Qt.ToolTipRole:
+            return project.name
+
+
+class ProjectCompleter(QCompleter):
+    """
+    Completes project IDs in a line edit. The model does the filtering and ranking, so the completer shows its rows
+    as they are instead of filtering them again. The next batch is fetched when the popup is scrolled to the end.
+    """
+
+    def __init__(self, registry: ProjectRegistry, line_edit: QLineEdit):
+        super().__init__(line_edit)
+        self.completion_model = ProjectCompletionModel(registry, self)
+        self.setModel(self.completion_model)
+        self.setCompletionMode(QCompleter.UnfilteredPopupCompletion)
+        self.setCompletionRole(Qt.EditRole)
+        self.setWidget(line_edit)
+        line_edit.textEdited.connect(self.update_completions)
+        self.activated.connect(line_edit.setText)
+        scroll_bar = self.popup().verticalScrollBar()
+        scroll_bar.valueChanged.connect(
+            lambda value: self.completion_model.fetch_more() if value == scroll_bar.maximum() else None)
+
+    def update_completions(self, text: str):
+        self.completion_model.set_query(text)
+        if text and self.completion_model.rowCount() > 0:
+            self.complete()
+        else:
+            self.popup().hide()
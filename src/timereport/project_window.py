@@ -0,0 +1,166 @@
+from PySide6.QtWidgets import QMainWindow, QHeaderView
+from PySide6.QtCore import QAbstractTableModel, QModelIndex, Qt, Signal
+from datetime import date, timedelta
+from logging import getLogger
+from .allocation import Allocations, parse_split
+from .project_completer import ProjectCompleter
+from .projects import Project, ProjectRegistry
+from .ui.project_distribution import Ui_MainWindow
+from .util import format_duration, parse_duration
+
+logger = getLogger(__name__)
+
+
+class ProjectTotalsModel(QAbstractTableModel):
+    """ Time per project over a range of days, largest first """
+    HEADERS = ("project", "name", "time", "share")
+
+    def __init__(self, allocations: Allocations, registry: ProjectRegistry, parent=None):
+        super().__init__(parent)
+        self.allocations = allocations
+        self.registry = registry
+        self._start: date = date.today()
+        self._end: date = date.today()
+        self._rows: list[tuple[str, int]] = []
+        self._total = 0
+
+    def set_range(self, start: date, end: date):
+        self._start, self._end = start, end
+        self.refresh()
+
+    def covers(self, day: date) -> bool:
+        return self._start <= day <= self._end
+
+    def set_sources(self, allocations: Allocations, registry: ProjectRegistry):
+        self.allocations = allocations
+        self.registry = registry
+        self.refresh()
+
+    def refresh(self):
+        """ Read the totals again. Only the numbers are updated if the projects and their order stay the same """
+        totals = self.allocations.totals(self._start, self._end)
+        rows = sorted(totals.items(), key=lambda item: (-item[1], item[0]))
+        same_projects = [p for p, _ in rows] == [p for p, _ in self._rows]
+        if same_projects:
+            self._rows = rows
+            self._total = sum(totals.values())
+            if rows:
+                self.dataChanged.emit(self.index(0, 2), self.index(len(rows) - 1, len(self.HEADERS) - 1), [])
+        else:
+            self.beginResetModel()
+            self._rows = rows
+            self._total = sum(totals.values())
+            self.endResetModel()
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def data(self, index: QModelIndex, role: int = Qt.DisplayRole):
+        if not index.isValid() or role not in (Qt.DisplayRole, Qt.TextAlignmentRole):
+            return None
+        column = self.HEADERS[index.column()]
+        if role == Qt.TextAlignmentRole:
+            return int(Qt.AlignRight | Qt.AlignVCenter) if column in ("time", "share") else None
+        project_id, seconds = self._rows[index.row()]
+        if column == "project":
+            return project_id
+        elif column == "name":
+            project = self.registry.get(project_id)
+            return "" if project is None else project.name
+        elif column == "time":
+            return format_duration(timedelta(seconds=seconds))
+        return f"{seconds * 100 / self._total:.0f} %" if self._total else ""
+
+    def headerData(self, section: int, orientation: Qt.Orientation, role: int = Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+
+
+class ProjectDistributionWindow(QMainWindow):
+    """ Quick-report of time on projects for today, and the time per project of the overview's period """
+    # Emitted when deltas or main projects have been changed, and should be saved
+    allocations_edited = Signal()
+
+    def __init__(self, allocations: Allocations, registry: ProjectRegistry, parent=None):
+        super().__init__(parent)
+        self.ui = Ui_MainWindow()
+        self.ui.setupUi(self)
+        self.allocations = allocations
+        self.registry = registry
+        self.day = date.today()
+        self.model = ProjectTotalsModel(allocations, registry, self)
+        self.ui.tableview_projects.setModel(self.model)
+        self.ui.tableview_projects.horizontalHeader().setSectionResizeMode(
+            ProjectTotalsModel.HEADERS.index("name"), QHeaderView.Stretch)
+        self.completer = ProjectCompleter(registry, self.ui.edit_project)
+        self.ui.btn_add.clicked.connect(self.add_time)
+        self.ui.edit_duration.returnPressed.connect(self.add_time)
+        self.ui.btn_set_main.clicked.connect(self.set_main)
+        allocations.add_batch_listener(self.on_allocations_changed)
+        self.update_day()
+
+    def set_sources(self, allocations: Allocations, registry: ProjectRegistry):
+        """ Show the allocations and projects of another database """
+        self.allocations.remove_batch_listener(self.on_allocations_changed)
+        self.allocations = allocations
+        self.registry = registry
+        self.completer.completion_model.registry = registry
+        allocations.add_batch_listener(self.on_allocations_changed)
+        self.model.set_sources(allocations, registry)
+        self.update_day()
+
+    def set_period(self, label: str, start: date, end: date):
+        self.ui.lbl_period.setText(label)
+        self.model.set_range(start, end)
+
+    def on_allocations_changed(self, changes: dict[date, tuple[str, ...]]):
+        if any(self.model.covers(day) for day in changes):
+            self.model.refresh()
+        if self.day in changes:
+            self.update_day()
+
+    def update_day(self):
+        split = self.allocations.day_split(self.day)
+        parts = [f"{format_duration(timedelta(seconds=s))} h {p}" for p, s in sorted(split.items())]
+        unallocated = self.allocations.unallocated(self.day)
+        if unallocated > 0:
+            parts.append(f"{format_duration(timedelta(seconds=unallocated))} h unallocated")
+        elif unallocated < 0:
+            parts.append(f"{format_duration(timedelta(seconds=-unallocated))} h more than the day")
+        self.ui.lbl_day.setText(f"{self.day}: {', '.join(parts) or 'nothing reported'}")
+
+    def _project(self, project_id: str):
+        if project_id not in self.registry:
+            self.registry.add(Project(project_id))
+        self.registry.record_use(project_id)
+
+    def add_time(self):
+        project_id = self.ui.edit_project.text().strip()
+        try:
+            duration = parse_duration(self.ui.edit_duration.text())
+        except ValueError as e:
+            self.ui.statusbar.showMessage(str(e), 4000)
+            return
+        if not project_id:
+            self.ui.statusbar.showMessage("No project", 4000)
+            return
+        self._project(project_id)
+        self.allocations.add(self.day, project_id, duration)
+        self.ui.edit_duration.clear()
+        self.ui.statusbar.showMessage(f"Added {format_duration(duration)} h to {project_id}", 4000)
+        self.allocations_edited.emit()
+
+    def set_main(self):
+        try:
+            split = parse_split(self.ui.edit_project.text())
+        except ValueError as e:
+            self.ui.statusbar.showMessage(str(e), 4000)
+            return
+        for project_id in split:
+            self._project(project_id)
+        self.allocations.set_main(self.day, split)
+        self.ui.statusbar.showMessage(f"Set the main project of {self.day}", 4000)
+        self.allocations_edited.emit()
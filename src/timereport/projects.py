@@ -0,0 +1,236 @@
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from itertools import accumulate, chain
+from logging import getLogger
+from pathlib import Path
+from typing import Iterable, Iterator, Union
+import json
+import math
+import re
+import time
+from .util import replacing
+
+logger = getLogger(__name__)
+
+SUFFIX = ".projects.json"
+
+# Kinds of index keys, in ranking order
+_ID, _NAME = 0, 1
+
+
+@dataclass(frozen=True)
+class Project:
+    id: str
+    name: str = ""
+
+
+@dataclass
+class Usage:
+    count: int
+    # Seconds since the epoch
+    last_used: float
+
+
+def projects_path(db_path: Path) -> Path:
+    """
+    The project registry of a database, e.g. trep.db.json.projects.json for trep.db.json. The whole file name is kept,
+    so that e.g. trep.db.json and trep.db.sqlite have their own
+    """
+    return db_path.with_name(db_path.name + SUFFIX)
+
+
+class ProjectIndex:
+    """
+    Sorted lowercase keys for prefix lookups with bisect. Each project has its ID, its full name and each word of
+    its name as keys.
+    """
+
+    def __init__(self, projects: Iterable[Project] = ()):
+        entries = sorted(chain.from_iterable(self._entries(p) for p in projects))
+        self._keys: list[str] = [key for key, _, _ in entries]
+        self._kinds: list[int] = [kind for _, kind, _ in entries]
+        self._ids: list[str] = [project_id for _, _, project_id in entries]
+
+    @staticmethod
+    def _entries(project: Project) -> set[tuple[str, int, str]]:
+        name = project.name.lower()
+        return {(project.id.lower(), _ID, project.id), (name, _NAME, project.id)} | \
+            {(word, _NAME, project.id) for word in name.split()}
+
+    def add(self, project: Project):
+        """ Insert the keys of one project. Linear in the number of keys, so build a new index for many projects """
+        for key, kind, project_id in self._entries(project):
+            i = bisect_left(self._keys, key)
+            self._keys.insert(i, key)
+            self._kinds.insert(i, kind)
+            self._ids.insert(i, project_id)
+
+    def remove(self, project: Project):
+        for key, kind, project_id in self._entries(project):
+            i = bisect_left(self._keys, key)
+            while i < len(self._keys) and self._keys[i] == key:
+                if self._ids[i] == project_id and self._kinds[i] == kind:
+                    del self._keys[i], self._kinds[i], self._ids[i]
+                    break
+                i += 1
+
+    def prefix(self, prefix: str) -> tuple[list[str], list[str]]:
+        """ IDs of the projects with an ID, and with a name, starting with the lowercase prefix. In key order """
+        start = bisect_left(self._keys, prefix)
+        end = bisect_left(self._keys, prefix + "\uffff", start)
+        kinds, ids = self._kinds[start:end], self._ids[start:end]
+        id_matches = [i for kind, i in zip(kinds, ids) if kind == _ID]
+        name_matches = list(dict.fromkeys(i for kind, i in zip(kinds, ids) if kind == _NAME))
+        return id_matches, name_matches
+
+
+class ProjectRegistry:
+    """
+    The known projects, and how often and how recently time has been reported on each, for ranking completions.
+
+    Search results are ranked by ID prefix matches, then name prefix matches and last fuzzy matches, i.e. all
+    characters in order. Within each group, frequently and recently used projects come first.
+    """
+    # Time for the weight of a use to halve when ranking
+    RECENCY_HALF_LIFE = 14 * 24 * 3600
+
+    def __init__(self, projects: Iterable[Project] = ()):
+        self._usage: dict[str, Usage] = {}
+        self._set_projects({p.id: p for p in projects})
+
+    def _set_projects(self, projects: dict[str, Project]):
+        """ Replace all projects, building the index once, instead of inserting them one at a time """
+        self._projects: dict[str, Project] = projects
+        self._index = ProjectIndex(projects.values())
+        # Lowercase "id name" of each project, for fuzzy matching
+        self._haystacks: dict[str, str] = {p.id: self._haystack(p) for p in projects.values()}
+        # All haystacks as lines of one text, so that a regular expression can scan them without a Python loop
+        self._fuzzy_text: Union[tuple[str, list[int], list[str]], None] = None
+        # The last fuzzy query and its matches, a longer query only has to look among them
+        self._fuzzy_cache: tuple[str, list[str]] = ("", [])
+
+    @staticmethod
+    def _haystack(project: Project) -> str:
+        return f"{project.id} {project.name}".lower().replace("\n", " ")
+
+    def __len__(self) -> int:
+        return len(self._projects)
+
+    def __contains__(self, project_id: str) -> bool:
+        return project_id in self._projects
+
+    def __iter__(self) -> Iterator[Project]:
+        return iter(self._projects.values())
+
+    def get(self, project_id: str) -> Union[Project, None]:
+        return self._projects.get(project_id)
+
+    def add(self, project: Project):
+        """ Add a project, or rename an existing one """
+        old = self._projects.get(project.id)
+        if old == project:
+            return
+        if old is not None:
+            self._index.remove(old)
+        self._projects[project.id] = project
+        self._index.add(project)
+        self._haystacks[project.id] = self._haystack(project)
+        self._fuzzy_text = None
+        self._fuzzy_cache = ("", [])
+
+    def remove(self, project_id: str):
+        project = self._projects.pop(project_id)
+        self._index.remove(project)
+        del self._haystacks[project_id]
+        self._usage.pop(project_id, None)
+        self._fuzzy_text = None
+        self._fuzzy_cache = ("", [])
+
+    def record_use(self, project_id: str, when: float = None):
+        when = time.time() if when is None else when
+        usage = self._usage.get(project_id)
+        if usage is None:
+            self._usage[project_id] = Usage(1, when)
+        else:
+            usage.count += 1
+            usage.last_used = max(usage.last_used, when)
+
+    def score(self, project_id: str, now: float = None) -> float:
+        """
+        Log2 of the number of uses, halved for each half-life since the last use. In log space, so that it does not
+        underflow for projects used long ago.
+        """
+        usage = self._usage.get(project_id)
+        if usage is None:
+            return -math.inf
+        age = (time.time() if now is None else now) - usage.last_used
+        return math.log2(usage.count) - max(age, 0) / self.RECENCY_HALF_LIFE
+
+    def _ranked(self, project_ids: list[str], now: float) -> Iterator[Project]:
+        """ The used projects by score, then the rest in the given order """
+        usage = self._usage
+        used = sorted((i for i in project_ids if i in usage), key=lambda i: (-self.score(i, now), i))
+        yield from (self._projects[i] for i in used)
+        yield from (self._projects[i] for i in project_ids if i not in usage)
+
+    def _fuzzy(self, query: str) -> list[str]:
+        """ IDs of the projects with all characters of the query, in order, in their ID or name """
+        last_query, last_matches = self._fuzzy_cache
+        if last_query and query.startswith(last_query):
+            search = re.compile(".*?".join(map(re.escape, query))).search
+            matches = [i for i in last_matches if search(self._haystacks[i])]
+        else:
+            if self._fuzzy_text is None:
+                ids = list(self._haystacks.keys())
+                starts = list(accumulate((len(h) + 1 for h in self._haystacks.values()), initial=0))
+                self._fuzzy_text = "\n".join(self._haystacks.values()), starts, ids
+            text, starts, ids = self._fuzzy_text
+            # Anchored at the start of each line, with no backtracking: up to the first a, then up to the first b...
+            pattern = re.compile("^" + "".join(f"[^{c}\\n]*{c}" for c in map(re.escape, query)), re.MULTILINE)
+            matches = [ids[bisect_right(starts, m.start()) - 1] for m in pattern.finditer(text)]
+        self._fuzzy_cache = (query, matches)
+        return matches
+
+    def search(self, query: str) -> Iterator[Project]:
+        """ Matching projects, best first. Evaluated lazily, so taking the first few results is fast """
+        now = time.time()
+        query = query.strip().lower()
+        if not query:
+            yield from self._ranked(list(self._projects.keys()), now)
+            return
+        id_matches, name_matches = self._index.prefix(query)
+        seen = set(id_matches)
+        name_matches = [i for i in name_matches if i not in seen]
+        yield from self._ranked(id_matches, now)
+        yield from self._ranked(name_matches, now)
+        seen.update(name_matches)
+        yield from self._ranked([i for i in self._fuzzy(query) if i not in seen], now)
+
+    def load(self, filepath: Path):
+        """ Add the projects and usage of a registry file, if it exists """
+        if not filepath.exists():
+            return
+        with open(filepath) as f:
+            file_dict = json.load(f)
+        projects = dict(self._projects)
+        projects.update((p["id"], Project(p["id"], p.get("name", ""))) for p in file_dict.get("projects", []))
+        self._set_projects(projects)
+        for project_id, usage in file_dict.get("usage", {}).items():
+            self._usage[project_id] = Usage(usage["count"], usage["last_used"])
+        logger.info(f"Loaded {len(self)} projects from {filepath}")
+
+    def serialize(self) -> dict:
+        return dict(
+            projects=[dict(id=p.id, name=p.name) for p in sorted(self, key=lambda p: p.id)],
+            usage={i: dict(count=u.count, last_used=u.last_used) for i, u in sorted(self._usage.items())},
+        )
+
+    def save(self, filepath: Path):
+        self.write(filepath, self.serialize())
+
+    @staticmethod
+    def write(filepath: Path, file_dict: dict):
+        """ Write a serialized registry, replacing the file only once it is completely written. Safe to call from
+        another thread """
+        with replacing(filepath) as tmp_path, open(tmp_path, "w") as f:
+            json.dump(file_dict, f, indent=1)
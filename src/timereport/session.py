@@ -1,13 +1,18 @@
 from PySide6.QtCore import QSize
-from dataclasses import dataclass, field
-from datetime import date, datetime, time
+from dataclasses import dataclass, field, fields
+from datetime import date, time, timedelta
 from enum import auto, Enum, unique
 from logging import getLogger
+from operator import attrgetter
 from pathlib import Path
+from typing import Any, Callable
 import json
+from .util import replacing
 
 logger = getLogger(__name__)
 
+SESSION_FILE = Path(".timereport-session.json")
+
 
 @unique
 class TimeViewType(Enum):
@@ -15,6 +20,7 @@ class TimeViewType(Enum):
     WEEK = auto()
     MONTH = auto()
     AROUND_DAY = auto()
+    TIMELINE = auto()
 
 
 @dataclass
@@ -25,55 +31,108 @@ class SessionSettings:
     window_size: QSize = QSize(300, 600)
     recent_files: list[Path] = field(default_factory=lambda: [])
     lunch_interval: list[time, time] = field(default_factory=lambda: [time(11, 30), time(12, 00)])
-
-    # Serialize function, Deserialize function
-    serdes = {
-        "time_view_type": (lambda v: v.name, lambda s: TimeViewType[s]),
-        "view_date": (lambda v: v.strftime("%Y-%m-%d"), lambda s: datetime.strptime(s, "%Y-%m-%d").date()),
-        "window_size": (lambda v: dict(w=v.width(), h=v.height()), lambda s: QSize(s["w"], s["h"])),
-        "recent_files": (lambda v: [str(f.absolute()) for f in v], lambda s: [Path(f) for f in s]),
-        "lunch_interval": (lambda v: [str(d.strftime("%H:%M")) for d in v],
-                           lambda ss: [datetime.strptime(s, "%H:%M").time() for s in ss])
-    }
+    # Expected working time per weekday, excluding lunch
+    daily_norm: timedelta = timedelta(hours=8)
+    # Project for the time of days without a main project of their own
+    main_project: str = ""
 
     def load(self, filepath: Path):
+        self.apply(self.read(filepath))
+
+    @staticmethod
+    def read(filepath: Path) -> dict:
+        """ Read the session file, without applying it. Safe to call from another thread """
         if not filepath.exists():
             logger.info(f"The session file {filepath.absolute()} does not exist. No changes.")
-            return
+            return {}
 
         with open(filepath, 'r') as f:
-            file_dict = json.loads(f.read())
-        for prop in self.__dataclass_fields__.keys():
-            if prop not in self.serdes:
-                logger.warning(f"Missing deserializer for property {prop}.")
-                continue
+            return json.loads(f.read())
 
-            _, deserialize = self.serdes[prop]
-            try:
-                value = deserialize(file_dict[prop])
-                setattr(self, prop, value)
-            except KeyError:
-                logger.warning(f"Key {prop} missing in session file. Skipping.")
-            except BaseException as e:
-                logger.exception(f"Error while serializing {prop}.")
-                continue
+    def apply(self, file_dict: dict):
+        """ Apply the contents of a session file. Missing or broken values keep their current value """
+        if not file_dict:
+            return
+        try:
+            values = {name: decode(file_dict[name]) for name, _, decode in _CODECS if name in file_dict}
+        except Exception:
+            # Find out which values are broken only when there are any
+            values = self._decode_each(file_dict)
+        missing = [name for name, _, _ in _CODECS if name not in file_dict]
+        if missing:
+            logger.warning(f"Keys {missing} missing in session file. Skipping.")
+        for name, value in values.items():
+            setattr(self, name, value)
 
-    def save(self, filepath: Path):
-        kwargs = dict()
-        for prop in self.__dataclass_fields__.keys():
-            if prop not in self.serdes:
-                logger.warning(f"Missing serializer for property {prop}.")
+    @staticmethod
+    def _decode_each(file_dict: dict) -> dict:
+        values = {}
+        for name, _, decode in _CODECS:
+            if name not in file_dict:
                 continue
-            value = getattr(self, prop)
-            serialize, _ = self.serdes[prop]
             try:
-                value = serialize(getattr(self, prop))
-            except KeyError:
-                logger.error(f"Key {prop} missing in session setting. Skipping.")
-            except BaseException as e:
-                logger.warning(f"Error while serializing {prop}. Got the following error: {e}")
-                continue
-            kwargs[prop] = value
+                values[name] = decode(file_dict[name])
+            except Exception:
+                logger.exception(f"Error while deserializing {name}. Skipping.")
+        return values
+
+    def save(self, filepath: Path):
+        self.write(filepath, self.serialize())
 
-        with open(filepath, 'w') as f:
+    def serialize(self) -> dict:
+        return {name: encode(getattr(self, name)) for name, encode, _ in _CODECS}
+
+    @staticmethod
+    def write(filepath: Path, kwargs: dict):
+        """ Write serialized settings, replacing the file only once it is completely written. Safe to call from
+        another thread """
+        with replacing(filepath) as tmp_path, open(tmp_path, 'w') as f:
             f.write(json.dumps(kwargs, sort_keys=True, indent=4))
+
+
+def _encode_size(size: QSize) -> dict:
+    return dict(w=size.width(), h=size.height())
+
+
+def _decode_size(d: dict) -> QSize:
+    return QSize(d["w"], d["h"])
+
+
+def _encode_paths(paths: list[Path]) -> list[str]:
+    return [str(p.absolute()) for p in paths]
+
+
+def _decode_paths(strings: list[str]) -> list[Path]:
+    return [Path(s) for s in strings]
+
+
+def _encode_times(times: list[time]) -> list[str]:
+    return [t.isoformat("minutes") for t in times]
+
+
+def _decode_times(strings: list[str]) -> list[time]:
+    return [time.fromisoformat(s) for s in strings]
+
+
+def _encode_minutes(td: timedelta) -> int:
+    return int(td.total_seconds() // 60)
+
+
+def _decode_minutes(minutes: int) -> timedelta:
+    return timedelta(minutes=minutes)
+
+
+# Encode and decode functions per field, e.g. view_date as 2021-06-01 and lunch_interval as ["11:30", "12:00"]
+CODECS: dict[str, tuple[Callable[[Any], Any], Callable[[Any], Any]]] = {
+    "time_view_type": (attrgetter("name"), TimeViewType.__getitem__),
+    "view_date": (date.isoformat, date.fromisoformat),
+    "window_size": (_encode_size, _decode_size),
+    "recent_files": (_encode_paths, _decode_paths),
+    "lunch_interval": (_encode_times, _decode_times),
+    "daily_norm": (_encode_minutes, _decode_minutes),
+    "main_project": (str, str),
+}
+
+# In field order, looked up once here instead of per field and call. Fails on import if a field has no codec
+_CODECS: tuple[tuple[str, Callable, Callable], ...] = tuple(
+    (f.name, *CODECS[f.name]) for f in fields(SessionSettings))
@@ -0,0 +1,154 @@
+from array import array
+from contextlib import contextmanager, nullcontext
+from datetime import date
+from pathlib import Path
+from typing import Iterable, Iterator, Union
+from logging import getLogger
+import sqlite3
+from .store import ObservableStore, Row, MISSING, time_to_seconds
+
+logger = getLogger(__name__)
+
+SUFFIX = ".sqlite"
+
+
+def _to_row(day: int, came: Union[int, None], went: Union[int, None], note: str) -> Row:
+    return Row(date.fromordinal(day), MISSING if came is None else came, MISSING if went is None else went, note)
+
+
+def _to_column(seconds: int) -> Union[int, None]:
+    return None if seconds == MISSING else seconds
+
+
+class SqliteStore(ObservableStore):
+    """
+    Day records in a single-file SQLite database, with the same interface as TimeStore.
+
+    The day ordinal is the primary key, so rows are clustered in date order and a range query is a single index
+    range scan. Nothing is kept in memory apart from the connection, which is reused for all queries. The database
+    is in WAL mode, so a copy being read in another thread sees the days as they were when it started reading.
+    """
+    FIELDS = ("came", "went", "note")
+
+    def __init__(self, filepath: Path):
+        super().__init__()
+        self.filepath = filepath
+        # Opened by the I/O worker and then used from the GUI thread, but never from two threads at once
+        self._conn = sqlite3.connect(filepath, check_same_thread=False)
+        # Readers do not block writers, so that editing does not wait for e.g. an export reading a copy
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS days ("
+                "day INTEGER PRIMARY KEY, came INTEGER, went INTEGER, note TEXT NOT NULL DEFAULT '')"
+            )
+
+    def close(self):
+        self._conn.close()
+
+    @contextmanager
+    def batch(self):
+        """ Group the changes made in the block into one transaction, committed before listeners are notified """
+        if self.in_batch:
+            yield
+            return
+        with super().batch(), self._conn:
+            yield
+
+    def _transaction(self):
+        """ A transaction per change, or none inside a batch since the batch already has one """
+        return nullcontext() if self.in_batch else self._conn
+
+    def copy(self) -> "SqliteStore":
+        """ A separate connection to the same database, without the listeners """
+        return SqliteStore(self.filepath)
+
+    def __len__(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM days").fetchone()[0]
+
+    def __contains__(self, day: date) -> bool:
+        return self._conn.execute("SELECT 1 FROM days WHERE day = ?", (day.toordinal(), )).fetchone() is not None
+
+    def __iter__(self) -> Iterator[date]:
+        for (day, ) in self._conn.execute("SELECT day FROM days ORDER BY day"):
+            yield date.fromordinal(day)
+
+    def span(self) -> Union[tuple[date, date], None]:
+        first, last = self._conn.execute("SELECT MIN(day), MAX(day) FROM days").fetchone()
+        if first is None:
+            return None
+        return date.fromordinal(first), date.fromordinal(last)
+
+    def get(self, day: date) -> Union[Row, None]:
+        result = self._conn.execute(
+            "SELECT day, came, went, note FROM days WHERE day = ?", (day.toordinal(), )).fetchone()
+        return None if result is None else _to_row(*result)
+
+    def items(self) -> Iterator[Row]:
+        """ All records in date order """
+        for result in self._conn.execute("SELECT day, came, went, note FROM days ORDER BY day"):
+            yield _to_row(*result)
+
+    def range(self, start: date, end: date) -> Iterator[Row]:
+        """ The records between start and end, both inclusive, in date order. Days without records are skipped """
+        results = self._conn.execute(
+            "SELECT day, came, went, note FROM days WHERE day BETWEEN ? AND ? ORDER BY day",
+            (start.toordinal(), end.toordinal())).fetchall()
+        for result in results:
+            yield _to_row(*result)
+
+    def notes(self) -> Iterator[tuple[date, str]]:
+        """ The days with a note, and the note, in no particular order """
+        for day, note in self._conn.execute("SELECT day, note FROM days WHERE note != ''").fetchall():
+            yield date.fromordinal(day), note
+
+    def columns(self, start: date, end: date) -> tuple[array, array]:
+        """ Came and went seconds for every day between start and end, both inclusive, MISSING where unset """
+        first = start.toordinal()
+        size = end.toordinal() - first + 1
+        came = array('i', [MISSING]) * size
+        went = array('i', [MISSING]) * size
+        results = self._conn.execute(
+            "SELECT day, IFNULL(came, ?), IFNULL(went, ?) FROM days WHERE day BETWEEN ? AND ?",
+            (MISSING, MISSING, first, end.toordinal()))
+        for day, c, w in results:
+            came[day - first] = c
+            went[day - first] = w
+        return came, went
+
+    def insert_rows(self, rows: Iterable[Row]):
+        """ Bulk insert in a single transaction, e.g. when importing. Listeners are not notified """
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO days (day, came, went, note) VALUES (?, ?, ?, ?)",
+                ((row.date.toordinal(), _to_column(row.came_seconds), _to_column(row.went_seconds), row.note or "")
+                 for row in rows))
+
+    def upsert(self, day: date, **fields) -> Row:
+        """ Update the given fields of a day, creating the day if it does not exist """
+        unknown = fields.keys() - set(self.FIELDS)
+        if unknown:
+            raise KeyError(f"Unknown fields {sorted(unknown)}")
+        old = self.get(day)
+        new = dict(came=None, went=None, note="") if old is None else dict(came=old.came, went=old.went, note=old.note)
+        new.update(fields)
+        with self._transaction():
+            self._conn.execute(
+                "INSERT OR REPLACE INTO days (day, came, went, note) VALUES (?, ?, ?, ?)",
+                (day.toordinal(), _to_column(time_to_seconds(new["came"])), _to_column(time_to_seconds(new["went"])),
+                 new["note"] or ""))
+        row = self.get(day)
+        if old is None:
+            changed = self.FIELDS
+        else:
+            changed = tuple(k for k in fields.keys() if getattr(old, k) != getattr(row, k))
+        if changed:
+            self._notify(day, changed)
+        return row
+
+    def delete(self, day: date):
+        with self._transaction():
+            deleted = self._conn.execute("DELETE FROM days WHERE day = ?", (day.toordinal(), )).rowcount
+        if deleted:
+            self._notify(day, self.FIELDS)
+
@@ -0,0 +1,310 @@
+from array import array
+from contextlib import contextmanager
+from datetime import date, time, timedelta
+from typing import Callable, Iterable, Iterator, Union
+from logging import getLogger
+
+logger = getLogger(__name__)
+
+# Called with the changed day and the names of the fields that changed
+ChangeListener = Callable[[date, tuple[str, ...]], None]
+# Called with the changed fields of each changed day, once per batch
+BatchListener = Callable[[dict[date, tuple[str, ...]]], None]
+
+# Column value for a day without a came or went time
+MISSING = -1
+
+
+def time_to_seconds(t: Union[time, None]) -> int:
+    return MISSING if t is None else t.hour * 3600 + t.minute * 60 + t.second
+
+
+def seconds_to_time(s: int) -> Union[time, None]:
+    if s == MISSING:
+        return None
+    hours, remainder = divmod(s, 3600)
+    minutes, seconds = divmod(remainder, 60)
+    return time(hours, minutes, seconds)
+
+
+class Row:
+    """ A single day, read from the columns of a store """
+    __slots__ = ("date", "came_seconds", "went_seconds", "note")
+
+    def __init__(self, day: date, came_seconds: int = MISSING, went_seconds: int = MISSING, note: str = None):
+        self.date = day
+        self.came_seconds = came_seconds
+        self.went_seconds = went_seconds
+        self.note = note
+
+    @property
+    def came(self) -> Union[time, None]:
+        return seconds_to_time(self.came_seconds)
+
+    @property
+    def went(self) -> Union[time, None]:
+        return seconds_to_time(self.went_seconds)
+
+    @property
+    def total(self) -> Union[timedelta, None]:
+        if self.came_seconds == MISSING or self.went_seconds == MISSING:
+            return None
+        return timedelta(seconds=self.went_seconds - self.came_seconds)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Row) and \
+            (self.date, self.came_seconds, self.went_seconds, self.note) == \
+            (other.date, other.came_seconds, other.went_seconds, other.note)
+
+    def __repr__(self) -> str:
+        return f"Row({self.date}, came={self.came}, went={self.went}, note={self.note!r})"
+
+
+class ObservableStore:
+    """
+    Change notification shared by the store backends.
+
+    Changes made inside batch() are held back until the outermost batch ends. Then each listener is called once per
+    changed day, and each batch listener once with all changed days, e.g. to update a view or flush a file once.
+    """
+
+    def __init__(self):
+        self._listeners: list[ChangeListener] = []
+        self._batch_listeners: list[BatchListener] = []
+        # The changed fields of each day while a batch is open, None otherwise
+        self._pending: Union[dict[date, dict[str, None]], None] = None
+
+    def add_listener(self, listener: ChangeListener):
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: ChangeListener):
+        self._listeners.remove(listener)
+
+    def add_batch_listener(self, listener: BatchListener):
+        self._batch_listeners.append(listener)
+
+    def remove_batch_listener(self, listener: BatchListener):
+        self._batch_listeners.remove(listener)
+
+    @property
+    def in_batch(self) -> bool:
+        return self._pending is not None
+
+    @contextmanager
+    def batch(self):
+        """ Group the changes made in the block into one notification """
+        if self._pending is not None:
+            yield
+            return
+        self._pending = {}
+        try:
+            yield
+        finally:
+            pending, self._pending = self._pending, None
+            if pending:
+                self._deliver({day: tuple(fields) for day, fields in pending.items()})
+
+    def _notify(self, day: date, fields: tuple[str, ...]):
+        if self._pending is not None:
+            self._pending.setdefault(day, {}).update(dict.fromkeys(fields))
+            return
+        self._deliver({day: fields})
+
+    def _deliver(self, changes: dict[date, tuple[str, ...]]):
+        for listener in self._listeners:
+            for day, fields in changes.items():
+                try:
+                    listener(day, fields)
+                except BaseException:
+                    logger.exception(f"Error in change listener {listener}")
+        for listener in self._batch_listeners:
+            try:
+                listener(changes)
+            except BaseException:
+                logger.exception(f"Error in batch listener {listener}")
+
+
+class TimeStore(ObservableStore):
+    """
+    Day records stored column-wise, indexed by the day's ordinal.
+
+    Came and went are kept as seconds since midnight in int32 arrays, with MISSING for no time. Notes are kept
+    separately since most days do not have one. Range queries cost O(k) in the number of days in the range.
+    """
+    FIELDS = ("came", "went", "note")
+
+    def __init__(self, records: dict[date, dict] = None):
+        super().__init__()
+        self._base = 0  # Ordinal of the first column entry
+        self._came = array('i')
+        self._went = array('i')
+        self._present = bytearray()
+        self._notes: dict[int, str] = {}
+        self._count = 0
+        if records:
+            ordinals = [day.toordinal() for day in records.keys()]
+            self._reserve(min(ordinals), max(ordinals))
+            for day, record in records.items():
+                self._write(day.toordinal(), **record)
+
+    def _reserve(self, first: int, last: int):
+        """ Grow the columns so that they cover the ordinals first to last """
+        if not self._present:
+            size = last - first + 1
+            self._base = first
+            self._came = array('i', [MISSING]) * size
+            self._went = array('i', [MISSING]) * size
+            self._present = bytearray(size)
+            return
+
+        if first < self._base:
+            # Grow by at least the current size, to keep repeated prepends amortized
+            grow = max(self._base - first, len(self._present))
+            self._came = array('i', [MISSING]) * grow + self._came
+            self._went = array('i', [MISSING]) * grow + self._went
+            self._present = bytearray(grow) + self._present
+            self._base -= grow
+
+        end = self._base + len(self._present)
+        if last >= end:
+            grow = max(last - end + 1, len(self._present))
+            self._came.extend(array('i', [MISSING]) * grow)
+            self._went.extend(array('i', [MISSING]) * grow)
+            self._present.extend(bytes(grow))
+
+    def _index(self, day: date) -> Union[int, None]:
+        i = day.toordinal() - self._base
+        if 0 <= i < len(self._present) and self._present[i]:
+            return i
+        return None
+
+    def _row(self, i: int) -> Row:
+        ordinal = i + self._base
+        return Row(date.fromordinal(ordinal), self._came[i], self._went[i], self._notes.get(ordinal, ""))
+
+    def _write(self, ordinal: int, came: time = None, went: time = None, note: str = None):
+        i = ordinal - self._base
+        if not self._present[i]:
+            self._present[i] = 1
+            self._count += 1
+        self._came[i] = time_to_seconds(came)
+        self._went[i] = time_to_seconds(went)
+        if note:
+            self._notes[ordinal] = note
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __contains__(self, day: date) -> bool:
+        return self._index(day) is not None
+
+    def __iter__(self) -> Iterator[date]:
+        for row in self.items():
+            yield row.date
+
+    def copy(self) -> "TimeStore":
+        """ A copy of the data, without the listeners """
+        other = TimeStore()
+        other._base = self._base
+        other._came = array('i', self._came)
+        other._went = array('i', self._went)
+        other._present = bytearray(self._present)
+        other._notes = dict(self._notes)
+        other._count = self._count
+        return other
+
+    def span(self) -> Union[tuple[date, date], None]:
+        """ The first and last stored day, or None if the store is empty """
+        if self._count == 0:
+            return None
+        first = self._present.index(1)
+        last = self._present.rindex(1)
+        return date.fromordinal(first + self._base), date.fromordinal(last + self._base)
+
+    def get(self, day: date) -> Union[Row, None]:
+        i = self._index(day)
+        return None if i is None else self._row(i)
+
+    def items(self) -> Iterator[Row]:
+        """ All records in date order """
+        present = self._present
+        for i in range(len(present)):
+            if present[i]:
+                yield self._row(i)
+
+    def range(self, start: date, end: date) -> Iterator[Row]:
+        """ The records between start and end, both inclusive, in date order. Days without records are skipped """
+        lo = max(start.toordinal() - self._base, 0)
+        hi = min(end.toordinal() - self._base + 1, len(self._present))
+        present = self._present
+        for i in range(lo, hi):
+            if present[i]:
+                yield self._row(i)
+
+    def notes(self) -> Iterator[tuple[date, str]]:
+        """ The days with a note, and the note, in no particular order """
+        for ordinal, note in self._notes.items():
+            yield date.fromordinal(ordinal), note
+
+    def columns(self, start: date, end: date) -> tuple[array, array]:
+        """ Came and went seconds for every day between start and end, both inclusive, MISSING where unset """
+        lo = start.toordinal() - self._base
+        hi = end.toordinal() - self._base + 1
+        size = hi - lo
+        came = array('i', [MISSING]) * size
+        went = array('i', [MISSING]) * size
+        clip_lo, clip_hi = max(lo, 0), min(hi, len(self._present))
+        if clip_lo < clip_hi:
+            came[clip_lo - lo:clip_hi - lo] = self._came[clip_lo:clip_hi]
+            went[clip_lo - lo:clip_hi - lo] = self._went[clip_lo:clip_hi]
+        return came, went
+
+    def insert_rows(self, rows: Iterable[Row]):
+        """ Bulk insert, e.g. while loading a file. Listeners are not notified """
+        for row in rows:
+            ordinal = row.date.toordinal()
+            if not self._present or not 0 <= ordinal - self._base < len(self._present):
+                self._reserve(ordinal, ordinal)
+            i = ordinal - self._base
+            if not self._present[i]:
+                self._present[i] = 1
+                self._count += 1
+            self._came[i] = row.came_seconds
+            self._went[i] = row.went_seconds
+            if row.note:
+                self._notes[ordinal] = row.note
+            else:
+                self._notes.pop(ordinal, None)
+
+    def upsert(self, day: date, **fields) -> Row:
+        """ Update the given fields of a day, creating the day if it does not exist """
+        unknown = fields.keys() - set(self.FIELDS)
+        if unknown:
+            raise KeyError(f"Unknown fields {sorted(unknown)}")
+        ordinal = day.toordinal()
+        i = self._index(day)
+        if i is None:
+            self._reserve(ordinal, ordinal)
+            self._write(ordinal, **fields)
+            changed = self.FIELDS
+        else:
+            old = self._row(i)
+            new = dict(came=old.came, went=old.went, note=old.note)
+            new.update(fields)
+            self._write(ordinal, **new)
+            if not new["note"]:
+                self._notes.pop(ordinal, None)
+            changed = tuple(k for k in fields.keys() if getattr(old, k) != getattr(self._row(i), k))
+        if changed:
+            self._notify(day, changed)
+        return self.get(day)
+
+    def delete(self, day: date):
+        i = self._index(day)
+        if i is None:
+            return
+        self._present[i] = 0
+        self._came[i] = self._went[i] = MISSING
+        self._notes.pop(day.toordinal(), None)
+        self._count -= 1
+        self._notify(day, self.FIELDS)
@@ -1,52 +1,156 @@
-from datetime import timedelta, date, datetime, time
+from datetime import timedelta, date
 from random import randint
+from typing import Callable, Iterable, Iterator, TextIO, Union
 from .util import timedelta_to_time
+from .store import TimeStore, Row, MISSING
 from pathlib import Path
 import json
-from copy import deepcopy
+import os
+import re
 
+# Called with the progress in percent
+ProgressCallback = Callable[[int], None]
 
-# A test database with some came and went times
-test_table_days = {
-    date.today() + timedelta(days=i): {
-        "came": timedelta_to_time(timedelta(hours=8, minutes=30) + timedelta(seconds=randint(-60*60, 60*60))),
-        "went": timedelta_to_time(timedelta(hours=17, minutes=00) + timedelta(seconds=randint(-60*60, 60*60))),
-        "note": ""
-    } for i in range(-2, 3)
-}
 
-test_table_days[sorted(test_table_days.keys())[0]]["note"] = "Here is a testnote with some details about the specific date"
+def generate_test_store() -> TimeStore:
+    """ A test database with some came and went times around today """
+    store = TimeStore({
+        date.today() + timedelta(days=i): {
+            "came": timedelta_to_time(timedelta(hours=8, minutes=30) + timedelta(seconds=randint(-60*60, 60*60))),
+            "went": timedelta_to_time(timedelta(hours=17, minutes=00) + timedelta(seconds=randint(-60*60, 60*60))),
+            "note": ""
+        } for i in range(-2, 3)
+    })
+    store.upsert(next(iter(store)), note="Here is a testnote with some details about the specific date")
+    return store
 
 
-def save_as_json(db: dict[date, dict], filename: Path):
-    db = deepcopy(db)  # To avoid editing in the original dict
+def format_time_json(s: int) -> str:
+    if s == MISSING:
+        return "null"
+    hours, remainder = divmod(s, 3600)
+    minutes, seconds = divmod(remainder, 60)
+    return f'"{hours:02d}:{minutes:02d}:{seconds:02d}"'
 
-    def time_to_str(t: time):
-        return t.strftime("%H:%M:%S")
 
-    # Transform data into JSON serializable format
-    transformed_data = {}
-    for k, d in db.items():
-        k = k.strftime("%Y-%m-%d")
-        d["came"] = time_to_str(d["came"])
-        d["went"] = time_to_str(d["went"])
-        transformed_data[k] = d
+def parse_time_json(s: Union[str, None]) -> int:
+    # Fixed format HH:MM:SS, much faster than strptime
+    if s is None:
+        return MISSING
+    return int(s[0:2]) * 3600 + int(s[3:5]) * 60 + int(s[6:8])
 
-    jsonified_data = json.dumps(transformed_data)
+
+def _report_progress(rows: Iterable[Row], total: int, progress: ProgressCallback) -> Iterator[Row]:
+    percent = -1
+    for i, row in enumerate(rows):
+        if i * 100 // total != percent:
+            percent = i * 100 // total
+            progress(percent)
+        yield row
+    progress(100)
+
+
+def _iter_json_lines(rows: Iterable[Row]) -> Iterator[str]:
+    """ One line per day, so that the file can also be read back one entry at a time """
+    separator = "\n"
+    for row in rows:
+        yield f'{separator}"{row.date.isoformat()}": {{"came": {format_time_json(row.came_seconds)}, ' \
+              f'"went": {format_time_json(row.went_seconds)}, "note": {json.dumps(row.note)}}}'
+        separator = ",\n"
+
+
+def save_as_json(db: TimeStore, filename: Path, progress: ProgressCallback = None):
+    rows = db.items()
+    if progress is not None:
+        rows = _report_progress(rows, max(len(db), 1), progress)
     with open(filename, 'w') as f:
-        f.write(jsonified_data)
+        f.write("{")
+        f.writelines(_iter_json_lines(rows))
+        f.write("\n}\n")
+
+
+def _iter_json_object(f: TextIO, chunk_size: int = 1 << 16,
+                      on_read: Callable[[int], None] = None) -> Iterator[tuple[str, object]]:
+    """
+    Iterate over the key-value pairs of a top level JSON object, reading the file in chunks. on_read is called with
+    the number of characters of each chunk.
+    """
+    decoder = json.JSONDecoder()
+    whitespace = re.compile(r"\s*")
+    buf, pos, eof = "", 0, False
 
+    def fill():
+        nonlocal buf, pos, eof
+        chunk = f.read(chunk_size)
+        eof = chunk == ""
+        if on_read is not None:
+            on_read(len(chunk))
+        buf = buf[pos:] + chunk
+        pos = 0
 
-def load_from_json(filename: Path) -> dict[date, dict]:
+    def peek() -> str:
+        nonlocal pos
+        while True:
+            pos = whitespace.match(buf, pos).end()
+            if pos < len(buf):
+                return buf[pos]
+            if eof:
+                raise json.JSONDecodeError("Unexpected end of file", buf, pos)
+            fill()
+
+    def decode():
+        nonlocal pos
+        while True:
+            peek()
+            try:
+                value, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                fill()
+                continue
+            # A value that ends the buffer might continue in the next chunk, e.g. a number
+            if end == len(buf) and not eof:
+                fill()
+                continue
+            pos = end
+            return value
+
+    if peek() != "{":
+        raise json.JSONDecodeError("Expecting '{'", buf, pos)
+    pos += 1
+    if peek() == "}":
+        return
+    while True:
+        key = decode()
+        if peek() != ":":
+            raise json.JSONDecodeError("Expecting ':'", buf, pos)
+        pos += 1
+        yield key, decode()
+        c = peek()
+        pos += 1
+        if c == "}":
+            return
+        if c != ",":
+            raise json.JSONDecodeError("Expecting ',' or '}'", buf, pos - 1)
+
+
+def iter_json_rows(f: TextIO, on_read: Callable[[int], None] = None) -> Iterator[Row]:
+    for k, d in _iter_json_object(f, on_read=on_read):
+        yield Row(date.fromisoformat(k), parse_time_json(d["came"]), parse_time_json(d["went"]), d.get("note", ""))
+
+
+def load_from_json(filename: Path, progress: ProgressCallback = None) -> TimeStore:
+    db = TimeStore()
     with open(filename) as f:
-        jsonified_data = f.read()
-    data: dict[str, dict[str, str]] = json.loads(jsonified_data)
-
-    # Interpret from JSON strings to native format
-    db = dict()
-    for k, d in data.items():
-        k = datetime.strptime(k, "%Y-%m-%d").date()
-        d["came"] = datetime.strptime(d["came"], "%H:%M:%S").time()
-        d["went"] = datetime.strptime(d["went"], "%H:%M:%S").time()
-        db[k] = d
+        on_read = None
+        if progress is not None:
+            size = max(os.fstat(f.fileno()).st_size, 1)
+            read = 0
+
+            def on_read(n: int):
+                nonlocal read
+                read += n
+                progress(min(read * 100 // size, 100))
+        db.insert_rows(iter_json_rows(f, on_read))
     return db
@@ -0,0 +1,161 @@
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Union
+import hashlib
+import json
+import multiprocessing
+import os
+import sys
+
+CACHE_FILE = ".ui_to_png-cache.json"
+
+# The application and loader of a worker process, created once per process
+_loader = None
+
+
+@dataclass(frozen=True)
+class Job:
+    """ One .ui-file rendered in one style, at each of the sizes """
+    ui_file: Path
+    style: Union[str, None]
+    # (width, height), or None for the size of the form
+    outputs: tuple[tuple[Path, Union[tuple[int, int], None]], ...]
+
+
+def parse_size(s: str) -> tuple[int, int]:
+    width, _, height = s.lower().partition("x")
+    if not (width.isdigit() and height.isdigit()):
+        raise ValueError(f"Invalid size {s!r}, expected e.g. 800x600")
+    return int(width), int(height)
+
+
+def find_ui_files(paths: list[str]) -> list[Path]:
+    """ The given .ui-files, and the .ui-files in the given directories """
+    files = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            files.extend(sorted(path.rglob("*.ui")))
+        elif path.is_file():
+            files.append(path)
+        else:
+            print(f"{path} is not a file. Skipping...", file=sys.stdout)
+    return files
+
+
+def output_name(relative: Path, style: Union[str, None], size: Union[tuple[int, int], None]) -> Path:
+    """ E.g. dialogs/settings_fusion_800x600.png, so that forms with the same name do not overwrite each other """
+    suffixes = ([style.lower()] if style else []) + ([f"{size[0]}x{size[1]}"] if size else [])
+    return relative.with_name("_".join([relative.stem] + suffixes) + ".png")
+
+
+def input_hash(ui_file: Path, style: Union[str, None], size: Union[tuple[int, int], None]) -> str:
+    """ Changes with the form, the style, the size and the Qt version, i.e. whenever the image could change """
+    import PySide6
+    digest = hashlib.sha256(ui_file.read_bytes())
+    digest.update(f"{style}|{size}|{PySide6.__version__}".encode())
+    return digest.hexdigest()
+
+
+def plan(ui_files: list[Path], output_dir: Path, styles: list[Union[str, None]],
+         sizes: list[Union[tuple[int, int], None]], cache: dict[str, str]) -> tuple[list[Job], dict[str, str], int]:
+    """ The jobs for the images that are missing or out of date, the new cache entries, and the number skipped """
+    base = Path(os.path.commonpath([f.absolute().parent for f in ui_files])) if ui_files else Path()
+    jobs, hashes, skipped = [], {}, 0
+    for ui_file in ui_files:
+        relative = ui_file.absolute().relative_to(base)
+        for style in styles:
+            outputs = []
+            for size in sizes:
+                output = output_dir.joinpath(output_name(relative, style, size))
+                key = str(output)
+                hashes[key] = input_hash(ui_file, style, size)
+                if cache.get(key) == hashes[key] and output.exists():
+                    skipped += 1
+                else:
+                    outputs.append((output, size))
+            if outputs:
+                jobs.append(Job(ui_file, style, tuple(outputs)))
+    return jobs, hashes, skipped
+
+
+def _init_worker():
+    """ Each worker process has its own offscreen application """
+    global _loader
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PySide6.QtWidgets import QApplication
+    from PySide6.QtUiTools import QUiLoader
+    QApplication([])
+    _loader = QUiLoader()
+
+
+def render(job: Job) -> list[tuple[Path, Union[str, None]]]:
+    """ Render a job in a worker. Returns each output with an error message, or None if it was written """
+    from PySide6.QtWidgets import QApplication
+    if _loader is None:
+        _init_worker()
+    if job.style is not None:
+        QApplication.setStyle(job.style)
+    ui = _loader.load(str(job.ui_file))
+    if ui is None:
+        return [(output, _loader.errorString()) for output, _ in job.outputs]
+    results = []
+    for output, size in job.outputs:
+        if size is not None:
+            ui.resize(*size)
+        output.parent.mkdir(parents=True, exist_ok=True)
+        results.append((output, None if ui.grab().save(str(output)) else "Could not save the image"))
+    ui.deleteLater()
+    return results
+
+
+def run(jobs: list[Job], processes: int):
+    """ Render the jobs in a pool of processes, yielding the results as they are done """
+    if processes <= 1:
+        for job in jobs:
+            yield from render(job)
+        return
+    # Spawned rather than forked, so that no Qt state is shared with the parent
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(processes, mp_context=context, initializer=_init_worker) as pool:
+        for future in as_completed([pool.submit(render, job) for job in jobs]):
+            yield from future.result()
+
+
+def main() -> int:
+    parser = ArgumentParser("Takes in .ui-files, renders them and saves them as .png-files")
+    parser.add_argument("ui_files", nargs="+", help="Path to a .ui-file, or a directory to render all .ui-files in")
+    parser.add_argument("-o", "--output-dir", type=Path, default=Path("."),
+                        help="Where to write the images, in the same directory structure as the .ui-files")
+    parser.add_argument("-s", "--size", action="append", type=parse_size, dest="sizes", metavar="WxH",
+                        help="Render at this size, can be given several times. Defaults to the size of the form")
+    parser.add_argument("--style", action="append", dest="styles",
+                        help="Render in this style, e.g. Fusion, can be given several times")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1,
+                        help="Number of worker processes, defaults to the number of cores")
+    parser.add_argument("--force", action="store_true", help="Render all images, also the ones that are up to date")
+    args = parser.parse_args()
+
+    ui_files = find_ui_files(args.ui_files)
+    cache_path = args.output_dir.joinpath(CACHE_FILE)
+    cache = json.loads(cache_path.read_text()) if cache_path.exists() and not args.force else {}
+    jobs, hashes, skipped = plan(ui_files, args.output_dir, args.styles or [None], args.sizes or [None], cache)
+
+    failed = 0
+    for output, error in run(jobs, min(args.jobs, len(jobs))):
+        if error is None:
+            cache[str(output)] = hashes[str(output)]
+        else:
+            failed += 1
+            cache.pop(str(output), None)
+            print(f"{output}: {error}", file=sys.stderr)
+    args.output_dir.mkdir(parents=True, exist_ok=True)
+    cache_path.write_text(json.dumps(cache, indent=1, sort_keys=True))
+    rendered = sum(len(job.outputs) for job in jobs) - failed
+    print(f"Rendered {rendered}, up to date {skipped}, failed {failed}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,124 @@
+from PySide6.QtGui import QUndoCommand, QUndoStack
+from datetime import date
+from typing import Union
+from .bulk import Changes, apply_changes
+from .store import ObservableStore, Row, seconds_to_time
+
+FIELDS = ("came", "went", "note")
+
+
+def _value(row: Row, field: str) -> Union[int, str]:
+    """ The stored value of a field, seconds for times, so that a delta does not keep time objects around """
+    if field == "came":
+        return row.came_seconds
+    elif field == "went":
+        return row.went_seconds
+    return row.note or ""
+
+
+class DayDelta:
+    """ The changed fields of a day, with their values before and after. None for a day that does not exist """
+    __slots__ = ("day", "fields", "before", "after")
+
+    def __init__(self, day: date, fields: tuple[str, ...], before: Union[tuple, None], after: Union[tuple, None]):
+        self.day = day
+        self.fields = fields
+        self.before = before
+        self.after = after
+
+    @classmethod
+    def between(cls, day: date, old: Union[Row, None], new: Union[Row, None]) -> Union["DayDelta", None]:
+        """ The delta from the old to the new row, or None if nothing changed """
+        if old is None and new is None:
+            return None
+        if old is None or new is None:
+            fields = FIELDS
+        else:
+            fields = tuple(f for f in FIELDS if _value(old, f) != _value(new, f))
+            if not fields:
+                return None
+        return cls(day, fields, None if old is None else tuple(_value(old, f) for f in fields),
+                   None if new is None else tuple(_value(new, f) for f in fields))
+
+    def followed_by(self, other: "DayDelta") -> Union["DayDelta", None]:
+        """ One delta for this change followed by the other one, or None if together they change nothing """
+        before = None if self.before is None else \
+            {**dict(zip(other.fields, other.before or ())), **dict(zip(self.fields, self.before))}
+        after = None if other.after is None else \
+            {**dict(zip(self.fields, self.after or ())), **dict(zip(other.fields, other.after))}
+        if before is None or after is None:
+            fields = FIELDS
+        else:
+            fields = tuple(f for f in FIELDS if f in before and before[f] != after[f])
+            if not fields:
+                return None
+        return DayDelta(self.day, fields, None if before is None else tuple(before[f] for f in fields),
+                        None if after is None else tuple(after[f] for f in fields))
+
+    def apply(self, store: ObservableStore, forward: bool):
+        values = self.after if forward else self.before
+        if values is None:
+            store.delete(self.day)
+        else:
+            store.upsert(self.day, **{
+                f: v if f == "note" else seconds_to_time(v) for f, v in zip(self.fields, values)})
+
+
+class EditCommand(QUndoCommand):
+    """
+    Changes of one or more days, kept as the deltas of the changed fields only. Undo and redo write the deltas to
+    the store in one batch, so the views are updated incrementally, in time proportional to the number of changed
+    days. Consecutive edits of the same cell are merged.
+    """
+    MERGE_ID = 1
+
+    def __init__(self, store: ObservableStore, description: str, changes: Changes, cell: tuple[date, str] = None):
+        super().__init__(description)
+        self.store = store
+        self.cell = cell
+        self._changes: Union[Changes, None] = changes
+        self.deltas: list[DayDelta] = []
+
+    def redo(self):
+        if self._changes is not None:
+            # First time, when pushed: apply the changes and keep only what they actually changed
+            before = apply_changes(self.store, self._changes)
+            self.deltas = [d for d in (DayDelta.between(day, row, self.store.get(day)) for day, row in before.items())
+                           if d is not None]
+            self._changes = None
+            self.setObsolete(not self.deltas)
+            return
+        with self.store.batch():
+            for delta in self.deltas:
+                delta.apply(self.store, forward=True)
+
+    def undo(self):
+        with self.store.batch():
+            for delta in reversed(self.deltas):
+                delta.apply(self.store, forward=False)
+
+    def id(self) -> int:
+        return -1 if self.cell is None else self.MERGE_ID
+
+    def mergeWith(self, other: QUndoCommand) -> bool:
+        if not isinstance(other, EditCommand) or other.cell != self.cell or other.store is not self.store:
+            return False
+        if len(self.deltas) != 1 or len(other.deltas) != 1:
+            return False
+        merged = self.deltas[0].followed_by(other.deltas[0])
+        self.deltas = [] if merged is None else [merged]
+        self.setObsolete(merged is None)
+        return True
+
+
+class UndoHistory(QUndoStack):
+    """ Undo history of the edits of a store. The number of commands is capped, and each keeps only its deltas """
+    UNDO_LIMIT = 500
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setUndoLimit(self.UNDO_LIMIT)
+
+    def edit(self, store: ObservableStore, description: str, changes: Changes, cell: tuple[date, str] = None):
+        """ Apply changes as an undoable command. Edits of a single cell are merged with the previous edit of it """
+        self.push(EditCommand(store, description, changes, cell))
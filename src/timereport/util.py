@@ -1,4 +1,12 @@
+from contextlib import contextmanager
 from datetime import timedelta, time
+from pathlib import Path
+from typing import Iterator, Union
+import os
+import re
+import threading
+
+_DURATION = re.compile(r"(?:(\d+(?:\.\d+)?)h)?\s*(?:(\d+)m(?:in)?)?")
 
 
 def timedelta_to_time(td: timedelta) -> time:
@@ -9,3 +17,46 @@ def timedelta_to_time(td: timedelta) -> time:
 
 def time_to_timedelta(t: time) -> timedelta:
     return timedelta(hours=t.hour, minutes=t.minute, seconds=t.second, microseconds=t.microsecond)
+
+
+def format_duration(td: Union[timedelta, None], sign: bool = False) -> str:
+    """ Format as H:MM, where hours can exceed 24 """
+    if td is None:
+        return ""
+    seconds = int(td.total_seconds())
+    prefix = "-" if seconds < 0 else "+" if sign else ""
+    hours, remainder = divmod(abs(seconds), 3600)
+    return f"{prefix}{hours}:{remainder // 60:02d}"
+
+
+def parse_duration(s: str) -> timedelta:
+    """ Parse e.g. 1h, 1.5h, 1h30m, 90m or 1:30. A leading minus gives a negative duration """
+    s = s.strip().lower()
+    sign = -1 if s.startswith("-") else 1
+    s = s.lstrip("+-").strip()
+    if ":" in s:
+        hours, minutes = s.split(":", 1)
+        if hours.isdigit() and minutes.isdigit():
+            return sign * timedelta(hours=int(hours), minutes=int(minutes))
+    else:
+        match = _DURATION.fullmatch(s)
+        if match is not None and s:
+            hours, minutes = match.groups()
+            return sign * timedelta(hours=float(hours or 0), minutes=int(minutes or 0))
+    raise ValueError(f"Invalid duration {s!r}, expected e.g. 1h, 1h30m, 90m or 1:30")
+
+
+@contextmanager
+def replacing(filepath: Path) -> Iterator[Path]:
+    """
+    A temporary path next to filepath, moved over it once the block has written it. It is unique per process and
+    thread, so that e.g. a save and a journal compaction of the same file never write to the same temporary file.
+    The temporary file is removed if the block fails
+    """
+    tmp_path = filepath.with_name(f"{filepath.name}.{os.getpid()}-{threading.get_ident()}.tmp")
+    try:
+        yield tmp_path
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
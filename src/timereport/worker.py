@@ -0,0 +1,46 @@
+from PySide6.QtCore import QObject, QRunnable, Signal, Slot
+from typing import Callable
+from logging import getLogger
+import inspect
+import traceback
+
+logger = getLogger(__name__)
+
+
+class WorkerSignals(QObject):
+    """ Signals of a Worker. A QRunnable is not a QObject, so it cannot have signals itself """
+    finished = Signal()
+    # (exception, formatted traceback)
+    error = Signal(tuple)
+    result = Signal(object)
+    # Progress in percent
+    progress = Signal(int)
+
+
+class Worker(QRunnable):
+    """
+    Run a function in a QThreadPool. If the function has a progress argument, it gets a callable to report the
+    progress in percent with. The signals are delivered in the thread that created the worker, normally the GUI
+    thread.
+    """
+
+    def __init__(self, fn: Callable, *args, **kwargs):
+        super().__init__()
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.signals = WorkerSignals()
+        if "progress" in inspect.signature(fn).parameters:
+            self.kwargs["progress"] = self.signals.progress.emit
+
+    @Slot()
+    def run(self):
+        try:
+            result = self.fn(*self.args, **self.kwargs)
+        except BaseException as e:
+            logger.exception(f"Error in worker running {self.fn.__name__}")
+            self.signals.error.emit((e, traceback.format_exc()))
+        else:
+            self.signals.result.emit(result)
+        finally:
+            self.signals.finished.emit()
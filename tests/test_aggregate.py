@@ -0,0 +1,36 @@
+from unittest import TestCase
+from datetime import date, time, timedelta
+from timereport.aggregate import Period, summarize, totals
+from timereport.store import TimeStore
+
+LUNCH = (time(11, 30), time(12, 00))
+
+
+class TestAggregate(TestCase):
+    def setUp(self) -> None:
+        # Monday to Friday in the first week of 2021, worked 8-17 except the Wednesday
+        self.store = TimeStore({
+            date(2021, 1, 4) + timedelta(days=i): dict(came=time(8), went=time(17), note="")
+            for i in range(5) if i != 2
+        })
+        self.store.upsert(date(2021, 1, 6), came=time(12), went=time(16))
+        self.store.upsert(date(2021, 2, 1), came=time(9))
+
+    def test_summarize_week(self):
+        total = summarize(self.store, date(2021, 1, 4), date(2021, 1, 10), LUNCH, timedelta(hours=8))
+        self.assertEqual(timedelta(hours=4 * 9 + 4), total.worked)
+        self.assertEqual(timedelta(minutes=4 * 30), total.lunch)
+        self.assertEqual(timedelta(hours=40), total.norm)
+        self.assertEqual(timedelta(hours=-2), total.overtime)
+        self.assertEqual(5, total.days_worked)
+
+    def test_totals_per_month(self):
+        months = totals(self.store, Period.MONTH, LUNCH, timedelta(hours=8))
+        self.assertEqual([date(2021, 1, 4), date(2021, 2, 1)], [m.start for m in months])
+        self.assertEqual(timedelta(hours=40), months[0].worked)
+        # A day with only a came time does not count as worked
+        self.assertEqual(timedelta(0), months[1].worked)
+        self.assertEqual(0, months[1].days_worked)
+
+    def test_empty_store(self):
+        self.assertEqual([], totals(TimeStore(), Period.YEAR, LUNCH, timedelta(hours=8)))
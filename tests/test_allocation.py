@@ -0,0 +1,91 @@
+from unittest import TestCase
+from tempfile import TemporaryDirectory
+from pathlib import Path
+from datetime import date, time, timedelta
+from unittest import mock
+from timereport.allocation import Allocations, DayAllocation, add_to_file, allocations_path, parse_split, \
+    split_seconds
+from timereport.store import TimeStore
+from timereport.util import parse_duration
+
+LUNCH = (time(12), time(12, 30))
+HOUR = 3600
+
+
+class TestAllocations(TestCase):
+    def setUp(self) -> None:
+        # 8 hours net per day
+        self.store = TimeStore({date(2021, 5, d): dict(came=time(8), went=time(16, 30)) for d in range(1, 32)})
+        self.store.upsert(date(2021, 6, 1), came=time(8), went=time(12))
+        self.allocations = Allocations(self.store, LUNCH)
+
+    def test_deltas_and_main_project(self):
+        day = date(2021, 5, 3)
+        self.allocations.add(day, "A", parse_duration("1h"))
+        self.assertEqual(self.allocations.day_split(day), {"A": HOUR})
+        self.assertEqual(self.allocations.unallocated(day), 7 * HOUR)
+        self.allocations.set_main(day, parse_split("B"))
+        self.assertEqual(self.allocations.day_split(day), {"A": HOUR, "B": 7 * HOUR})
+        self.allocations.set_main(day, parse_split("B 60%, C 40%"))
+        self.assertEqual(self.allocations.day_split(day), {"A": HOUR, "B": 15120, "C": 10080})
+        self.assertEqual(self.allocations.unallocated(day), 0)
+        self.allocations.add(day, "A", -parse_duration("1h"))
+        self.assertEqual(self.allocations.get(day), DayAllocation({}, {"B": 60, "C": 40}))
+
+    def test_running_totals_follow_store_edits(self):
+        changes = []
+        self.allocations.add_listener(lambda day, fields: changes.append(day))
+        self.allocations.set_default_main("M")
+        self.assertEqual(self.allocations.totals(), {"M": 31 * 8 * HOUR + 4 * HOUR})
+        self.allocations.add(date(2021, 5, 10), "A", timedelta(hours=2))
+        self.store.upsert(date(2021, 5, 11), went=time(17, 30))
+        self.store.upsert(date(2021, 5, 12), note="does not change the split")
+        self.assertEqual(changes, [date(2021, 5, 10), date(2021, 5, 11)])
+        self.assertEqual(self.allocations.totals(), {"M": 31 * 8 * HOUR + 4 * HOUR - HOUR, "A": 2 * HOUR})
+        # Whole and partial months
+        self.assertEqual(self.allocations.totals(date(2021, 5, 1), date(2021, 6, 30)), self.allocations.totals())
+        self.assertEqual(self.allocations.totals(date(2021, 5, 10), date(2021, 5, 11)), {"M": 15 * HOUR, "A": 2 * HOUR})
+        self.assertEqual(self.allocations.totals(date(2021, 5, 31), date(2021, 6, 1)), {"M": 12 * HOUR})
+        # Same as computing everything again
+        rebuilt = Allocations(self.store, LUNCH, "M", days={date(2021, 5, 10): self.allocations.get(date(2021, 5, 10))})
+        self.assertEqual(rebuilt.totals(), self.allocations.totals())
+
+    def test_totals_computed_in_another_thread(self):
+        days = {date(2021, 5, 3): DayAllocation({"A": HOUR})}
+        # Without loading every row of the store
+        with mock.patch.object(TimeStore, "items", side_effect=AssertionError("TimeStore.items called")):
+            allocations = Allocations(self.store, LUNCH, "M", dict(days), compute=False)
+            job = allocations.totals_job()
+            # Changed after the job copied the store and allocations
+            self.store.upsert(date(2021, 6, 1), went=time(17))
+            allocations.add(date(2021, 5, 4), "B", timedelta(hours=2))
+            allocations.set_totals(job())
+            expected = Allocations(self.store, LUNCH, "M", allocations.copy_days())
+        self.assertEqual(expected.totals(), allocations.totals())
+        self.assertEqual({"M": 8 * HOUR + 30 * 60}, allocations.totals(date(2021, 6, 1), date(2021, 6, 1)))
+        self.assertEqual({"A": HOUR, "M": 7 * HOUR}, allocations.day_split(date(2021, 5, 3)))
+        # A job made before a settings change is outdated
+        job = allocations.totals_job()
+        allocations.set_default_main("N")
+        allocations.set_totals(job())
+        self.assertEqual({"A", "B", "N"}, set(allocations.totals()))
+
+    def test_split_seconds(self):
+        self.assertEqual(split_seconds(100, {"A": 33, "B": 33, "C": 34}), {"A": 33, "B": 33, "C": 34})
+        self.assertEqual(split_seconds(10, {"A": 33, "B": 67}), {"A": 3, "B": 7})
+        with self.assertRaises(ValueError):
+            parse_split("A 60%, B 30%")
+
+    def test_read_write(self):
+        self.allocations.add(date(2021, 5, 3), "A", timedelta(hours=1))
+        self.allocations.set_main(date(2021, 5, 4), {"B": 100})
+        with TemporaryDirectory() as d:
+            path = allocations_path(Path(d).joinpath("trep.db.json"))
+            self.assertEqual(path.name, "trep.db.json.allocations.json")
+            Allocations.write(path, self.allocations.serialize())
+            self.assertEqual(add_to_file(path, date(2021, 5, 3), "A", timedelta(minutes=30)), 5400)
+            days = Allocations.read(path)
+        self.assertEqual(days, {
+            date(2021, 5, 3): DayAllocation({"A": 5400}),
+            date(2021, 5, 4): DayAllocation(main={"B": 100}),
+        })
@@ -0,0 +1,52 @@
+from unittest import TestCase
+from datetime import date, time, timedelta
+from timereport.bulk import apply_changes, clear_cells, fill_workdays, paste_table, shift_times
+from timereport.store import TimeStore, Row
+
+
+class TestBulk(TestCase):
+    def setUp(self) -> None:
+        # A Monday
+        self.start = date(2021, 6, 7)
+        self.store = TimeStore({self.start + timedelta(days=i): dict(came=time(8), went=time(17)) for i in range(3)})
+        self.batches = []
+        self.store.add_batch_listener(self.batches.append)
+
+    def test_fill_workdays_in_one_batch(self):
+        week = [self.start + timedelta(days=i) for i in range(7)]
+        before = apply_changes(self.store, fill_workdays(week, time(9), time(18)))
+        self.assertEqual(5, len(before))
+        self.assertIsNone(before[self.start + timedelta(days=4)])
+        self.assertEqual(1, len(self.batches))
+        self.assertEqual([time(9)] * 5, [row.came for row in self.store.items()])
+
+    def test_shift_times(self):
+        days = [self.start + timedelta(days=i) for i in range(5)]
+        apply_changes(self.store, shift_times(self.store, days, -timedelta(minutes=30)))
+        self.assertEqual(Row(self.start, 7 * 3600 + 1800, 16 * 3600 + 1800, ""), self.store.get(self.start))
+        with self.assertRaises(ValueError):
+            shift_times(self.store, days, timedelta(hours=8))
+
+    def test_clear_deletes_empty_days(self):
+        self.store.upsert(self.start + timedelta(days=1), note="keep")
+        apply_changes(self.store, clear_cells(self.store, {
+            self.start: {"came", "went"},
+            self.start + timedelta(days=1): {"came", "went", "total"},
+            self.start + timedelta(days=2): {"went"},
+        }))
+        self.assertNotIn(self.start, self.store)
+        second = self.start + timedelta(days=1)
+        self.assertEqual(Row(second, note="keep"), self.store.get(second))
+        self.assertIsNone(self.store.get(self.start + timedelta(days=2)).went)
+
+    def test_paste_table(self):
+        text = "07:30:00\t16:00:00\t8:30:00\tfirst\n---\t---\t\t\n09:15\t17:00\t\tthird\n"
+        changes = paste_table(self.store, self.start, ("came", "went", "total", "note"), text)
+        apply_changes(self.store, changes)
+        self.assertEqual(Row(self.start, 7 * 3600 + 1800, 16 * 3600, "first"), self.store.get(self.start))
+        self.assertIsNone(self.store.get(self.start + timedelta(days=1)).came)
+        self.assertEqual("third", self.store.get(self.start + timedelta(days=2)).note)
+        with self.assertRaises(ValueError):
+            paste_table(self.store, self.start, ("came", "went"), "18:00\t08:00")
+        with self.assertRaises(ValueError):
+            paste_table(self.store, self.start, ("note", "came"), "x\tnoon")
@@ -0,0 +1,26 @@
+from unittest import TestCase
+from datetime import date
+from timereport.dates import day_info, set_holidays, step, view_range
+from timereport.session import TimeViewType
+
+
+class TestDates(TestCase):
+    def test_view_range(self):
+        self.assertEqual((date(2021, 2, 1), date(2021, 2, 28)), view_range(TimeViewType.MONTH, date(2021, 2, 14)))
+        self.assertEqual((date(2020, 12, 28), date(2021, 1, 3)), view_range(TimeViewType.WEEK, date(2021, 1, 1)))
+        self.assertEqual((date(2021, 1, 1), date(2021, 1, 1)), view_range(TimeViewType.DAY, date(2021, 1, 1)))
+
+    def test_step_month_does_not_skip_short_months(self):
+        self.assertEqual(date(2021, 2, 28), step(TimeViewType.MONTH, date(2021, 1, 31), True))
+        self.assertEqual(date(2020, 12, 31), step(TimeViewType.MONTH, date(2021, 1, 31), False))
+        self.assertEqual(date(2021, 1, 8), step(TimeViewType.WEEK, date(2021, 1, 1), True))
+
+    def test_day_info(self):
+        info = day_info(date(2021, 1, 3))
+        self.assertEqual(53, info.week)
+        self.assertTrue(info.is_weekend)
+        self.assertFalse(day_info(date(2021, 12, 31)).is_weekend)
+
+        set_holidays([date(2021, 12, 31)])
+        self.assertFalse(day_info(date(2021, 12, 31)).is_workday)
+        set_holidays([])
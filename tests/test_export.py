@@ -0,0 +1,121 @@
+from unittest import TestCase
+from tempfile import TemporaryDirectory
+from pathlib import Path
+from datetime import date, datetime, time, timedelta
+import csv
+import io
+from timereport.aggregate import Period, totals
+from timereport.allocation import DayAllocation
+from timereport.export import CsvSink, ICalendarSink, Sink, SINKS, aggregate, export, export_file, join, \
+    register_sink, select
+from timereport.sqlite_store import SqliteStore
+from timereport.store import Row, TimeStore
+
+LUNCH = (time(11, 30), time(12, 00))
+
+
+class TestExport(TestCase):
+    def setUp(self) -> None:
+        # Monday to Friday in the first week of 2021, worked 8-17 except the Wednesday
+        self.store = TimeStore({
+            date(2021, 1, 4) + timedelta(days=i): dict(came=time(8), went=time(17), note="")
+            for i in range(5) if i != 2
+        })
+        self.store.upsert(date(2021, 1, 6), came=time(12), went=time(16), note="Dentist, then work")
+        self.store.upsert(date(2021, 2, 1), came=time(9))
+
+    def test_select_reads_in_chunks(self):
+        with self.subTest("store rows in order"):
+            days = [row.date for row in select(self.store, date(2021, 1, 5), date(2021, 2, 1))]
+            self.assertEqual([date(2021, 1, d) for d in (5, 6, 7, 8)] + [date(2021, 2, 1)], days)
+        with self.subTest("extra days merged, without duplicates"):
+            rows = list(select(self.store, date(2021, 1, 8), date(2021, 1, 10),
+                               [date(2021, 1, 9), date(2021, 1, 8), date(2021, 3, 1)]))
+            self.assertEqual([date(2021, 1, 8), date(2021, 1, 9)], [row.date for row in rows])
+            self.assertEqual(time(8), rows[0].came)
+        with self.subTest("progress"):
+            progress = []
+            list(select(TimeStore(), date(2020, 1, 1), date(2021, 12, 31), progress=progress.append))
+            self.assertEqual(100, progress[-1])
+
+    def test_join(self):
+        record, = join([Row(date(2021, 1, 4), 8 * 3600, 17 * 3600, "Note")], LUNCH,
+                       {date(2021, 1, 4): DayAllocation(deltas={"A": 3600})}, default_main="B")
+        self.assertEqual(timedelta(hours=9), record.worked)
+        self.assertEqual(timedelta(minutes=30), record.lunch)
+        self.assertEqual({"A": timedelta(hours=1), "B": timedelta(hours=7, minutes=30)}, record.projects)
+
+    def test_aggregate_matches_totals(self):
+        start, end = date(2021, 1, 1), date(2021, 3, 31)
+        streamed = aggregate(join(select(self.store, start, end), LUNCH), Period.MONTH, start, end,
+                             timedelta(hours=8))
+        expected = totals(self.store, Period.MONTH, LUNCH, timedelta(hours=8), start, end)
+        self.assertEqual(expected, [record.total for record in streamed])
+
+    def test_csv(self):
+        out = io.StringIO(newline="")
+        count = export(self.store, CsvSink(out), date(2021, 1, 4), date(2021, 1, 6), LUNCH)
+        self.assertEqual(3, count)
+        rows = list(csv.reader(io.StringIO(out.getvalue())))
+        self.assertEqual(["date", "came", "went", "worked", "lunch", "net", "note", "projects"], rows[0])
+        self.assertEqual(["2021-01-06", "12:00", "16:00", "4:00", "0:00", "4:00", "Dentist, then work", ""], rows[3])
+
+        out = io.StringIO(newline="")
+        export(self.store, CsvSink(out), date(2021, 1, 4), date(2021, 1, 10), LUNCH, Period.WEEK)
+        rows = list(csv.reader(io.StringIO(out.getvalue())))
+        self.assertEqual(["2021-01-04", "2021-01-10", "5", "40:00", "2:00", "38:00", "40:00", "-2:00", ""], rows[1])
+
+    def test_icalendar(self):
+        out = io.StringIO(newline="")
+        sink = ICalendarSink(out, stamp=datetime(2021, 2, 1, 12))
+        export(self.store, sink, date(2021, 1, 6), date(2021, 2, 1), LUNCH)
+        text = out.getvalue()
+        self.assertTrue(text.startswith("BEGIN:VCALENDAR\r\n"))
+        self.assertTrue(text.endswith("END:VCALENDAR\r\n"))
+        # The day with only a came time is not an event
+        self.assertEqual(3, text.count("BEGIN:VEVENT"))
+        self.assertIn("DTSTART:20210106T120000\r\nDTEND:20210106T160000\r\n", text)
+        self.assertIn("DESCRIPTION:Dentist\\, then work\r\n", text)
+        with self.assertRaises(ValueError):
+            export(self.store, ICalendarSink(out), date(2021, 1, 1), date(2021, 1, 31), LUNCH, Period.MONTH)
+
+    def test_long_lines_are_folded(self):
+        out = io.StringIO(newline="")
+        self.store.upsert(date(2021, 1, 4), note="å" * 100)
+        export(self.store, ICalendarSink(out), date(2021, 1, 4), date(2021, 1, 4), LUNCH)
+        for line in out.getvalue().split("\r\n"):
+            self.assertLessEqual(len(line.encode()), 75)
+        self.assertIn("å" * 100, out.getvalue().replace("\r\n ", ""))
+
+    def test_plugin_sink(self):
+        @register_sink
+        class DaysSink(Sink):
+            name = "days"
+
+            def write_day(self, record):
+                self.out.write(f"{record.date} {record.net}\n")
+
+            def write_period(self, record):
+                raise ValueError("No periods")
+
+        self.addCleanup(SINKS.pop, "days")
+        out = io.StringIO()
+        export(self.store, SINKS["days"](out), date(2021, 1, 4), date(2021, 1, 4), LUNCH)
+        self.assertEqual("2021-01-04 8:30:00\n", out.getvalue())
+
+        class IncompleteSink(Sink):
+            def write_day(self, record):
+                pass
+
+        with self.assertRaises(TypeError):
+            IncompleteSink(out)
+
+    def test_export_file_from_sqlite(self):
+        with TemporaryDirectory() as d:
+            store = SqliteStore(Path(d, "db.sqlite"))
+            store.insert_rows(self.store.items())
+            filepath = Path(d, "export.csv")
+            self.assertEqual(6, export_file(store.copy(), filepath, "csv", date(2021, 1, 1), date(2021, 12, 31),
+                                            LUNCH))
+            self.assertEqual(7, len(filepath.read_text().splitlines()))
+            store.close()
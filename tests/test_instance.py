@@ -0,0 +1,88 @@
+from unittest import TestCase, mock, skipUnless
+from tempfile import TemporaryDirectory
+from pathlib import Path
+import json
+import os
+import socket
+import threading
+from PySide6.QtCore import QCoreApplication, QEventLoop
+from timereport import instance
+from timereport.instance_server import InstanceServer
+
+
+@skipUnless(os.name == "posix", "The socket path is only used on POSIX")
+class TestInstance(TestCase):
+    def setUp(self) -> None:
+        self.app = QCoreApplication.instance() or QCoreApplication([])
+        self.dir = TemporaryDirectory()
+        patcher = mock.patch.object(instance, "server_name", return_value=str(Path(self.dir.name, "trep.sock")))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self) -> None:
+        self.dir.cleanup()
+
+    def send(self, command: str, args: list[str] = ()) -> dict:
+        """ Send from another thread, while this thread runs the event loop of the server """
+        replies = []
+        thread = threading.Thread(target=lambda: replies.append(instance.send(command, args)))
+        thread.start()
+        while thread.is_alive():
+            self.app.processEvents(QEventLoop.AllEvents, 10)
+        return replies[0]
+
+    def test_not_running(self):
+        self.assertIsNone(instance.send("ping"))
+
+    def test_commands(self):
+        def handler(command: str, args: list[str]) -> str:
+            if command == "fail":
+                raise ValueError("failed")
+            return f"{command} {' '.join(args)}"
+
+        server = InstanceServer(handler)
+        self.assertTrue(server.listen())
+        self.assertEqual(self.send("ping"), dict(ok=True, message="pong"))
+        self.assertEqual(self.send("add", ["1h", "PROJ"]), dict(ok=True, message="add 1h PROJ"))
+        self.assertEqual(self.send("fail"), dict(ok=False, message="failed"))
+        server.close()
+        self.assertIsNone(instance.send("ping"))
+
+    def test_queued_connections(self):
+        server = InstanceServer(lambda command, args: " ".join(args))
+        self.assertTrue(server.listen())
+        connected = [threading.Event(), threading.Event()]
+        go = threading.Event()
+        replies = {}
+
+        def send(i: int):
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+                s.settimeout(instance.TIMEOUT)
+                s.connect(instance.server_name())
+                connected[i].set()
+                go.wait()
+                s.sendall(instance.encode(dict(command="echo", args=[f"client {i}"])))
+                replies[i] = json.loads(s.makefile().readline())
+
+        threads = [threading.Thread(target=send, args=(i, )) for i in range(2)]
+        for thread in threads:
+            thread.start()
+        # Both connections are pending when the server accepts them, in one call, before their requests arrive
+        server._server.blockSignals(True)
+        for event in connected:
+            event.wait()
+        self.app.processEvents(QEventLoop.AllEvents, 100)
+        server._server.blockSignals(False)
+        server._accept()
+        go.set()
+        while any(thread.is_alive() for thread in threads):
+            self.app.processEvents(QEventLoop.AllEvents, 10)
+        server.close()
+        self.assertEqual(replies, {i: dict(ok=True, message=f"client {i}") for i in range(2)})
+
+    def test_hung_instance(self):
+        # Accepts connections, but never replies
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+            s.bind(instance.server_name())
+            s.listen()
+            self.assertIsNone(instance.send("ping", timeout=0.1))
@@ -0,0 +1,92 @@
+from unittest import TestCase
+from tempfile import TemporaryDirectory
+from pathlib import Path
+from datetime import date, time
+from unittest import mock
+import os
+import threading
+from timereport.journal import Journal
+from timereport.store import TimeStore
+from timereport.testdata import load_from_json, save_as_json
+
+
+class TestJournal(TestCase):
+    def setUp(self) -> None:
+        self.dir = TemporaryDirectory()
+        self.db_path = Path(self.dir.name).joinpath("trep.db.json")
+        self.store = TimeStore({date(2021, 3, 1): dict(came=time(8), went=time(16), note="first")})
+        save_as_json(self.store, self.db_path)
+
+    def tearDown(self) -> None:
+        self.dir.cleanup()
+
+    def test_replay_after_crash(self):
+        journal = Journal(self.db_path)
+        journal.attach(self.store)
+        self.store.upsert(date(2021, 3, 2), came=time(9), went=time(17))
+        self.store.upsert(date(2021, 3, 1), note="edited")
+        self.store.delete(date(2021, 3, 2))
+        self.store.upsert(date(2021, 3, 3), note="last")
+        # No detach or compaction, as if the application crashed
+        journal.sync()
+        with open(journal.path, 'a') as f:
+            f.write('{"day": "2021-03-04", "ca')
+
+        reopened = load_from_json(self.db_path)
+        self.assertEqual(4, Journal(self.db_path).replay(reopened))
+        self.assertEqual(list(self.store.items()), list(reopened.items()))
+        journal.detach()
+
+    def test_compact(self):
+        journal = Journal(self.db_path)
+        journal.attach(self.store)
+        self.store.upsert(date(2021, 3, 2), came=time(9), went=time(17))
+        journal.compact()
+        journal.wait()
+        self.store.upsert(date(2021, 3, 5), note="after compaction")
+        journal.detach()
+
+        self.assertFalse(journal.compacting_path.exists())
+        self.assertEqual(2, len(load_from_json(self.db_path)))
+        reopened = load_from_json(self.db_path)
+        self.assertEqual(1, Journal(self.db_path).replay(reopened))
+        self.assertEqual(list(self.store.items()), list(reopened.items()))
+
+    def test_edits_after_crash_are_kept(self):
+        journal = Journal(self.db_path)
+        journal.attach(self.store)
+        self.store.upsert(date(2021, 3, 3), note="before crash")
+        journal.detach()
+        with open(journal.path, 'a') as f:
+            f.write('{"day": "2021-03-04", "ca')
+
+        reopened = load_from_json(self.db_path)
+        journal = Journal(self.db_path)
+        journal.replay(reopened)
+        journal.attach(reopened)
+        reopened.upsert(date(2021, 3, 2), note="after crash")
+        journal.detach()
+
+        again = load_from_json(self.db_path)
+        self.assertEqual(2, Journal(self.db_path).replay(again))
+        self.assertEqual("after crash", again.get(date(2021, 3, 2)).note)
+        self.assertEqual("before crash", again.get(date(2021, 3, 3)).note)
+
+    def test_written_outside_of_the_editing_thread(self):
+        threads = []
+
+        def fsync(fd):
+            threads.append(threading.current_thread().name)
+            os.fsync(fd)
+
+        journal = Journal(self.db_path)
+        journal.attach(self.store)
+        with mock.patch("timereport.journal.os.fsync", side_effect=fsync):
+            for day in range(2, 20):
+                self.store.upsert(date(2021, 3, day), note=f"day {day}")
+            journal.detach()
+        self.assertTrue(threads)
+        self.assertNotIn(threading.current_thread().name, threads)
+        reopened = load_from_json(self.db_path)
+        self.assertEqual(18, Journal(self.db_path).replay(reopened))
+        self.assertEqual(list(self.store.items()), list(reopened.items()))
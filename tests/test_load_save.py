@@ -1,7 +1,12 @@
 from unittest import TestCase
 from tempfile import TemporaryDirectory
 from pathlib import Path
-from timereport.testdata import test_table_days, load_from_json, save_as_json
+from datetime import date, time
+from io import StringIO
+import json
+import threading
+from timereport.testdata import generate_test_store, load_from_json, save_as_json, _iter_json_object
+from timereport.util import replacing
 
 
 class TestSaveLoad(TestCase):
@@ -11,5 +16,50 @@ class TestSaveLoad(TestCase):
 
     def test_load_save(self):
         db_path = Path(self.dir.name).joinpath("trep.db.json")
-        save_as_json(test_table_days, db_path)
-        load_from_json(db_path)
+        store = generate_test_store()
+        save_as_json(store, db_path)
+        db = load_from_json(db_path)
+        self.assertEqual(list(store.items()), list(db.items()))
+
+    def test_load_compact_file(self):
+        db_path = Path(self.dir.name).joinpath("compact.db.json")
+        db_path.write_text(json.dumps({
+            "2021-05-03": {"came": "08:01:02", "went": "16:30:00", "note": "A \"quoted\" note, with {braces}"},
+            "2021-05-01": {"came": None, "went": None, "note": ""},
+        }))
+        db = load_from_json(db_path)
+        self.assertEqual([date(2021, 5, 1), date(2021, 5, 3)], list(db))
+        self.assertEqual(time(8, 1, 2), db.get(date(2021, 5, 3)).came)
+        self.assertEqual('A "quoted" note, with {braces}', db.get(date(2021, 5, 3)).note)
+
+    def test_iter_json_object_small_chunks(self):
+        data = {f"key{i}": {"value": i * 1000, "text": "x" * i} for i in range(50)}
+        pairs = list(_iter_json_object(StringIO(json.dumps(data, indent=2)), chunk_size=7))
+        self.assertEqual(list(data.items()), pairs)
+
+    def test_replacing_uses_a_temporary_file_per_thread(self):
+        db_path = Path(self.dir.name).joinpath("replaced.db.json")
+        db_path.write_text("old")
+        entered = threading.Barrier(2)
+        tmp_paths = []
+
+        def write(text: str):
+            with replacing(db_path) as tmp_path:
+                tmp_paths.append(tmp_path)
+                tmp_path.write_text(text)
+                # Both writers have their temporary file at the same time, like a save during a compaction
+                entered.wait()
+
+        threads = [threading.Thread(target=write, args=(text, )) for text in ("save", "compaction")]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertNotEqual(*tmp_paths)
+        self.assertIn(db_path.read_text(), ("save", "compaction"))
+
+        with self.assertRaises(ValueError), replacing(db_path) as tmp_path:
+            tmp_path.write_text("broken")
+            raise ValueError()
+        self.assertFalse(tmp_path.exists())
+        self.assertIn(db_path.read_text(), ("save", "compaction"))
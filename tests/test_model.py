@@ -0,0 +1,135 @@
+from unittest import TestCase
+from datetime import date, time, timedelta
+import os
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+from PySide6.QtCore import QModelIndex, Qt
+from PySide6.QtWidgets import QApplication
+from timereport.model import TableModel
+from timereport.session import SessionSettings, TimeViewType
+from timereport.store import TimeStore
+
+PAGE = TableModel.PAGE_SIZE
+
+
+class TestTimeline(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.app = QApplication.instance() or QApplication([])
+
+    def setUp(self) -> None:
+        self.view_date = date(2021, 6, 15)
+        self.store = TimeStore({self.view_date: dict(came=time(8), went=time(17), note="Today")})
+        settings = SessionSettings(time_view_type=TimeViewType.TIMELINE, view_date=self.view_date)
+        self.model = TableModel(settings, self.store)
+        self.updates = []
+        self.model.data_updated.connect(lambda *args: self.updates.append(args))
+        self.model.fetch_data()
+
+    def assertConsistent(self):
+        """ Consecutive days, with each row and day mapping to each other and the data and renders of the rows """
+        model = self.model
+        count = model.rowCount(QModelIndex())
+        first = model.day_of(0)
+        for row in range(count):
+            day = model.day_of(row)
+            self.assertEqual(first + timedelta(days=row), day)
+            self.assertEqual(row, model.row_of(day))
+        self.assertIsNone(model.row_of(first - timedelta(days=1)))
+        self.assertIsNone(model.row_of(first + timedelta(days=count)))
+        self.assertEqual(count, len(model._data))
+        self.assertEqual(count, len(model._render_cache))
+        # The last update spans exactly the loaded rows
+        self.assertEqual((first, model.day_of(count - 1)), self.updates[-1][1:])
+
+    def test_fetch_more_evicts_from_the_top(self):
+        self.assertTrue(self.model.canFetchMore(QModelIndex()))
+        self.assertEqual(2 * PAGE, self.model.rowCount(QModelIndex()))
+        first = self.model.day_of(0)
+        for page in range(1, TableModel.MAX_PAGES - 1):
+            self.model.fetchMore(QModelIndex())
+            self.assertEqual((2 + page) * PAGE, self.model.rowCount(QModelIndex()))
+            self.assertEqual(first, self.model.day_of(0))
+        self.assertConsistent()
+
+        self.model.fetchMore(QModelIndex())
+        self.assertEqual(TableModel.MAX_PAGES * PAGE, self.model.rowCount(QModelIndex()))
+        self.assertEqual(first + timedelta(days=PAGE), self.model.day_of(0))
+        self.assertConsistent()
+
+    def test_fetch_previous_evicts_from_the_bottom(self):
+        last = self.model.day_of(self.model.rowCount(QModelIndex()) - 1)
+        for _ in range(TableModel.MAX_PAGES):
+            self.model.fetch_previous()
+        self.assertEqual(TableModel.MAX_PAGES * PAGE, self.model.rowCount(QModelIndex()))
+        self.assertEqual(last - timedelta(days=2 * PAGE), self.model.day_of(self.model.rowCount(QModelIndex()) - 1))
+        self.assertConsistent()
+
+    def test_rows_follow_the_store_after_scrolling(self):
+        for _ in range(TableModel.MAX_PAGES):
+            self.model.fetch_previous()
+        for _ in range(TableModel.MAX_PAGES):
+            self.model.fetchMore(QModelIndex())
+        self.assertConsistent()
+        row = self.model.row_of(self.view_date)
+        self.assertEqual("Today", self.model.data(self.model.index(row, 5), Qt.DisplayRole))
+        self.store.upsert(self.view_date, note="Changed")
+        self.assertEqual("Changed", self.model.data(self.model.index(row, 5), Qt.DisplayRole))
+
+    def test_only_the_timeline_fetches_more(self):
+        self.model.set_view_type(TimeViewType.MONTH)
+        self.assertFalse(self.model.canFetchMore(QModelIndex()))
+        count = self.model.rowCount(QModelIndex())
+        self.model.fetchMore(QModelIndex())
+        self.model.fetch_previous()
+        self.assertEqual(30, count)
+        self.assertEqual(count, self.model.rowCount(QModelIndex()))
+
+
+class TestPeriodCache(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.app = QApplication.instance() or QApplication([])
+
+    def setUp(self) -> None:
+        self.store = TimeStore({date(2021, 5, 3): dict(came=time(8), went=time(17), note="May")})
+        settings = SessionSettings(time_view_type=TimeViewType.MONTH, view_date=date(2021, 6, 15))
+        self.model = TableModel(settings, self.store)
+        self.model.fetch_data()
+
+    def note(self, day: date) -> str:
+        return self.model.data(self.model.index(self.model.row_of(day), 5), Qt.DisplayRole)
+
+    def test_prefetch_fills_the_next_and_previous_periods(self):
+        self.model.prefetch()
+        self.assertIn((TimeViewType.MONTH, date(2021, 5, 1)), self.model.period_cache)
+        self.assertIn((TimeViewType.MONTH, date(2021, 7, 1)), self.model.period_cache)
+        self.assertNotIn((TimeViewType.MONTH, date(2021, 6, 1)), self.model.period_cache)
+
+    def test_switching_period_swaps_the_rows_back_in(self):
+        june = self.model._render_cache
+        self.model.scroll(False)
+        self.assertIn((TimeViewType.MONTH, date(2021, 6, 1)), self.model.period_cache)
+        self.assertEqual("May", self.note(date(2021, 5, 3)))
+        self.model.scroll(True)
+        # The same rows, not built again
+        self.assertIs(june, self.model._render_cache)
+        self.assertEqual((30, date(2021, 6, 1)), (self.model.rowCount(QModelIndex()), self.model.day_of(0)))
+        self.assertIn((TimeViewType.MONTH, date(2021, 5, 1)), self.model.period_cache)
+
+    def test_store_batch_invalidates_the_cached_period(self):
+        self.model.prefetch()
+        with self.store.batch():
+            self.store.upsert(date(2021, 5, 3), note="Changed")
+            self.store.upsert(date(2021, 6, 1), note="Shown")
+        self.assertNotIn((TimeViewType.MONTH, date(2021, 5, 1)), self.model.period_cache)
+        self.assertIn((TimeViewType.MONTH, date(2021, 7, 1)), self.model.period_cache)
+        self.assertEqual("Shown", self.note(date(2021, 6, 1)))
+        self.model.scroll(False)
+        self.assertEqual("Changed", self.note(date(2021, 5, 3)))
+
+    def test_set_store_clears_the_cache(self):
+        self.model.prefetch()
+        self.model.set_store(TimeStore({date(2021, 5, 3): dict(note="Other")}))
+        self.assertEqual(0, len(self.model.period_cache))
+        self.model.scroll(False)
+        self.assertEqual("Other", self.note(date(2021, 5, 3)))
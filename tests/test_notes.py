@@ -0,0 +1,47 @@
+from unittest import TestCase
+from datetime import date, time, timedelta
+from timereport.notes import NoteIndex
+from timereport.store import TimeStore
+
+
+class TestNoteIndex(TestCase):
+    def setUp(self) -> None:
+        self.start = date(2021, 6, 1)
+        self.store = TimeStore({
+            self.start: dict(came=time(8), went=time(17), note="Planning meeting"),
+            self.start + timedelta(days=1): dict(came=time(8), went=time(17), note="Release planning, deploy"),
+            self.start + timedelta(days=2): dict(came=time(8), went=time(17), note="Deployment"),
+        })
+        self.index = NoteIndex(self.store.notes())
+        self.index.attach(self.store)
+
+    def test_prefix_queries_ranked_by_recency(self):
+        second = self.start + timedelta(days=1)
+        self.assertEqual([second, self.start], self.index.search("plan"))
+        self.assertEqual([self.start + timedelta(days=2), second], self.index.search("DEPLOY"))
+        self.assertEqual([second], self.index.search("deploy plan"))
+        self.assertEqual([self.start + timedelta(days=2)], self.index.search("deploy", limit=1))
+        self.assertEqual([], self.index.search("plan retro"))
+        self.assertEqual([], self.index.search(" , "))
+
+    def test_follows_store_edits(self):
+        self.store.upsert(self.start, note="Retro")
+        new_day = self.start + timedelta(days=10)
+        with self.store.batch():
+            self.store.upsert(new_day, note="Retrospective notes")
+            self.store.delete(self.start + timedelta(days=2))
+        self.assertEqual([new_day, self.start], self.index.search("retro"))
+        self.assertEqual([self.start + timedelta(days=1)], self.index.search("plan"))
+        self.assertEqual([self.start + timedelta(days=1)], self.index.search("deploy"))
+        self.assertEqual(3, len(self.index))
+        self.index.detach()
+        self.store.upsert(self.start, note="")
+        self.assertEqual([new_day, self.start], self.index.search("retro"))
+
+    def test_generation_changes_with_the_words(self):
+        generation = self.index.generation
+        self.store.upsert(self.start, came=time(9))
+        self.store.upsert(self.start, note="meeting, planning")
+        self.assertEqual(generation, self.index.generation)
+        self.store.upsert(self.start, note="Retro")
+        self.assertGreater(self.index.generation, generation)
@@ -0,0 +1,43 @@
+from unittest import TestCase
+from datetime import date
+from timereport.period_cache import PeriodCache
+
+
+def month(m: int) -> tuple[date, date]:
+    return date(2021, m, 1), date(2021, m, 28)
+
+
+class TestPeriodCache(TestCase):
+    def setUp(self) -> None:
+        # Room for three periods of 28 days
+        self.cache = PeriodCache(max_rows=3 * 28)
+        for m in (1, 2, 3):
+            self.cache.put(m, *month(m), f"rows {m}")
+
+    def test_take(self):
+        self.assertEqual("rows 2", self.cache.take(2))
+        self.assertNotIn(2, self.cache)
+        self.assertIsNone(self.cache.take(2))
+        self.assertEqual(2 * 28, self.cache.rows)
+
+    def test_least_recently_used_is_evicted(self):
+        # Taken and put back, so 1 is now the most recently used
+        self.cache.put(1, *month(1), self.cache.take(1))
+        self.cache.put(4, *month(4), "rows 4")
+        self.assertEqual(3, len(self.cache))
+        self.assertNotIn(2, self.cache)
+        self.assertIn(1, self.cache)
+        self.assertEqual(3 * 28, self.cache.rows)
+
+    def test_replace(self):
+        self.cache.put(3, *month(3), "new rows 3")
+        self.assertEqual(3, len(self.cache))
+        self.assertEqual("new rows 3", self.cache.take(3))
+
+    def test_invalidate_only_the_periods_with_the_days(self):
+        self.cache.invalidate([date(2021, 3, 28), date(2020, 12, 31), date(2021, 1, 28)])
+        self.assertEqual([2], [m for m in (1, 2, 3) if m in self.cache])
+        self.cache.invalidate([])
+        self.assertIn(2, self.cache)
+        self.cache.clear()
+        self.assertEqual((0, 0), (len(self.cache), self.cache.rows))
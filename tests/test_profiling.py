@@ -0,0 +1,58 @@
+from unittest import TestCase
+from types import ModuleType
+from timereport.profiling import Profiler, RollingHistogram
+
+
+class Target:
+    def method(self, x: int, role: int = 0) -> int:
+        return x * 2
+
+    @staticmethod
+    def static(x: int) -> int:
+        return x + 1
+
+
+class TestProfiler(TestCase):
+    def test_instrument_method_with_key(self):
+        profiler = Profiler()
+        original = Target.method
+        profiler.instrument(Target, "method", key=lambda self, x, role=0: role)
+        try:
+            self.assertEqual(Target().method(2), 4)
+            Target().method(3, role=1)
+            Target().method(4, role=1)
+        finally:
+            Target.method = original
+        self.assertEqual(profiler.counts(), {"Target.method[0]": 1, "Target.method[1]": 2})
+
+    def test_instrument_staticmethod(self):
+        profiler = Profiler()
+        original = Target.__dict__["static"]
+        profiler.instrument(Target, "static")
+        try:
+            self.assertEqual(Target.static(1), 2)
+            self.assertEqual(Target().static(1), 2)
+        finally:
+            Target.static = original
+        self.assertEqual(profiler.counts(), {"Target.static": 2})
+
+    def test_instrument_module_function(self):
+        module = ModuleType("timereport.fake")
+        module.fn = lambda: 1
+        profiler = Profiler(trace=True)
+        profiler.instrument(module, "fn")
+        module.fn()
+        profiler.repainted()
+        module.fn()
+        self.assertEqual(profiler.counts(), {"fake.fn": 2})
+        self.assertEqual(profiler.calls_per_repaint["fake.fn"].count, 1)
+        self.assertEqual([e["name"] for e in profiler.trace_events], ["fake.fn", "fake.fn"])
+
+    def test_histogram(self):
+        histogram = RollingHistogram(size=3)
+        for seconds in (1e-6, 3e-6, 1e-3, 2e-3):
+            histogram.add(seconds)
+        self.assertEqual(histogram.count, 4)
+        self.assertEqual(len(histogram.samples), 3)
+        self.assertEqual(histogram.percentile(100), 2e-3)
+        self.assertEqual(sum(histogram.buckets().values()), 3)
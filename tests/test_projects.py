@@ -0,0 +1,77 @@
+from unittest import TestCase, mock
+from tempfile import TemporaryDirectory
+from pathlib import Path
+from itertools import islice
+from timereport.projects import Project, ProjectIndex, ProjectRegistry, projects_path
+
+
+def ids(projects) -> list[str]:
+    return [p.id for p in projects]
+
+
+class TestProjectRegistry(TestCase):
+    def setUp(self) -> None:
+        self.registry = ProjectRegistry([
+            Project("ACME-1", "Rocket skates"),
+            Project("ACME-2", "Giant magnet"),
+            Project("BETA", "Magnetic storage"),
+            Project("GAMMA", "Accounting"),
+        ])
+
+    def test_id_before_name_before_fuzzy(self):
+        self.assertEqual(ids(self.registry.search("acme")), ["ACME-1", "ACME-2"])
+        self.assertEqual(ids(self.registry.search("mag")), ["ACME-2", "BETA", "GAMMA"])
+        self.assertEqual(ids(self.registry.search("a")), ["ACME-1", "ACME-2", "GAMMA", "BETA"])
+        self.assertEqual(ids(self.registry.search("gtt")), ["ACME-2", "BETA"])
+        self.assertEqual(ids(self.registry.search("xyz")), [])
+
+    def test_ranked_by_use(self):
+        self.registry.record_use("ACME-2", when=1000)
+        self.registry.record_use("ACME-1", when=0)
+        self.assertEqual(ids(self.registry.search("acme")), ["ACME-2", "ACME-1"])
+        self.assertEqual(ids(islice(self.registry.search(""), 2)), ["ACME-2", "ACME-1"])
+        # Many uses long ago weigh less than a recent one
+        for _ in range(3):
+            self.registry.record_use("BETA", when=-10 * ProjectRegistry.RECENCY_HALF_LIFE)
+        self.assertEqual(ids(self.registry.search("mag")), ["ACME-2", "BETA", "GAMMA"])
+
+    def test_narrowing_fuzzy_query(self):
+        self.assertEqual(ids(self.registry.search("ms")), ["ACME-1", "BETA"])
+        self.assertEqual(ids(self.registry.search("mst")), ["ACME-1", "BETA"])
+        self.assertEqual(ids(self.registry.search("mstr")), ["BETA"])
+        self.registry.add(Project("DELTA", "Most things"))
+        self.assertEqual(ids(self.registry.search("mst")), ["ACME-1", "BETA", "DELTA"])
+
+    def test_rename_and_remove(self):
+        self.registry.add(Project("GAMMA", "Bookkeeping"))
+        self.assertEqual(ids(self.registry.search("acco")), [])
+        self.assertEqual(ids(self.registry.search("book")), ["GAMMA"])
+        self.registry.remove("ACME-1")
+        self.assertEqual(ids(self.registry.search("acme")), ["ACME-2"])
+
+    def test_load_save(self):
+        self.registry.record_use("BETA", when=123.5)
+        with TemporaryDirectory() as d:
+            path = projects_path(Path(d).joinpath("trep.db.json"))
+            self.assertEqual(path.name, "trep.db.json.projects.json")
+            self.assertNotEqual(path, projects_path(Path(d).joinpath("trep.db.sqlite")))
+            self.registry.save(path)
+            registry = ProjectRegistry()
+            registry.load(path)
+        self.assertEqual(sorted(ids(registry)), sorted(ids(self.registry)))
+        self.assertEqual(registry.score("BETA", now=123.5), 0.0)
+
+    def test_load_large_registry(self):
+        registry = ProjectRegistry(Project(f"P{i:05d}", f"Project number {i}") for i in range(40000))
+        with TemporaryDirectory() as d:
+            path = Path(d).joinpath("trep.projects.json")
+            registry.save(path)
+            loaded = ProjectRegistry([Project("P00001", "Old name"), Project("OTHER")])
+            # The index is built once, not one project at a time
+            with mock.patch.object(ProjectIndex, "add", side_effect=AssertionError("ProjectIndex.add called")):
+                loaded.load(path)
+        self.assertEqual(len(loaded), 40001)
+        self.assertEqual(ids(islice(loaded.search("p3999"), 10)), [f"P3999{i}" for i in range(10)])
+        self.assertEqual(loaded.get("P00001").name, "Project number 1")
+        self.assertEqual(ids(loaded.search("old")), [])
+        self.assertEqual(ids(loaded.search("other")), ["OTHER"])
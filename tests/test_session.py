@@ -0,0 +1,35 @@
+from unittest import TestCase
+from tempfile import TemporaryDirectory
+from pathlib import Path
+from datetime import date, time, timedelta
+from PySide6.QtCore import QSize
+from timereport.session import SessionSettings, TimeViewType
+
+
+class TestSessionSettings(TestCase):
+    def setUp(self) -> None:
+        self.dir = TemporaryDirectory()
+        self.path = Path(self.dir.name).joinpath("session.json")
+
+    def tearDown(self) -> None:
+        self.dir.cleanup()
+
+    def test_round_trip(self):
+        settings = SessionSettings(TimeViewType.WEEK, date(2021, 6, 1), QSize(640, 480), [Path("/tmp/trep.db.json")],
+                                   [time(12), time(12, 45)], timedelta(hours=7, minutes=30), "PROJ")
+        settings.save(self.path)
+        self.assertEqual(["session.json"], [p.name for p in Path(self.dir.name).iterdir()])
+        file_dict = SessionSettings.read(self.path)
+        self.assertEqual("2021-06-01", file_dict["view_date"])
+        self.assertEqual(["12:00", "12:45"], file_dict["lunch_interval"])
+        loaded = SessionSettings()
+        loaded.load(self.path)
+        self.assertEqual(settings, loaded)
+
+    def test_broken_and_missing_values_keep_defaults(self):
+        settings = SessionSettings()
+        settings.apply(dict(view_date="June", lunch_interval=["11:00", "11:45"], daily_norm=450))
+        self.assertEqual([time(11), time(11, 45)], settings.lunch_interval)
+        self.assertEqual(timedelta(hours=7, minutes=30), settings.daily_norm)
+        self.assertEqual(SessionSettings().view_date, settings.view_date)
+        self.assertEqual(TimeViewType.MONTH, settings.time_view_type)
@@ -0,0 +1,100 @@
+from unittest import TestCase
+from tempfile import TemporaryDirectory
+from pathlib import Path
+from datetime import date, time, timedelta
+from timereport.database import import_json, save_sqlite
+from timereport.journal import Journal
+from timereport.sqlite_store import SqliteStore
+from timereport.store import TimeStore, Row
+from timereport.testdata import save_as_json
+
+
+class TestSqliteStore(TestCase):
+    def setUp(self) -> None:
+        self.dir = TemporaryDirectory()
+        self.start = date(2021, 6, 1)
+        self.memory_store = TimeStore({
+            self.start + timedelta(days=i): dict(came=time(8), went=time(17), note=f"day {i}")
+            for i in range(0, 20, 2)
+        })
+        json_path = Path(self.dir.name).joinpath("trep.db.json")
+        save_as_json(self.memory_store, json_path)
+        self.store = import_json(json_path, Path(self.dir.name).joinpath("trep.db.sqlite"))
+
+    def tearDown(self) -> None:
+        self.store.close()
+        self.dir.cleanup()
+
+    def test_import(self):
+        self.assertEqual(list(self.memory_store.items()), list(self.store.items()))
+        self.assertEqual(self.memory_store.span(), self.store.span())
+
+    def test_range_and_columns(self):
+        start, end = self.start - timedelta(days=3), self.start + timedelta(days=5)
+        self.assertEqual(list(self.memory_store.range(start, end)), list(self.store.range(start, end)))
+        self.assertEqual(self.memory_store.columns(start, end), self.store.columns(start, end))
+
+    def test_upsert_and_delete(self):
+        changes = []
+        self.store.add_listener(lambda day, fields: changes.append((day, fields)))
+        new_day = self.start + timedelta(days=3)
+        self.store.upsert(new_day, note="inserted")
+        self.assertEqual(Row(new_day, note="inserted"), self.store.get(new_day))
+        self.store.upsert(self.start, went=time(16))
+        self.store.delete(new_day)
+        self.assertNotIn(new_day, self.store)
+        self.assertEqual([(new_day, SqliteStore.FIELDS), (self.start, ("went", )), (new_day, SqliteStore.FIELDS)],
+                         changes)
+
+    def test_batch_is_one_transaction(self):
+        batches = []
+        self.store.add_batch_listener(batches.append)
+        with self.assertRaises(RuntimeError):
+            with self.store.batch():
+                self.store.upsert(self.start, came=time(7))
+                raise RuntimeError("Failed halfway")
+        self.assertEqual(time(8), self.store.get(self.start).came)
+
+        with self.store.batch():
+            for i in range(3):
+                self.store.upsert(self.start + timedelta(days=i), note="batched")
+            self.assertTrue(self.store._conn.in_transaction)
+        self.assertFalse(self.store._conn.in_transaction)
+        self.assertEqual([[self.start], [self.start + timedelta(days=i) for i in range(3)]],
+                         [list(changes) for changes in batches])
+
+    def test_save_over_existing_file(self):
+        # The existing file has days that the saved store does not
+        target = Path(self.dir.name).joinpath("other.db.sqlite")
+        save_sqlite(self.memory_store, target)
+        saved = TimeStore({self.start: dict(came=time(9), went=time(15), note="only day")})
+        save_sqlite(saved, target)
+        store = SqliteStore(target)
+        self.assertEqual(list(saved.items()), list(store.items()))
+        store.close()
+        # Besides the write-ahead log of the open database, no temporary files are left
+        self.assertEqual(["other.db.sqlite", "trep.db.json", "trep.db.sqlite"],
+                         sorted(p.name for p in Path(self.dir.name).iterdir() if not p.name.endswith(("-wal", "-shm"))))
+
+    def test_edit_while_a_copy_is_read(self):
+        copy = self.store.copy()
+        rows = copy.items()
+        first = next(rows)
+        # Would wait for the read lock of the copy, and then fail with "database is locked"
+        self.store.upsert(self.start + timedelta(days=18), note="edited")
+        self.store.upsert(self.start + timedelta(days=30), note="new")
+        self.assertEqual(list(self.memory_store.items()), [first] + list(rows))
+        self.assertEqual("edited", copy.get(self.start + timedelta(days=18)).note)
+        copy.close()
+
+    def test_import_replays_the_journal_and_replaces(self):
+        json_path = Path(self.dir.name).joinpath("trep.db.json")
+        journal = Journal(json_path)
+        journal.attach(self.memory_store)
+        self.memory_store.upsert(self.start + timedelta(days=1), note="only in the journal")
+        self.memory_store.delete(self.start)
+        journal.detach()
+        # Replaces the existing database of setUp, which still has the deleted day
+        store = import_json(json_path, self.store.filepath)
+        self.assertEqual(list(self.memory_store.items()), list(store.items()))
+        store.close()
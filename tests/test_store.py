@@ -0,0 +1,60 @@
+from unittest import TestCase
+from datetime import date, time, timedelta
+from timereport.store import TimeStore, Row, MISSING
+
+
+class TestTimeStore(TestCase):
+    def setUp(self) -> None:
+        self.start = date(2021, 6, 1)
+        self.store = TimeStore({
+            self.start + timedelta(days=i): dict(came=time(8), went=time(17), note=f"day {i}")
+            for i in range(0, 20, 2)
+        })
+
+    def test_range_is_ordered_and_inclusive(self):
+        days = [row.date for row in self.store.range(self.start + timedelta(days=2), self.start + timedelta(days=8))]
+        self.assertEqual([self.start + timedelta(days=i) for i in (2, 4, 6, 8)], days)
+
+    def test_upsert_and_delete(self):
+        new_day = self.start + timedelta(days=3)
+        self.store.upsert(new_day, note="inserted")
+        self.assertIn(new_day, self.store)
+        self.assertEqual(Row(new_day, note="inserted"), self.store.get(new_day))
+        self.assertEqual(sorted(self.store), list(self.store))
+
+        self.store.delete(new_day)
+        self.assertNotIn(new_day, self.store)
+        self.assertEqual(10, len(self.store))
+
+    def test_listener_gets_changed_fields(self):
+        changes = []
+        self.store.add_listener(lambda day, fields: changes.append((day, fields)))
+        self.store.upsert(self.start, came=time(8), went=time(16))
+        self.store.upsert(self.start, came=time(8))
+        self.assertEqual([(self.start, ("went", ))], changes)
+
+    def test_batch_notifies_once_at_the_end(self):
+        changes, batches = [], []
+        self.store.add_listener(lambda day, fields: changes.append((day, fields)))
+        self.store.add_batch_listener(batches.append)
+        with self.store.batch():
+            self.store.upsert(self.start, came=time(7))
+            with self.store.batch():
+                self.store.upsert(self.start, note="early")
+            self.store.delete(self.start + timedelta(days=2))
+            self.assertEqual([], changes)
+        self.assertEqual([(self.start, ("came", "note")), (self.start + timedelta(days=2), TimeStore.FIELDS)], changes)
+        self.assertEqual([dict(changes)], batches)
+
+    def test_upsert_outside_of_stored_range(self):
+        self.store.upsert(date(2020, 1, 1), came=time(9), went=time(10, 30))
+        self.store.upsert(date(2023, 1, 1), came=time(9))
+        self.assertEqual(date(2020, 1, 1), next(iter(self.store)))
+        self.assertEqual(timedelta(hours=1, minutes=30), self.store.get(date(2020, 1, 1)).total)
+        self.assertIsNone(self.store.get(date(2023, 1, 1)).total)
+        self.assertEqual(12, len(self.store))
+
+    def test_columns(self):
+        came, went = self.store.columns(self.start - timedelta(days=1), self.start + timedelta(days=1))
+        self.assertEqual([MISSING, 8 * 3600, MISSING], list(came))
+        self.assertEqual([MISSING, 17 * 3600, MISSING], list(went))
@@ -0,0 +1,36 @@
+from unittest import TestCase
+from tempfile import TemporaryDirectory
+from pathlib import Path
+from timereport.ui.ui_to_png import output_name, plan
+
+
+class TestUiToPng(TestCase):
+    def setUp(self) -> None:
+        self.dir = TemporaryDirectory()
+        root = Path(self.dir.name)
+        self.forms = [root.joinpath("a", "form.ui"), root.joinpath("b", "form.ui")]
+        for form in self.forms:
+            form.parent.mkdir()
+            form.write_text("<ui/>")
+        self.output_dir = root.joinpath("out")
+
+    def tearDown(self) -> None:
+        self.dir.cleanup()
+
+    def test_output_names_do_not_collide(self):
+        self.assertEqual(Path("a/form.png"), output_name(Path("a/form.ui"), None, None))
+        self.assertEqual(Path("a/form_fusion_800x600.png"), output_name(Path("a/form.ui"), "Fusion", (800, 600)))
+        jobs, hashes, skipped = plan(self.forms, self.output_dir, ["Fusion", "Windows"], [None, (800, 600)], {})
+        self.assertEqual(4, len(jobs))
+        self.assertEqual(8, len(set(hashes)))
+        self.assertEqual(0, skipped)
+
+    def test_up_to_date_images_are_skipped(self):
+        _, hashes, _ = plan(self.forms, self.output_dir, [None], [None], {})
+        for output in hashes:
+            Path(output).parent.mkdir(parents=True, exist_ok=True)
+            Path(output).touch()
+        self.forms[0].write_text("<ui version=\"4.0\"/>")
+        jobs, _, skipped = plan(self.forms, self.output_dir, [None], [None], hashes)
+        self.assertEqual([self.forms[0]], [job.ui_file for job in jobs])
+        self.assertEqual(1, skipped)
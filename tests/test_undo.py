@@ -0,0 +1,54 @@
+from unittest import TestCase
+from datetime import date, time, timedelta
+from timereport.store import TimeStore, Row
+from timereport.undo import UndoHistory
+
+
+class TestUndoHistory(TestCase):
+    def setUp(self) -> None:
+        self.start = date(2021, 6, 7)
+        self.store = TimeStore({self.start + timedelta(days=i): dict(came=time(8), went=time(17)) for i in range(3)})
+        self.history = UndoHistory()
+        self.batches = []
+        self.store.add_batch_listener(self.batches.append)
+
+    def test_undo_redo_in_one_batch(self):
+        new_day = self.start + timedelta(days=5)
+        self.history.edit(self.store, "Fill", {
+            self.start: dict(came=time(9)),
+            new_day: dict(came=time(8), went=time(16)),
+        })
+        self.history.undo()
+        self.assertEqual(time(8), self.store.get(self.start).came)
+        self.assertNotIn(new_day, self.store)
+        self.history.redo()
+        self.assertEqual(Row(new_day, 8 * 3600, 16 * 3600, ""), self.store.get(new_day))
+        self.assertEqual(3, len(self.batches))
+
+    def test_keeps_only_changed_fields(self):
+        self.history.edit(self.store, "Edit", {self.start: dict(came=time(9), went=time(17), note="")})
+        delta, = self.history.command(0).deltas
+        self.assertEqual(("came", ), delta.fields)
+        self.assertEqual(((8 * 3600, ), (9 * 3600, )), (delta.before, delta.after))
+        # Changing nothing leaves no entry
+        self.history.edit(self.store, "Edit", {self.start: dict(went=time(17))})
+        self.assertEqual(1, self.history.count())
+
+    def test_edits_of_the_same_cell_are_merged(self):
+        cell = (self.start, "note")
+        for note in ("a", "ab", "abc"):
+            self.history.edit(self.store, "Edit note", {self.start: dict(note=note)}, cell)
+        self.assertEqual(1, self.history.count())
+        self.history.edit(self.store, "Edit note", {self.start + timedelta(days=1): dict(note="x")},
+                          (self.start + timedelta(days=1), "note"))
+        self.assertEqual(2, self.history.count())
+        self.history.undo()
+        self.history.undo()
+        self.assertEqual("", self.store.get(self.start).note)
+        self.assertEqual("", self.store.get(self.start + timedelta(days=1)).note)
+
+        # Merged back to where it started, so there is nothing to undo
+        self.history.clear()
+        self.history.edit(self.store, "Edit note", {self.start: dict(note="a")}, cell)
+        self.history.edit(self.store, "Edit note", {self.start: dict(note="")}, cell)
+        self.assertEqual(0, self.history.count())